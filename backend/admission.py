@@ -0,0 +1,258 @@
+"""Fair-share admission of renders to the render pool.
+
+Renders get a worker slot through a RenderAdmission, which hands out as
+many slots as the pool has workers, so the order in which work runs is
+decided here rather than first come, first served:
+
+- Priority classes: a free slot goes to an interactive render (previews,
+  thumbnails) before a save, and to a save before bulk work (batches,
+  export re-renders).
+- Within a class, users share slots by start-time fair queuing. Each queued
+  render is tagged with the user's virtual start time; a render's expected
+  cost (the user's recent average render time) divided by the user's weight
+  advances that user's clock. Someone queueing many or large renders
+  falls behind users who render little, instead of everyone waiting behind
+  them.
+- Quotas: each user has a token bucket of render seconds, refilled at
+  `quota_rate` seconds per second up to `quota_burst`. Renders are charged
+  the worker time they took, which for the single-threaded renderer is its
+  CPU time. A user in debt is refused with RenderQuotaExceeded until the
+  bucket refills.
+
+Queue waits are recorded per priority class in /metrics and per user in
+`user_stats()`.
+"""
+import asyncio
+import heapq
+import itertools
+import statistics
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+from renderpool import RenderQueueFull, RenderTimeout
+from telemetry import ADMISSION_WAIT
+
+INTERACTIVE, SAVE, BULK = 0, 1, 2
+PRIORITY_NAMES = ("interactive", "save", "bulk")
+
+# Expected cost of a user's first render, in seconds
+DEFAULT_COST = 0.05
+# Weight of the newest render in a user's average cost
+COST_SMOOTHING = 0.2
+# Users whose wait statistics are kept, and waits kept per user
+MAX_TRACKED_USERS = 1024
+WAITS_PER_USER = 128
+
+
+class RenderQuotaExceeded(Exception):
+    """Raised when a user has used up their render time for now."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Render quota exceeded, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("user_id", "priority", "future", "enqueued", "cancelled")
+
+    def __init__(self, user_id: str, priority: int, future):
+        self.user_id = user_id
+        self.priority = priority
+        self.future = future
+        self.enqueued = time.monotonic()
+        self.cancelled = False
+
+
+class RenderAdmission:
+    """Orders renders by priority class, then fair share per user, within per-user quotas.
+
+    Args:
+        slots: Renders allowed to run at once (the pool's worker count).
+        max_queue: Renders allowed to wait in all; more get RenderQueueFull.
+        max_user_queue: Renders one user may have waiting in each priority class.
+        quota_rate: Render seconds per second each user earns; 0 disables quotas.
+        quota_burst: Most render seconds a user can bank.
+        weights: Fair-share weight by user ID (default 1).
+        timeout: Seconds a render may wait for a slot before RenderTimeout.
+    """
+
+    def __init__(self, slots: int, max_queue: int = 16, max_user_queue: int = 4, quota_rate: float = 1.0,
+                 quota_burst: float = 30.0, weights: Optional[dict] = None, timeout: float = 20.0):
+        self.slots = slots
+        self.max_queue = max_queue
+        self.max_user_queue = max_user_queue
+        self.quota_rate = quota_rate
+        self.quota_burst = quota_burst
+        self.weights = weights or {}
+        self.timeout = timeout
+        self._busy = 0
+        self._queues = [[] for _ in PRIORITY_NAMES]  # heaps of (start tag, seq, waiter)
+        self._virtual_time = [0.0] * len(PRIORITY_NAMES)
+        self._finish_tags = {}  # (priority, user) -> virtual finish of the user's last queued render
+        self._seq = itertools.count()
+        self._waiting = [0] * len(PRIORITY_NAMES)
+        self._user_waiting = {}  # (priority, user) -> renders waiting
+        self._costs = {}
+        self._buckets = {}  # user -> [tokens, last refill]
+        self._waits = OrderedDict()  # user -> recent waits in seconds
+        self.admitted = 0
+        self.rejected_quota = 0
+        self.rejected_full = 0
+        self.timeouts = 0
+
+    def _tokens(self, user_id: str) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = [self.quota_burst, now]
+        bucket[0] = min(self.quota_burst, bucket[0] + (now - bucket[1]) * self.quota_rate)
+        bucket[1] = now
+        if bucket[0] >= self.quota_burst and len(self._buckets) > MAX_TRACKED_USERS:
+            # A full bucket is the default; forget it to keep the table small
+            del self._buckets[user_id]
+        return bucket[0]
+
+    async def run(self, user_id: str, priority: int, job):
+        """Await `job(done)` once a slot is free for it and return its result.
+
+        The slot is held until `job` calls `done()`, which it must do exactly
+        once when its work has stopped using the pool, even if it raised or
+        its caller gave up first (see RenderExecutor.run's on_done). Raises
+        RenderQuotaExceeded, RenderQueueFull, or RenderTimeout if no slot
+        frees up within the timeout.
+        """
+        if self.quota_rate > 0:
+            tokens = self._tokens(user_id)
+            if tokens <= 0:
+                self.rejected_quota += 1
+                raise RenderQuotaExceeded(-tokens / self.quota_rate)
+
+        if self._busy < self.slots and not sum(self._waiting):
+            self._busy += 1
+            self._record_wait(user_id, priority, 0.0)
+        else:
+            await self._wait(user_id, priority)
+
+        self.admitted += 1
+        start = time.monotonic()
+
+        def done():
+            # Charged for the whole time the work held the slot, past any timeout
+            self._charge(user_id, time.monotonic() - start)
+            self._release()
+
+        return await job(done)
+
+    async def _wait(self, user_id: str, priority: int):
+        queued = self._user_waiting.get((priority, user_id), 0)
+        if sum(self._waiting) >= self.max_queue or queued >= self.max_user_queue:
+            self.rejected_full += 1
+            raise RenderQueueFull()
+
+        cost = self._costs.get(user_id, DEFAULT_COST) / self.weights.get(user_id, 1.0)
+        start_tag = max(self._virtual_time[priority], self._finish_tags.get((priority, user_id), 0.0))
+        self._finish_tags[(priority, user_id)] = start_tag + cost
+        waiter = _Waiter(user_id, priority, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queues[priority], (start_tag, next(self._seq), waiter))
+        self._waiting[priority] += 1
+        self._user_waiting[(priority, user_id)] = self._user_waiting.get((priority, user_id), 0) + 1
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(waiter.future, self.timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted a slot just as the caller gave up: pass it on
+                self._release()
+            else:
+                waiter.cancelled = True
+                self._dequeued(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                raise RenderTimeout()
+            raise
+
+    def _dequeued(self, waiter: _Waiter):
+        self._waiting[waiter.priority] -= 1
+        key = (waiter.priority, waiter.user_id)
+        remaining = self._user_waiting[key] - 1
+        if remaining:
+            self._user_waiting[key] = remaining
+        else:
+            del self._user_waiting[key]
+
+    def _dispatch(self):
+        """Give free slots to the first waiters in priority, then virtual start, order."""
+        for priority, queue in enumerate(self._queues):
+            while self._busy < self.slots and queue:
+                start_tag, _, waiter = heapq.heappop(queue)
+                if waiter.cancelled:
+                    continue
+                self._virtual_time[priority] = start_tag
+                self._dequeued(waiter)
+                self._busy += 1
+                self._record_wait(waiter.user_id, priority, time.monotonic() - waiter.enqueued)
+                waiter.future.set_result(None)
+            if not queue and len(self._finish_tags) > MAX_TRACKED_USERS:
+                # Tags at or behind virtual time give no advantage or penalty any more
+                now = self._virtual_time[priority]
+                for key in [k for k, tag in self._finish_tags.items() if k[0] == priority and tag <= now]:
+                    del self._finish_tags[key]
+
+    def _release(self):
+        self._busy -= 1
+        self._dispatch()
+
+    def _charge(self, user_id: str, seconds: float):
+        previous = self._costs.get(user_id, DEFAULT_COST)
+        self._costs[user_id] = previous + COST_SMOOTHING * (seconds - previous)
+        if len(self._costs) > MAX_TRACKED_USERS:
+            self._costs.pop(next(iter(self._costs)))
+        if self.quota_rate > 0:
+            tokens = self._tokens(user_id)
+            self._buckets[user_id] = [tokens - seconds, time.monotonic()]
+
+    def _record_wait(self, user_id: str, priority: int, seconds: float):
+        ADMISSION_WAIT.observe(seconds, PRIORITY_NAMES[priority])
+        waits = self._waits.get(user_id)
+        if waits is None:
+            waits = self._waits[user_id] = deque(maxlen=WAITS_PER_USER)
+            if len(self._waits) > MAX_TRACKED_USERS:
+                self._waits.popitem(last=False)
+        else:
+            self._waits.move_to_end(user_id)
+        waits.append(seconds)
+
+    def user_stats(self, limit: int = 50) -> list:
+        """Recent queue waits of the users who waited longest (by p95), for tuning."""
+        rows = []
+        for user_id, waits in self._waits.items():
+            ordered = sorted(waits)
+            bucket = self._buckets.get(user_id)
+            rows.append({
+                "user": user_id,
+                "renders": len(ordered),
+                "wait_avg_ms": round(1000 * statistics.fmean(ordered), 2),
+                "wait_p95_ms": round(1000 * ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+                "wait_max_ms": round(1000 * ordered[-1], 2),
+                "queued": sum(self._user_waiting.get((p, user_id), 0) for p in range(len(PRIORITY_NAMES))),
+                "cost_ms": round(1000 * self._costs.get(user_id, DEFAULT_COST), 2),
+                "quota_seconds": round(bucket[0], 3) if bucket is not None else self.quota_burst,
+                "weight": self.weights.get(user_id, 1.0),
+            })
+        rows.sort(key=lambda row: -row["wait_p95_ms"])
+        return rows[:limit]
+
+    def stats(self) -> dict:
+        return {
+            "slots": self.slots,
+            "busy": self._busy,
+            "waiting": dict(zip(PRIORITY_NAMES, self._waiting)),
+            "admitted": self.admitted,
+            "rejected_quota": self.rejected_quota,
+            "rejected_full": self.rejected_full,
+            "timeouts": self.timeouts,
+            "quota_rate": self.quota_rate,
+            "quota_burst": self.quota_burst,
+        }
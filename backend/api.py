@@ -1,16 +1,38 @@
-from fastapi import FastAPI, Request, HTTPException, Depends
+from fastapi import FastAPI, Request, HTTPException, Depends, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
-import git
-import tempfile
-from pydantic import BaseModel
+import fnmatch
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import time
+from pydantic import BaseModel, ValidationError
 from typing import Optional
-from makeresume import BuildFromXML
-from fastapi.responses import FileResponse, Response
-import xml.etree.ElementTree as ET
-import jwt
-from jwt import PyJWKClient
+from makeresume import RenderFitted, RenderToBytes
+from admission import BULK, INTERACTIVE, SAVE, RenderAdmission, RenderQuotaExceeded
+from rendercache import RenderCache, render_key, source_key
+from renderpool import RenderExecutor, RenderQueueFull, RenderTimeout, RenderWorkerCrashed
+from commitworker import CommitWorker
+from bulletindex import BulletIndex
+from export import ZipStream
+from history import RevisionNotFound, VersionHistory
+from livepreview import LiveSession
+from resumeindex import ResumeIndex, resume_summary
+from resumemodel import Resume, ResumeValidationError, parse_resume
+from previewscheduler import PreviewScheduler, PreviewSuperseded
+from storage import LocalStorage, storage_from_env
+import thumbnails
+from contextlib import asynccontextmanager
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from auth import JWKSCache, KeysUnavailable, TokenCache, TokenVerifier
+from httpcache import not_modified, stat_etag, validator_headers
+from telemetry import PDF_BYTES, REGISTRY, TelemetryMiddleware, configure_logging, stage
 from dotenv import load_dotenv
 import ssl
 import certifi
@@ -18,37 +40,58 @@ import certifi
 # Load .env from project root
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
 
+# Structured JSON logs; below WARNING only a LOG_SAMPLE_RATE share is emitted
+configure_logging(os.environ.get("LOG_LEVEL", "INFO"), float(os.environ.get("LOG_SAMPLE_RATE", 0.1)))
+logger = logging.getLogger("api")
+
 # Fix macOS SSL certificate issue
 ssl_context = ssl.create_default_context(cafile=certifi.where())
 
 # Supabase JWKS endpoint for ES256 token verification
 SUPABASE_URL = os.environ.get("SUPABASE_URL", "https://yypvpoqstsfrfgenjmyo.supabase.co")
 JWKS_URL = f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json"
-jwks_client = PyJWKClient(JWKS_URL, ssl_context=ssl_context)
-print(f"[DEBUG] JWKS URL: {JWKS_URL}")
+logger.info("JWKS URL configured", extra={"url": JWKS_URL})
+
+# Keys are refreshed in the background; verified tokens are reused until they expire
+jwks_cache = JWKSCache(
+    JWKS_URL,
+    refresh_interval=float(os.environ.get("JWKS_REFRESH_INTERVAL", 600)),
+    retry_interval=float(os.environ.get("JWKS_RETRY_INTERVAL", 30)),
+    ssl_context=ssl_context,
+)
+token_verifier = TokenVerifier(
+    jwks_cache,
+    audience="authenticated",
+    cache=TokenCache(max_entries=int(os.environ.get("TOKEN_CACHE_SIZE", 10000))),
+)
 
 security = HTTPBearer()
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    """Verify the Supabase JWT and return the user ID (sub claim)."""
-    token = credentials.credentials
+async def authenticate(token: str) -> dict:
+    """Verify a Supabase JWT and return its claims; raises 401 unless it names a user.
+
+    Raises 503 while the signing keys have not been loaded.
+    """
     try:
-        signing_key = jwks_client.get_signing_key_from_jwt(token)
-        payload = jwt.decode(
-            token,
-            signing_key.key,
-            algorithms=["ES256"],
-            audience="authenticated",
-        )
-        user_id = payload.get("sub")
-        if not user_id:
+        with stage("auth"):
+            payload = await token_verifier.verify_async(token)
+        if not payload.get("sub"):
             raise HTTPException(status_code=401, detail="Invalid token: no user ID")
-        return user_id
+        return payload
+    except HTTPException:
+        raise
+    except KeysUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
-        print(f"[DEBUG] JWT decode failed: {e}")
+        logger.info("JWT verification failed", extra={"error": str(e)})
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
 
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    """Verify the Supabase JWT and return the user ID (sub claim)."""
+    return (await authenticate(credentials.credentials))["sub"]
+
 # Define the paths
 RESUME_DIR = "resumes"
 OUTPUT_DIR = "outputs"
@@ -63,14 +106,113 @@ class ResumeData(BaseModel):
     xml: str
     save_name: str
     margins: Optional[MarginSettings] = None
+    fit_to_pages: Optional[int] = None  # shrink margins/font/leading to fit this many pages
+    first_page_only: bool = False  # preview only: stop laying out after page one (ignored with fit_to_pages)
+
+class ResponsibilityRef(BaseModel):
+    job: int             # zero-based index into experience/job
+    responsibility: int  # zero-based index into that job's responsibilities
+
+class VariantOverride(BaseModel):
+    label: Optional[str] = None
+    margins: Optional[MarginSettings] = None
+    activate: list[ResponsibilityRef] = []
+    deactivate: list[ResponsibilityRef] = []
+
+class BatchRenderRequest(BaseModel):
+    xml: str
+    margins: Optional[MarginSettings] = None
+    variants: list[VariantOverride]
+
+class LiveMessage(BaseModel):
+    """A client message on /ws/preview; `type` is auth, load, patch or settings."""
+    type: str
+    token: Optional[str] = None      # auth
+    xml: Optional[str] = None        # load
+    ops: Optional[list] = None       # patch, see resumemodel.apply_patch
+    base: Optional[int] = None       # patch: version the ops were made against
+    # load, patch and settings: render settings, kept until changed
+    margins: Optional[MarginSettings] = None
+    fit_to_pages: Optional[int] = None
+    first_page_only: Optional[bool] = None
+
+WS_AUTH_TIMEOUT = float(os.environ.get("WS_AUTH_TIMEOUT", 10))
+
+class TailorRequest(BaseModel):
+    job_description: str
+    save_name: Optional[str] = None  # saved resume to tailor...
+    xml: Optional[str] = None        # ...or the XML being edited
+    per_job: int = 4                 # responsibilities left active in each job
+    borrow: bool = True              # also consider bullets saved for the same company in other resumes
+
+MAX_BATCH_VARIANTS = int(os.environ.get("MAX_BATCH_VARIANTS", 32))
     
 # Create folders if they don't exist
 for folder in [RESUME_DIR, OUTPUT_DIR]:
     if not os.path.exists(folder):
         os.makedirs(folder)
-        print(f"Created folder: {folder}")
+        logger.info("Created folder", extra={"folder": folder})
+
+# Renders run in a process pool so they never block the event loop
+render_executor = RenderExecutor(
+    workers=int(os.environ.get("RENDER_WORKERS", 0)) or None,
+    max_queue=int(os.environ.get("RENDER_QUEUE_SIZE", 16)),
+    timeout=float(os.environ.get("RENDER_TIMEOUT", 20)),
+)
+
+
+def parse_weights(spec: str) -> dict:
+    """Parse "user=weight,user=weight" (RENDER_USER_WEIGHTS) into a dict."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        user_id, _, weight = item.partition("=")
+        weights[user_id.strip()] = float(weight)
+    return weights
+
 
-app = FastAPI()
+# Render slots go to previews before saves before bulk work, shared fairly
+# between users, and each user's render time is metered by a token bucket
+render_admission = RenderAdmission(
+    slots=render_executor.workers,
+    max_queue=render_executor.max_queue,
+    max_user_queue=int(os.environ.get("RENDER_USER_QUEUE_SIZE", 4)),
+    quota_rate=float(os.environ.get("RENDER_QUOTA_RATE", 1.0)),
+    quota_burst=float(os.environ.get("RENDER_QUOTA_BURST", 30)),
+    weights=parse_weights(os.environ.get("RENDER_USER_WEIGHTS", "")),
+    timeout=render_executor.timeout,
+)
+# Per-user admission stats name users, so they are only served to holders of this token
+RENDER_STATS_TOKEN = os.environ.get("RENDER_STATS_TOKEN", "")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    jwks_cache.start()
+    render_executor.start()
+    commit_worker.start()
+    yield
+    render_executor.shutdown()
+    commit_worker.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Per-request stage timings feed /metrics; SERVER_TIMING=1 also returns them to the client
+app.add_middleware(
+    TelemetryMiddleware,
+    server_timing=os.environ.get("SERVER_TIMING", "").lower() in ("1", "true", "yes"),
+    slow_seconds=float(os.environ.get("SLOW_REQUEST_SECONDS", 2)),
+)
+
+# Compress JSON and other text. PDFs are already compressed internally, zips
+# too, and NDJSON batch results must stream line by line
+GZIP_MINIMUM_SIZE = 1024
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=GZIP_MINIMUM_SIZE,
+    compresslevel=6,
+    exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/pdf", "application/x-ndjson"),
+)
 
 # Enable CORS so your React app (running on localhost:5173) can talk to this API
 app.add_middleware(
@@ -80,85 +222,214 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Base resumes directory
+# Base resumes directory: local storage, per-user indexes and the git repo
 BASE_RESUME_DIR = os.path.join(os.path.expanduser("~"), "Documents", "resumes")
 os.makedirs(BASE_RESUME_DIR, exist_ok=True)
 
+# Saved XML, PDFs and thumbnails (STORAGE_BACKEND=local or s3, see storage.py)
+storage = storage_from_env(BASE_RESUME_DIR)
+
+# Rendered PDFs keyed by XML + margins + renderer version (0 disables the memory tier)
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+RENDER_CACHE_DIR = os.environ.get("RENDER_CACHE_DIR") or None
+RENDER_CACHE_DISK_MAX_BYTES = int(os.environ.get("RENDER_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024))
+render_cache = RenderCache(RENDER_CACHE_MAX_BYTES, RENDER_CACHE_DIR, RENDER_CACHE_DISK_MAX_BYTES)
+
+# Embed fonts without hinting or unused tables; PDFs are about a third the size
+COMPACT_PDF = os.environ.get("COMPACT_PDF", "1").lower() in ("1", "true", "yes")
+
+# Per-user metadata (size, pages, hash, JSON summary) so listings never scan or parse.
+# With shared remote storage each replica's index is checked against the bucket
+# every few seconds, so saves made on other replicas show up
+RESUME_INDEX_RECONCILE_SECONDS = os.environ.get("RESUME_INDEX_RECONCILE_SECONDS")
+if RESUME_INDEX_RECONCILE_SECONDS is None and not isinstance(storage, LocalStorage):
+    RESUME_INDEX_RECONCILE_SECONDS = 5
+resume_index = ResumeIndex(
+    os.environ.get("RESUME_INDEX_DIR") or BASE_RESUME_DIR,
+    storage,
+    reconcile_interval=float(RESUME_INDEX_RECONCILE_SECONDS) if RESUME_INDEX_RECONCILE_SECONDS is not None else None,
+)
+
+# At most one preview render per user; queued previews are replaced by newer ones
+preview_scheduler = PreviewScheduler(debounce=float(os.environ.get("PREVIEW_DEBOUNCE", 0)))
+
+# Responsibilities and skills of every saved resume, vectorized for /tailor
+bullet_index = BulletIndex(storage, max_users=int(os.environ.get("BULLET_INDEX_USERS", 64)))
 
-def user_dirs(user_id: str):
-    """Return (xml_dir, pdf_dir) for a given Supabase user, creating them if needed."""
-    user_dir = os.path.join(BASE_RESUME_DIR, user_id)
-    xml_dir = os.path.join(user_dir, "xml")
-    pdf_dir = os.path.join(user_dir, "pdf")
-    os.makedirs(xml_dir, exist_ok=True)
-    os.makedirs(pdf_dir, exist_ok=True)
-    return xml_dir, pdf_dir
+# Every save is a revision; XML is kept as deltas and old PDFs are rendered on demand
+version_history = VersionHistory(storage, max_chain=int(os.environ.get("HISTORY_MAX_CHAIN", 16)))
+
+# Saves are committed in the background; bursts within the window share a commit
+commit_worker = CommitWorker(BASE_RESUME_DIR, window=float(os.environ.get("GIT_COMMIT_WINDOW", 2)))
+
+
+def resume_key(user_id: str, name: str, kind: str) -> str:
+    """Storage key of a user's resume XML (kind "xml") or PDF (kind "pdf")."""
+    return f"{user_id}/{kind}/{name}.{kind}"
+
+
+def thumb_prefix(user_id: str) -> str:
+    return f"{user_id}/thumbs/"
+
+
+async def prune_thumbnails(user_id: str, name: str, keep_hash: Optional[str] = None):
+    """Delete a resume's cached thumbnails, except those of the PDF with `keep_hash`."""
+    prefix = thumb_prefix(user_id)
+    stale = thumbnails.stale(await storage.list(prefix), name, keep_hash)
+    await asyncio.gather(*(storage.delete(prefix + filename) for filename in stale))
+
+
+def margins_dict(margins: Optional[MarginSettings]):
+    """Convert MarginSettings into the dict BuildFromXML expects (None reads them from the XML)."""
+    if margins is None:
+        return None
+    return {
+        'top': margins.top,
+        'bottom': margins.bottom,
+        'left': margins.left,
+        'right': margins.right
+    }
+
+
+def parse_or_400(xml: str) -> Resume:
+    """Parse and validate request XML, rejecting bad input before any rendering."""
+    try:
+        with stage("parse"):
+            return parse_resume(xml)
+    except ResumeValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid resume XML: {e}")
+
+
+async def run_render(user_id: str, priority: int, fn, *args):
+    """Run `fn(*args)` on the render pool once admitted, mapping saturation, quotas and timeouts to HTTP errors."""
+    try:
+        return await render_admission.run(
+            user_id, priority, lambda done: render_executor.run(fn, *args, on_done=done))
+    except RenderQuotaExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e),
+                            headers={"Retry-After": str(max(1, round(e.retry_after)))})
+    except RenderQueueFull:
+        raise HTTPException(status_code=503, detail="Render queue is full, try again shortly",
+                            headers={"Retry-After": "1"})
+    except RenderTimeout:
+        raise HTTPException(status_code=504, detail="Render timed out")
+    except RenderWorkerCrashed:
+        # Only this job is lost; the executor has already started a new pool
+        raise HTTPException(status_code=503, detail="Render worker crashed, try again",
+                            headers={"Retry-After": "1"})
+
+
+async def render_pdf(resume: Resume, margins: Optional[dict], fit_to_pages: Optional[int] = None,
+                     max_pages: Optional[int] = None, *, user_id: str, priority: int):
+    """Render a resume on the render pool for `user_id` at `priority` (see admission.py).
+
+    Returns (pdf_bytes, fit_settings); fit_settings is None unless fit_to_pages is set.
+    """
+    if fit_to_pages is not None and fit_to_pages < 1:
+        raise HTTPException(status_code=400, detail="fit_to_pages must be at least 1")
+    if fit_to_pages:
+        return await run_render(user_id, priority, RenderFitted, resume, fit_to_pages, margins, COMPACT_PDF)
+    return await run_render(user_id, priority, RenderToBytes, resume, margins, max_pages, COMPACT_PDF), None
+
+
+async def cached_render(resume: Resume, margins: Optional[dict], fit_to_pages: Optional[int] = None,
+                        cache_key: Optional[str] = None, max_pages: Optional[int] = None, *,
+                        user_id: str, priority: int):
+    """Return (pdf_bytes, fit_settings, cache_key), rendering only on a cache miss."""
+    with stage("cache"):
+        if cache_key is None:
+            cache_key = render_key(resume, margins, fit_to_pages, max_pages, COMPACT_PDF)
+        entry = render_cache.lookup(cache_key)
+    if entry is not None:
+        return entry[0], entry[1], cache_key
+    pdf_bytes, fit_settings = await render_pdf(resume, margins, fit_to_pages, max_pages,
+                                               user_id=user_id, priority=priority)
+    with stage("cache"):
+        render_cache.put(cache_key, pdf_bytes, fit_settings)
+    return pdf_bytes, fit_settings, cache_key
 
 
 @app.post("/save-resume")
 async def save_resume(data: ResumeData, user_id: str = Depends(get_current_user)):
-    xml_dir, pdf_dir = user_dirs(user_id)
     save_name = data.save_name.replace(" ", "_")
 
-    xml_filename = os.path.join(xml_dir, save_name + ".xml")
-    pdf_filename = os.path.join(pdf_dir, save_name + ".pdf")
+    xml_key = resume_key(user_id, save_name, "xml")
+    pdf_key = resume_key(user_id, save_name, "pdf")
 
     xml_data = data.xml.encode('utf-8')
+    margins = margins_dict(data.margins)
+    # Nothing is written for XML that would not render
+    resume = parse_or_400(data.xml)
 
     try:
-        with open(xml_filename, "wb") as f:
-            f.write(xml_data)
-
-        # Prepare margins dict for BuildFromXML
-        margins_dict = None
-        if data.margins:
-            margins_dict = {
-                'top': data.margins.top,
-                'bottom': data.margins.bottom,
-                'left': data.margins.left,
-                'right': data.margins.right
-            }
-        
-        BuildFromXML(xml_filename, pdf_filename, margins=margins_dict)
-
-        # Git commit (optional – skip if not a repo)
-        try:
-            repo = git.Repo(BASE_RESUME_DIR)
-            repo.index.add([os.path.abspath(pdf_filename), os.path.abspath(xml_filename)])
-            repo.index.commit(f"Update resume: {save_name}")
-        except git.InvalidGitRepositoryError:
-            pass
+        # Render before writing anything, so a refused or failed render (429, 503,
+        # 504) leaves the saved XML, its PDF and the index as they were.
+        # Saving what was just previewed reuses the cached render
+        pdf_bytes, fit_settings, _ = await cached_render(resume, margins, data.fit_to_pages,
+                                                         user_id=user_id, priority=SAVE)
+
+        with stage("file_io"):
+            await storage.write(xml_key, xml_data)
+        with stage("history"):
+            await asyncio.to_thread(version_history.record, user_id, save_name, xml_data, margins, data.fit_to_pages)
+        with stage("file_io"):
+            await storage.write(pdf_key, pdf_bytes)
+        PDF_BYTES.observe(len(pdf_bytes), "save_resume")
+        with stage("index"):
+            pdf_source = source_key(hashlib.sha256(xml_data).hexdigest(), margins, data.fit_to_pages, COMPACT_PDF)
+            await asyncio.to_thread(resume_index.upsert, user_id, save_name, xml_data, pdf_bytes, resume, pdf_source)
+            await asyncio.to_thread(bullet_index.update, user_id, save_name, resume)
+        # Thumbnails of the previous PDF are stale now
+        await prune_thumbnails(user_id, save_name, keep_hash=hashlib.sha256(pdf_bytes).hexdigest())
 
-        return {"status": "success", "message": f"Saved {save_name}"}
+        # Git commit happens in the background (no-op if not a repo or not on local storage).
+        # Only the XML: PDFs are derived and can be rendered again from it
+        xml_path = storage.local_path(xml_key)
+        if xml_path is not None:
+            commit_worker.submit([xml_path], f"Update resume: {save_name}")
 
+        response = {"status": "success", "message": f"Saved {save_name}"}
+        if fit_settings is not None:
+            response["fit"] = fit_settings
+        return response
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/list-resumes")
-async def list_resumes(user_id: str = Depends(get_current_user)):
-    _, pdf_dir = user_dirs(user_id)
+async def list_resumes(sort: str = "name", order: str = "asc", offset: int = 0, limit: Optional[int] = None,
+                       user_id: str = Depends(get_current_user)):
     try:
-        files = [f for f in os.listdir(pdf_dir) if f.endswith('.pdf')]
-        return {"resumes": files}
+        with stage("index"):
+            rows, total = await asyncio.to_thread(
+                resume_index.list, user_id, sort=sort, descending=order == "desc", offset=offset, limit=limit)
+        return {"resumes": [row["name"] + ".pdf" for row in rows], "total": total}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         return {"resumes": [], "error": str(e)}
 
 @app.delete("/delete-resume/{resume_name}")
 async def delete_resume(resume_name: str, user_id: str = Depends(get_current_user)):
-    xml_dir, pdf_dir = user_dirs(user_id)
+    save_name = resume_name.replace('.pdf', '')
     try:
-        xml_filename = os.path.join(xml_dir, resume_name.replace('.pdf', '.xml'))
-        pdf_filename = os.path.join(pdf_dir, resume_name)
-
-        deleted_files = []
-        for path in [xml_filename, pdf_filename]:
-            if os.path.exists(path):
-                os.remove(path)
-                deleted_files.append(path)
+        keys = [resume_key(user_id, save_name, "xml"), resume_key(user_id, save_name, "pdf")]
+        with stage("file_io"):
+            deleted = await asyncio.gather(*(storage.delete(key) for key in keys))
+        deleted_files = [key for key, was_deleted in zip(keys, deleted) if was_deleted]
 
         if not deleted_files:
             raise HTTPException(status_code=404, detail="Resume files not found")
 
+        with stage("index"):
+            await asyncio.to_thread(resume_index.remove, user_id, save_name)
+            await asyncio.to_thread(bullet_index.remove, user_id, save_name)
+        with stage("history"):
+            await asyncio.to_thread(version_history.delete, user_id, save_name)
+        await prune_thumbnails(user_id, save_name)
+
         return {"status": "success", "message": f"Deleted resume: {resume_name}", "deleted_files": deleted_files}
 
     except HTTPException:
@@ -166,73 +437,54 @@ async def delete_resume(resume_name: str, user_id: str = Depends(get_current_use
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def json_view_headers(etag: str, last_modified: float) -> dict:
+    """Validators for a JSON view that GZipMiddleware may send compressed or not.
+
+    The ETag is weak: it names the resume version, which both encodings
+    represent, not either one's bytes, so it never satisfies If-Range.
+    """
+    headers = validator_headers(f"W/{etag}", last_modified)
+    headers["Vary"] = "Accept-Encoding"
+    return headers
+
+
+def json_view(content: dict, headers: dict) -> JSONResponse:
+    response = JSONResponse(content, headers=headers)
+    if len(response.body) >= GZIP_MINIMUM_SIZE:
+        # GZipMiddleware adds the Vary to bodies it may compress
+        del response.headers["Vary"]
+    return response
+
+
 @app.get("/get-resume/{resume_name}")
-async def get_resume(resume_name: str, user_id: str = Depends(get_current_user)):
-    xml_dir, _ = user_dirs(user_id)
+async def get_resume(resume_name: str, request: Request, user_id: str = Depends(get_current_user)):
+    """Return the JSON view of a saved resume, or 304 if the client's copy is current."""
+    save_name = resume_name.replace('.pdf', '')
     try:
-        xml_filename = os.path.join(xml_dir, resume_name.replace('.pdf', '.xml'))
+        with stage("index"):
+            entry = await asyncio.to_thread(resume_index.get, user_id, save_name)
+        if entry is not None and entry["summary"] is not None:
+            headers = json_view_headers(f'"{entry["content_hash"]}"', entry["mtime"])
+            if not_modified(request.headers, headers["ETag"], entry["mtime"]):
+                return Response(status_code=304, headers=headers)
+            return json_view({"save_name": save_name, **entry["summary"]}, headers)
 
-        if not os.path.exists(xml_filename):
+        # Not indexed (or unparseable when indexed): fall back to the stored XML
+        xml_key = resume_key(user_id, save_name, "xml")
+        with stage("file_io"):
+            stat = await storage.stat(xml_key)
+        if stat is None:
             raise HTTPException(status_code=404, detail="Resume XML not found")
+        headers = json_view_headers(stat_etag(stat), stat.mtime)
+        if not_modified(request.headers, headers["ETag"], stat.mtime):
+            return Response(status_code=304, headers=headers)
+
+        with stage("file_io"):
+            xml_data = await storage.read(xml_key)
+        summary = await asyncio.to_thread(resume_summary, xml_data)
+        return json_view({"save_name": save_name, **summary}, headers)
 
-        with open(xml_filename, 'r', encoding='utf-8') as f:
-            xml_content = f.read()
-
-        root = ET.fromstring(xml_content)
-
-        resume_data = {
-            "save_name": resume_name.replace('.pdf', ''),
-            "personal": {
-                "name": root.findtext('personal_info/name', ''),
-                "email": root.findtext('personal_info/email', ''),
-                "phone": root.findtext('personal_info/phone', ''),
-                "location": root.findtext('personal_info/location', '')
-            },
-            "education": [],
-            "skills": [],
-            "experience": [],
-            "margins": {
-                "top": float(root.findtext('margins/top', '0.75')),
-                "bottom": float(root.findtext('margins/bottom', '0.75')),
-                "left": float(root.findtext('margins/left', '0.75')),
-                "right": float(root.findtext('margins/right', '0.75'))
-            }
-        }
-
-        for edu in root.findall('education/institution'):
-            resume_data["education"].append({
-                "institution": edu.findtext('name', ''),
-                "degree": edu.findtext('degree', ''),
-                "gpa": edu.findtext('gpa', ''),
-                "date": edu.findtext('graduation_date', ''),
-                "location": edu.findtext('location', '')
-            })
-
-        for skillgroup in root.findall('skills/skillgroup'):
-            category = skillgroup.findtext('category', '')
-            items = [item.text for item in skillgroup.findall('items/item') if item.text]
-            if category or items:
-                resume_data["skills"].append({"category": category, "items": items})
-
-        for job in root.findall('experience/job'):
-            responsibilities = []
-            for res in job.findall('responsibilities/responsibility'):
-                deactivated = res.get('deactivated', 'false') == 'true'
-                responsibilities.append({
-                    "text": res.text or '',
-                    "active": not deactivated
-                })
-            resume_data["experience"].append({
-                "company": job.findtext('company', ''),
-                "location": job.findtext('location', ''),
-                "duration": job.findtext('duration', ''),
-                "position": job.findtext('position', ''),
-                "responsibilities": responsibilities
-            })
-
-        return resume_data
-
-    except ET.ParseError as e:
+    except ResumeValidationError as e:
         raise HTTPException(status_code=500, detail=f"Failed to parse XML: {str(e)}")
     except HTTPException:
         raise
@@ -241,65 +493,589 @@ async def get_resume(resume_name: str, user_id: str = Depends(get_current_user))
 
 
 @app.get("/resumes")
-async def resumes(user_id: str = Depends(get_current_user)):
+async def resumes(sort: str = "name", order: str = "asc", offset: int = 0, limit: Optional[int] = None,
+                  user_id: str = Depends(get_current_user)):
     """Return JSON array of the current user's resume PDFs."""
-    _, pdf_dir = user_dirs(user_id)
     try:
-        files = [f for f in os.listdir(pdf_dir) if f.endswith('.pdf')]
-        return [{"name": f, "filename": f} for f in files]
+        with stage("index"):
+            rows, _ = await asyncio.to_thread(
+                resume_index.list, user_id, sort=sort, descending=order == "desc", offset=offset, limit=limit)
+        return [
+            {"name": row["name"] + ".pdf", "filename": row["name"] + ".pdf",
+             "mtime": row["mtime"], "size": row["size"], "pages": row["pages"],
+             "thumbnail": thumbnail_url(row["name"], row["pdf_hash"])}
+            for row in rows
+        ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/download-resume/{resume_name}")
-async def download_resume(resume_name: str, user_id: str = Depends(get_current_user)):
-    _, pdf_dir = user_dirs(user_id)
-    pdf_filename = os.path.join(pdf_dir, resume_name)
-    if not os.path.exists(pdf_filename):
+@app.get("/size-report")
+async def size_report(user_id: str = Depends(get_current_user)):
+    """Saved PDF sizes for the current user, largest first, with totals."""
+    try:
+        with stage("index"):
+            rows, _ = await asyncio.to_thread(resume_index.list, user_id, sort="size", descending=True)
+        resumes = [
+            {"name": row["name"] + ".pdf", "size": row["size"], "pages": row["pages"],
+             "bytes_per_page": row["size"] // row["pages"] if row["pages"] else None}
+            for row in rows
+        ]
+        total = sum(row["size"] for row in rows)
+        return {"resumes": resumes, "total_bytes": total,
+                "average_bytes": total // len(rows) if rows else 0, "compact": COMPACT_PDF}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def thumbnail_url(name: str, pdf_hash: Optional[str]) -> Optional[str]:
+    """URL of a resume's first-page thumbnail, or None when thumbnails are unavailable.
+
+    The version parameter changes with the PDF, so the response may be cached for good.
+    """
+    if not thumbnails.available():
+        return None
+    url = f"/thumbnail/{name}.pdf"
+    return f"{url}?v={pdf_hash[:16]}" if pdf_hash else url
+
+
+@app.get("/thumbnail/{resume_name}")
+async def thumbnail(resume_name: str, request: Request, page: int = 1, width: int = thumbnails.THUMBNAIL_WIDTH,
+                    format: str = "png", v: Optional[str] = None, user_id: str = Depends(get_current_user)):
+    """Return an image of one page of a saved resume.
+
+    Thumbnails are rendered on first request and stored next to the PDFs,
+    keyed by the PDF's content hash, so a new save invalidates them.
+    """
+    if format not in thumbnails.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(thumbnails.FORMATS)}")
+    if not thumbnails.MIN_WIDTH <= width <= thumbnails.MAX_WIDTH:
+        raise HTTPException(status_code=400,
+                            detail=f"width must be between {thumbnails.MIN_WIDTH} and {thumbnails.MAX_WIDTH}")
+    if page < 1:
+        raise HTTPException(status_code=400, detail="page must be at least 1")
+    if not thumbnails.available(format):
+        raise HTTPException(status_code=501, detail=f"No rasterizer installed for {format} thumbnails")
+
+    save_name = resume_name.replace('.pdf', '')
+    pdf_key = resume_key(user_id, save_name, "pdf")
+    try:
+        with stage("index"):
+            entry = await asyncio.to_thread(resume_index.get, user_id, save_name)
+        pdf_hash = entry["pdf_hash"] if entry is not None else None
+        pdf_bytes = None
+        if pdf_hash is None:
+            # Indexed before PDF hashes were recorded
+            pdf_bytes = await read_or_404(pdf_key)
+            pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
+
+        etag = f'"{pdf_hash[:16]}-p{page}-w{width}-{format}"'
+        # A versioned URL names one PDF, so browsers need not revalidate it
+        cache_control = "private, max-age=31536000, immutable" if v == pdf_hash[:16] else "private, no-cache"
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if not_modified(request.headers, etag):
+            return Response(status_code=304, headers=headers)
+
+        thumb_key = thumb_prefix(user_id) + thumbnails.thumbnail_filename(save_name, pdf_hash, page, width, format)
+        try:
+            with stage("file_io"):
+                image = await storage.read(thumb_key)
+            return Response(content=image, media_type=thumbnails.FORMATS[format], headers=headers)
+        except FileNotFoundError:
+            pass
+
+        if pdf_bytes is None:
+            pdf_bytes = await read_or_404(pdf_key)
+        try:
+            image = await run_render(user_id, INTERACTIVE, thumbnails.render_thumbnail, pdf_bytes, page, width, format)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        with stage("file_io"):
+            await storage.write(thumb_key, image)
+        await prune_thumbnails(user_id, save_name, keep_hash=pdf_hash)
+        return Response(content=image, media_type=thumbnails.FORMATS[format], headers=headers)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def read_or_404(key: str) -> bytes:
+    try:
+        with stage("file_io"):
+            return await storage.read(key)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Resume not found")
-    response = FileResponse(pdf_filename, media_type='application/pdf', filename=resume_name)
-    response.headers["Access-Control-Allow-Origin"] = "*"
-    return response
 
 
-@app.post("/preview-resume")
-async def preview_resume(data: ResumeData, user_id: str = Depends(get_current_user)):
-    """Generate a PDF preview from XML without saving permanently."""
+async def saved_settings(user_id: str, save_name: str) -> dict:
+    """Margins and fit_to_pages of a resume's latest revision, so re-renders match what was saved."""
+    revisions = await asyncio.to_thread(version_history.revisions, user_id, save_name)
+    return revisions[-1] if revisions else {"margins": None, "fit_to_pages": None}
+
+
+async def restore_pdf(user_id: str, save_name: str):
+    """Render and store the PDF of a resume whose PDF was evicted; return its stat.
+
+    The settings come from the latest revision, so the PDF matches what was saved.
+    """
+    xml_data = await read_or_404(resume_key(user_id, save_name, "xml"))
+    latest = await saved_settings(user_id, save_name)
+    try:
+        resume = await asyncio.to_thread(parse_resume, xml_data)
+        pdf_bytes, _, _ = await cached_render(resume, latest["margins"], latest["fit_to_pages"],
+                                             user_id=user_id, priority=SAVE)
+        pdf_key = resume_key(user_id, save_name, "pdf")
+        with stage("file_io"):
+            await storage.write(pdf_key, pdf_bytes)
+        with stage("index"):
+            pdf_source = source_key(hashlib.sha256(xml_data).hexdigest(), latest["margins"], latest["fit_to_pages"],
+                                    COMPACT_PDF)
+            await asyncio.to_thread(resume_index.upsert, user_id, save_name, xml_data, pdf_bytes, resume, pdf_source)
+        with stage("file_io"):
+            return await storage.stat(pdf_key)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/download-resume/{resume_name}")
+async def download_resume(resume_name: str, request: Request, user_id: str = Depends(get_current_user)):
+    """Send a saved PDF. Supports conditional requests (304), and byte ranges on local storage."""
+    save_name = resume_name.replace('.pdf', '')
+    pdf_key = resume_key(user_id, save_name, "pdf")
+    with stage("file_io"):
+        stat = await storage.stat(pdf_key)
+    if stat is None:
+        stat = await restore_pdf(user_id, save_name)
+    headers = validator_headers(stat_etag(stat), stat.mtime)
+    headers["Access-Control-Allow-Origin"] = "*"
+    if not_modified(request.headers, headers["ETag"], stat.mtime):
+        return Response(status_code=304, headers=headers)
+    if "range" not in request.headers:
+        PDF_BYTES.observe(stat.size, "download_resume")
+
+    path = storage.local_path(pdf_key)
+    if path is not None:
+        # FileResponse serves Range requests, honouring If-Range against these validators
+        return FileResponse(path, media_type='application/pdf', filename=resume_name, headers=headers)
+    headers["Content-Disposition"] = f'attachment; filename="{resume_name}"'
+    return Response(content=await read_or_404(pdf_key), media_type='application/pdf', headers=headers)
+
+
+@app.get("/history/{resume_name}")
+async def history(resume_name: str, user_id: str = Depends(get_current_user)):
+    """List a resume's saved revisions, oldest first, with the bytes each one added to storage."""
+    save_name = resume_name.replace('.pdf', '')
+    try:
+        with stage("history"):
+            revisions = await asyncio.to_thread(version_history.revisions, user_id, save_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not revisions:
+        raise HTTPException(status_code=404, detail="No history for this resume")
+    return {
+        "save_name": save_name,
+        "revisions": [{**entry, "render_url": f"/render-revision/{save_name}.pdf/{entry['rev']}"}
+                      for entry in revisions],
+        "xml_bytes": sum(entry["size"] for entry in revisions),
+        "stored_bytes": sum(entry["stored"] for entry in revisions),
+    }
+
+
+@app.get("/render-revision/{resume_name}/{rev}")
+async def render_revision(resume_name: str, rev: int, request: Request, user_id: str = Depends(get_current_user)):
+    """Render an old revision of a resume with the margins and fit it was saved with."""
+    save_name = resume_name.replace('.pdf', '')
+    try:
+        with stage("history"):
+            xml_data, entry = await asyncio.to_thread(version_history.read, user_id, save_name, rev)
+        resume = await asyncio.to_thread(parse_resume, xml_data)
+        with stage("cache"):
+            cache_key = render_key(resume, entry["margins"], entry["fit_to_pages"], None, COMPACT_PDF)
+        headers = validator_headers(f'"{cache_key}"')
+        if not_modified(request.headers, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        pdf_bytes, _, _ = await cached_render(resume, entry["margins"], entry["fit_to_pages"], cache_key,
+                                         user_id=user_id, priority=INTERACTIVE)
+        PDF_BYTES.observe(len(pdf_bytes), "render_revision")
+        headers["Content-Disposition"] = f'inline; filename="{save_name}.r{rev}.pdf"'
+        return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+    except RevisionNotFound:
+        raise HTTPException(status_code=404, detail=f"Resume has no revision {rev}")
+    except ResumeValidationError as e:
+        # Valid when saved; a newer parser may be stricter
+        raise HTTPException(status_code=500, detail=f"Failed to parse XML: {str(e)}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/export")
+async def export_resumes(pattern: Optional[str] = None, rerender: bool = False,
+                         user_id: str = Depends(get_current_user)):
+    """Stream a zip of the user's PDFs and XMLs.
+
+    `pattern` is a shell-style glob on the resume name (e.g. "Google_*").
+    With `rerender`, PDFs that are missing or older than their XML are
+    rendered fresh for the archive.
+    """
+    xml_files, pdf_files = await asyncio.gather(storage.list(f"{user_id}/xml/"), storage.list(f"{user_id}/pdf/"))
+    names = sorted(
+        {f[:-4] for f in xml_files if f.endswith('.xml')}
+        | {f[:-4] for f in pdf_files if f.endswith('.pdf')}
+    )
+    if pattern:
+        names = [n for n in names if fnmatch.fnmatch(n, pattern)]
+
+    async def add(zip_stream, arcname, key, stat):
+        path = storage.local_path(key)
+        if path is not None:
+            async for chunk in zip_stream.add_file(arcname, path):
+                yield chunk
+        else:
+            yield zip_stream.add_bytes(arcname, await storage.read(key), stat.mtime)
+
+    async def archive():
+        zip_stream = ZipStream()
+        for name in names:
+            xml_key = resume_key(user_id, name, "xml")
+            pdf_key = resume_key(user_id, name, "pdf")
+            xml_stat, pdf_stat = await asyncio.gather(storage.stat(xml_key), storage.stat(pdf_key))
+
+            if xml_stat is not None:
+                async for chunk in add(zip_stream, f"xml/{name}.xml", xml_key, xml_stat):
+                    yield chunk
+
+            stale = xml_stat is not None and (pdf_stat is None or pdf_stat.mtime < xml_stat.mtime)
+            if rerender and stale:
+                pdf_bytes = None
+                try:
+                    resume = await asyncio.to_thread(parse_resume, await storage.read(xml_key))
+                    latest = await saved_settings(user_id, name)
+                    pdf_bytes, _, _ = await cached_render(resume, latest["margins"], latest["fit_to_pages"],
+                                                          user_id=user_id, priority=BULK)
+                except Exception as e:
+                    # Headers are already sent; fall back to the stored PDF
+                    logger.warning("export re-render failed", extra={"resume": name, "error": str(e)})
+                if pdf_bytes is not None:
+                    yield zip_stream.add_bytes(f"pdf/{name}.pdf", pdf_bytes)
+                    continue
+
+            if pdf_stat is not None:
+                async for chunk in add(zip_stream, f"pdf/{name}.pdf", pdf_key, pdf_stat):
+                    yield chunk
+        yield zip_stream.close()
+
+    return StreamingResponse(
+        archive(),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="resumes.zip"'},
+    )
+
+
+def apply_variant(resume: Resume, variant: VariantOverride) -> Resume:
+    """Return `resume` with the variant's responsibility toggles applied."""
+    changes = {}
+    for refs, active in ((variant.activate, True), (variant.deactivate, False)):
+        for ref in refs:
+            changes[(ref.job, ref.responsibility)] = active
     try:
-        # Write XML to a temp file, generate PDF to another temp file
-        with tempfile.NamedTemporaryFile(suffix=".xml", delete=False) as xml_tmp:
-            xml_tmp.write(data.xml.encode("utf-8"))
-            xml_tmp_path = xml_tmp.name
+        return resume.with_active(changes)
+    except IndexError as e:
+        job, responsibility = e.args[0]
+        raise HTTPException(status_code=400, detail=f"No responsibility {responsibility} in job {job}")
+
+
+@app.post("/render-batch")
+async def render_batch(data: BatchRenderRequest, user_id: str = Depends(get_current_user)):
+    """Render many variants of one base resume in parallel.
+
+    The base XML is parsed once and every variant is validated before any
+    rendering starts. Results stream back as NDJSON, one line per variant in
+    completion order: {"index", "label", "etag", "pdf": base64} or
+    {"index", "label", "error"}.
 
-        pdf_tmp_path = xml_tmp_path.replace(".xml", ".pdf")
+    Variants render in parallel across the pool's workers. Memoized section
+    layouts are shared only within a worker process, so a variant reuses the
+    sections of earlier variants rendered by the same worker, not by others.
+    """
+    if len(data.variants) > MAX_BATCH_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_VARIANTS} variants per batch")
+    base = parse_or_400(data.xml)
+
+    jobs = []
+    for variant in data.variants:
+        margins = margins_dict(variant.margins or data.margins)
+        jobs.append((variant.label, apply_variant(base, variant), margins))
+
+    # One user's admission budget: a render on every worker plus the renders they
+    # may queue behind them. Variants past that wait here rather than be refused
+    admitted = asyncio.Semaphore(render_admission.slots + render_admission.max_user_queue)
+
+    async def render_variant(index, label, resume, margins):
+        result = {"index": index, "label": label}
+        try:
+            async with admitted:
+                pdf_bytes, _, cache_key = await cached_render(resume, margins, user_id=user_id, priority=BULK)
+            PDF_BYTES.observe(len(pdf_bytes), "render_batch")
+            result["etag"] = f'"{cache_key}"'
+            result["pdf"] = base64.b64encode(pdf_bytes).decode("ascii")
+        except HTTPException as e:
+            result["error"] = e.detail
+        except Exception as e:
+            result["error"] = str(e)
+        return result
+
+    async def results():
+        tasks = [asyncio.ensure_future(render_variant(i, *job)) for i, job in enumerate(jobs)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@app.post("/tailor")
+async def tailor(data: TailorRequest, user_id: str = Depends(get_current_user)):
+    """Pick the bullets that best match a job posting.
+
+    Scores the posting against every responsibility and skill the user has
+    saved and returns the resume's XML with the best `per_job`
+    responsibilities of each job active, ready for /preview-resume or
+    /save-resume, plus the scores behind the choice.
+    """
+    if data.per_job < 1:
+        raise HTTPException(status_code=400, detail="per_job must be at least 1")
+    if (data.xml is None) == (data.save_name is None):
+        raise HTTPException(status_code=400, detail="Give exactly one of xml and save_name")
+    if data.xml is not None:
+        xml = data.xml
+        parse_or_400(xml)
+    else:
+        xml = (await read_or_404(resume_key(user_id, data.save_name.replace(" ", "_"), "xml"))).decode("utf-8")
+    try:
+        with stage("tailor"):
+            tailored, report = await asyncio.to_thread(
+                bullet_index.tailor, user_id, xml, data.job_description, data.per_job, data.borrow)
+        return {"xml": tailored, **report}
+    except ResumeValidationError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to parse XML: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        margins_dict = None
-        if data.margins:
-            margins_dict = {
-                "top": data.margins.top,
-                "bottom": data.margins.bottom,
-                "left": data.margins.left,
-                "right": data.margins.right,
-            }
 
-        BuildFromXML(xml_tmp_path, pdf_tmp_path, margins=margins_dict)
+@app.post("/preview-resume")
+async def preview_resume(data: ResumeData, request: Request, user_id: str = Depends(get_current_user)):
+    """Generate a PDF preview from XML without saving permanently.
 
-        with open(pdf_tmp_path, "rb") as f:
-            pdf_bytes = f.read()
+    Every response carries X-Preview-Seq, which increases with each request
+    from the same user. A preview still queued when a newer one arrives gets
+    409; clients should drop any response older than the one they display.
+    With first_page_only, layout stops after page one for quicker feedback.
+    """
+    margins = margins_dict(data.margins)
+    # First-page previews stop at the first page break; a page fit needs the whole document
+    max_pages = 1 if data.first_page_only and not data.fit_to_pages else None
+    seq = preview_scheduler.next_seq()
+    resume = parse_or_400(data.xml)
+    with stage("cache"):
+        cache_key = render_key(resume, margins, data.fit_to_pages, max_pages, COMPACT_PDF)
+        entry = render_cache.lookup(cache_key)
+    etag = f'"{cache_key}"'
+    headers = {"ETag": etag, "X-Preview-Seq": str(seq)}
 
-        # Clean up temp files
-        os.unlink(xml_tmp_path)
-        os.unlink(pdf_tmp_path)
+    if not_modified(request.headers, etag):
+        return Response(status_code=304, headers=headers)
 
-        return Response(content=pdf_bytes, media_type="application/pdf")
+    try:
+        if entry is not None:
+            # Cache hits skip the per-user queue
+            pdf_bytes, fit_settings = entry
+        else:
+            pdf_bytes, fit_settings, _ = await preview_scheduler.run(
+                user_id, seq, lambda: cached_render(resume, margins, data.fit_to_pages, cache_key, max_pages,
+                                      user_id=user_id, priority=INTERACTIVE))
+        if fit_settings is not None:
+            # Chosen margins/font/leading so the client can adopt them
+            headers["X-Fit-Settings"] = json.dumps(fit_settings)
+        PDF_BYTES.observe(len(pdf_bytes), "preview_resume")
+        return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
 
+    except PreviewSuperseded as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"X-Preview-Seq": str(seq)})
+    except HTTPException:
+        raise
     except Exception as e:
-        # Clean up on error
-        for p in [xml_tmp_path, pdf_tmp_path]:
-            if os.path.exists(p):
-                os.unlink(p)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.websocket("/ws/preview")
+async def ws_preview(websocket: WebSocket):
+    """Live preview over one connection: authenticate once, then send patches.
+
+    The first message must be {"type": "auth", "token": ...}; the token is
+    verified once and the connection closes with 1008 when it expires, idle
+    or not, unless a new auth message for the same user refreshes it first. Then {"type": "load",
+    "xml": ...} sets the document and {"type": "patch", "ops": [...],
+    "base": version} edits it; either may carry margins, fit_to_pages and
+    first_page_only, as may {"type": "settings"}. Each accepted message is
+    answered with {"type": "ack", "version"}. Renders of the latest version
+    arrive as a JSON header {"type": "pdf", "version", "etag", "bytes"}
+    followed by the PDF in a binary frame, or as {"type": "unchanged"} when
+    the PDF would be the same as the last one sent.
+    """
+    await websocket.accept()
+    try:
+        first = LiveMessage.model_validate_json(await asyncio.wait_for(websocket.receive_text(), WS_AUTH_TIMEOUT))
+        if first.type != "auth" or not first.token:
+            raise HTTPException(status_code=401, detail="First message must be auth")
+        claims = await authenticate(first.token)
+    except HTTPException as e:
+        if e.status_code == 503:
+            await websocket.close(code=1013, reason=e.detail)
+        else:
+            await websocket.close(code=1008, reason="Authentication required")
+        return
+    except (asyncio.TimeoutError, ValidationError, KeyError):
+        await websocket.close(code=1008, reason="Authentication required")
+        return
+    except WebSocketDisconnect:
+        return
+    user_id = claims["sub"]
+    expires = claims.get("exp")
+
+    send_lock = asyncio.Lock()
+
+    async def send(header: dict, pdf_bytes: Optional[bytes] = None):
+        # A header and its PDF frame must not be split by another message
+        async with send_lock:
+            await websocket.send_json(header)
+            if pdf_bytes is not None:
+                await websocket.send_bytes(pdf_bytes)
+                PDF_BYTES.observe(len(pdf_bytes), "ws_preview")
+
+    async def render(resume, margins, fit_to_pages, max_pages):
+        if fit_to_pages is not None and fit_to_pages < 1:
+            raise HTTPException(status_code=400, detail="fit_to_pages must be at least 1")
+        return await cached_render(resume, margins, fit_to_pages, None, max_pages,
+                                   user_id=user_id, priority=INTERACTIVE)
+
+    session = LiveSession(user_id, render, send)
+    render_task = asyncio.create_task(session.run())
+    expired = False
+
+    async def expire():
+        nonlocal expired
+        if not expired:
+            expired = True
+            render_task.cancel()
+            await send({"type": "error", "status": 401, "detail": "Token expired"})
+            await websocket.close(code=1008, reason="Token expired")
+
+    async def close_at_expiry():
+        # Wakes at the expiry in force when it went to sleep; a refresh moves it on
+        while expires is not None:
+            remaining = expires - time.time()
+            if remaining <= 0:
+                await expire()
+                return
+            await asyncio.sleep(remaining)
+
+    expiry_task = asyncio.create_task(close_at_expiry())
+    received = messages = 0
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                break
+            if expired:
+                continue
+            text = frame.get("text")
+            if text is None:
+                await send({"type": "error", "status": 400, "detail": "Messages must be JSON text frames"})
+                continue
+            received += len(text.encode("utf-8"))
+            messages += 1
+            if expires is not None and time.time() >= expires:
+                await expire()
+                break
+            try:
+                message = LiveMessage.model_validate_json(text)
+                if message.type == "auth":
+                    refreshed = await authenticate(message.token or "")
+                    if refreshed["sub"] != user_id:
+                        raise HTTPException(status_code=401, detail="Token is for a different user")
+                    expires = refreshed.get("exp")
+                elif message.type == "load":
+                    if message.xml is None:
+                        raise ResumeValidationError("load needs xml")
+                    resume = parse_resume(message.xml)
+                elif message.type == "patch":
+                    resume = None
+                elif message.type != "settings":
+                    raise ResumeValidationError(f"Unknown message type {message.type!r}")
+
+                changes = {name: getattr(message, name) for name in ("fit_to_pages", "first_page_only")
+                           if name in message.model_fields_set}
+                if "margins" in message.model_fields_set:
+                    changes["margins"] = margins_dict(message.margins)
+                if changes.get("first_page_only") is None:
+                    changes.pop("first_page_only", None)
+                # Settings go in with the edit, before the render loop next runs
+                if message.type == "load":
+                    session.load(resume)
+                elif message.type == "patch":
+                    session.patch(message.ops or [], message.base)
+                session.settings(**changes)
+                if message.type == "settings":
+                    session.touch()
+                await send({"type": "ack", "version": session.version})
+            except (ValidationError, ResumeValidationError) as e:
+                await send({"type": "error", "version": session.version, "status": 400, "detail": str(e)})
+            except HTTPException as e:
+                await send({"type": "error", "version": session.version, "status": e.status_code,
+                            "detail": e.detail})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        render_task.cancel()
+        expiry_task.cancel()
+        logger.info("live preview closed", extra={"user": user_id, "messages": messages,
+                                                  "bytes_received": received, "renders": session.renders,
+                                                  "unchanged": session.unchanged})
+
+
+@app.get("/render-stats")
+async def render_stats():
+    """Queue depth, render latency and cache usage for monitoring."""
+    return {"executor": render_executor.stats(), "cache": render_cache.stats(), "git": commit_worker.stats(),
+            "previews": preview_scheduler.stats(), "history": version_history.stats(),
+            "bullets": bullet_index.stats(), "admission": render_admission.stats()}
+
+@app.get("/render-stats/users")
+async def render_user_stats(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Per-user queue waits, cost and quota for tuning; needs the RENDER_STATS_TOKEN bearer token."""
+    if not RENDER_STATS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(credentials.credentials.encode("utf-8"), RENDER_STATS_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid stats token")
+    return {"users": render_admission.user_stats()}
+
+@app.get("/metrics")
+async def metrics():
+    """Stage and request latency histograms in the Prometheus text format."""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""Supabase JWT verification with cached signing keys and verified tokens.
+
+Signing keys are fetched from the JWKS endpoint by a background thread and
+served from memory (stale-while-revalidate), and verified tokens are cached
+until their `exp` claim, so the request path normally does neither a network
+call nor an ECDSA verification. The request path never fetches keys: until
+the first fetch lands, verification fails fast with KeysUnavailable.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import jwt
+from jwt import PyJWKClient
+
+logger = logging.getLogger(__name__)
+
+
+class KeysUnavailable(Exception):
+    """Raised when no signing keys have been loaded yet, e.g. while the JWKS endpoint is down."""
+
+
+class JWKSCache:
+    """Signing keys from a JWKS endpoint, refreshed in the background.
+
+    Args:
+        jwks_url: URL of the JWKS document.
+        refresh_interval: Seconds between background refreshes.
+        retry_interval: Seconds to wait before retrying a failed refresh; also the
+                        minimum gap between refreshes triggered by unknown keys.
+        ssl_context: Optional SSL context for the HTTPS fetch.
+    """
+
+    def __init__(self, jwks_url: str, refresh_interval: float = 600, retry_interval: float = 30,
+                 ssl_context=None):
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self._client = PyJWKClient(jwks_url, cache_keys=False, cache_jwk_set=False, ssl_context=ssl_context)
+        self._keys = {}
+        self._loaded = False
+        self._last_refresh = 0.0
+        self._last_attempt = 0.0
+        self._wake = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the background refresher; the first fetch happens immediately."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="jwks-refresh", daemon=True)
+                self._thread.start()
+
+    def request_refresh(self):
+        """Ask the background thread to refetch now (e.g. after an unknown `kid`)."""
+        if time.monotonic() - self._last_attempt >= self.retry_interval:
+            self._wake.set()
+
+    def refresh(self):
+        """Fetch the JWKS and atomically swap in the new keys."""
+        keys = {key.key_id: key for key in self._client.get_signing_keys(refresh=True)}
+        self._keys = keys
+        self._loaded = True
+        self._last_refresh = time.monotonic()
+
+    def get_key(self, kid: Optional[str]):
+        """Return the signing key for `kid`, or None if it is not known.
+
+        Raises KeysUnavailable until the background thread has loaded keys.
+        """
+        if not self._loaded:
+            self.start()
+            self.request_refresh()
+            raise KeysUnavailable("Signing keys are not loaded yet")
+        key = self._keys.get(kid)
+        if key is None:
+            self.request_refresh()
+        return key
+
+    def _run(self):
+        while True:
+            self._last_attempt = time.monotonic()
+            try:
+                self.refresh()
+                wait = self.refresh_interval
+            except Exception as e:
+                # Keep serving the previous keys and retry sooner
+                logger.warning("JWKS refresh failed", extra={"error": str(e), "retry_in": self.retry_interval})
+                wait = self.retry_interval
+            self._wake.wait(wait)
+            self._wake.clear()
+
+
+class TokenCache:
+    """Bounded LRU of verified token payloads, each kept until its `exp` claim."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def put(self, token: str, payload: dict):
+        expires_at = payload.get("exp")
+        if not expires_at:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (payload, float(expires_at))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TokenVerifier:
+    """Verifies ES256 access tokens against cached JWKS keys."""
+
+    def __init__(self, jwks: JWKSCache, audience: str = "authenticated", algorithms=("ES256",),
+                 cache: Optional[TokenCache] = None):
+        self.jwks = jwks
+        self.audience = audience
+        self.algorithms = list(algorithms)
+        self.cache = cache if cache is not None else TokenCache()
+
+    async def verify_async(self, token: str) -> dict:
+        """verify() for the event loop: cache hits inline, signature checks on a thread."""
+        payload = self.cache.get(token)
+        if payload is not None:
+            return payload
+        return await asyncio.to_thread(self.verify, token)
+
+    def verify(self, token: str) -> dict:
+        """Return the token's claims, raising jwt.InvalidTokenError if it is not valid.
+
+        Raises KeysUnavailable if no signing keys are loaded yet.
+        """
+        payload = self.cache.get(token)
+        if payload is not None:
+            return payload
+
+        kid = jwt.get_unverified_header(token).get("kid")
+        signing_key = self.jwks.get_key(kid)
+        if signing_key is None:
+            raise jwt.InvalidTokenError(f"Unknown signing key: {kid}")
+        payload = jwt.decode(
+            token,
+            signing_key.key,
+            algorithms=self.algorithms,
+            audience=self.audience,
+        )
+        self.cache.put(token, payload)
+        return payload
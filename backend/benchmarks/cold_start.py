@@ -0,0 +1,62 @@
+"""Cold-start cost of a fresh render process.
+
+Times, in new interpreter processes, how long `import makeresume` takes and
+how long it takes from interpreter start to the first finished PDF, with the
+font metrics cache cold (empty directory) and warm.
+
+Run from backend/:  python benchmarks/cold_start.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {backend!r})
+sys.path.insert(0, {benchmarks!r})
+import makeresume
+imported = time.perf_counter()
+makeresume.GetRenderer().warm()
+warmed = time.perf_counter()
+from corpus import three_page_resume
+makeresume.RenderToBytes(three_page_resume())
+done = time.perf_counter()
+print(json.dumps({{"import": imported - start, "fonts_styles": warmed - imported,
+                   "first_pdf": done - start}}))
+"""
+
+
+def run_child(font_cache_dir: str) -> dict:
+    code = CHILD.format(backend=BACKEND_DIR, benchmarks=os.path.join(BACKEND_DIR, "benchmarks"))
+    env = dict(os.environ, FONT_CACHE_DIR=font_cache_dir)
+    out = subprocess.run([sys.executable, "-c", code], env=env, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out)
+
+
+def report(label: str, samples):
+    print(f"{label}:")
+    for key in ("import", "fonts_styles", "first_pdf"):
+        values = [s[key] * 1000 for s in samples]
+        print(f"  {key:<13} median {statistics.median(values):7.1f} ms   min {min(values):7.1f} ms")
+
+
+def main(runs: int = 5):
+    cold, warm = [], []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cold.append(run_child(cache_dir))
+            warm.append(run_child(cache_dir))
+    report("font cache cold", cold)
+    report("font cache warm", warm)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(a) for a in sys.argv[1:2])))
@@ -0,0 +1,66 @@
+"""Many concurrent savers against one CommitWorker.
+
+Checks that every save ends up in git history, that bursts are coalesced
+into few commits, and that no commit failed on index.lock contention.
+
+Run from backend/:  python benchmarks/commit_stress.py [savers] [saves_per_saver]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import git  # noqa: E402
+
+from commitworker import CommitWorker  # noqa: E402
+
+
+def main(savers: int = 32, saves_per_saver: int = 20):
+    with tempfile.TemporaryDirectory() as repo_dir:
+        git.Repo.init(repo_dir)
+        worker = CommitWorker(repo_dir, window=0.2)
+        worker.start()
+        expected = {}
+        lock = threading.Lock()
+
+        def saver(n: int):
+            for i in range(saves_per_saver):
+                path = os.path.join(repo_dir, f"user{n}", "xml", f"resume{i % 3}.xml")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                content = f"<resume><rev>{n}-{i}</rev></resume>"
+                with open(path, "w") as f:
+                    f.write(content)
+                with lock:
+                    expected[os.path.relpath(path, repo_dir)] = content
+                worker.submit([path], f"Update resume: user{n}/resume{i % 3}")
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=saver, args=(n,)) for n in range(savers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        worker.flush()
+        worker.stop()
+        elapsed = time.perf_counter() - start
+
+        repo = git.Repo(repo_dir)
+        head = repo.head.commit
+        lost = [p for p, content in expected.items()
+                if (head.tree / p).data_stream.read().decode() != content]
+        lock_left = os.path.exists(os.path.join(repo_dir, ".git", "index.lock"))
+        stats = worker.stats()
+
+        print(f"{savers} savers x {saves_per_saver} saves in {elapsed:.2f}s")
+        print(f"  saves {stats['saves']}, commits {stats['commits']}, failures {stats['failures']}")
+        print(f"  lost writes {len(lost)}, index.lock left behind: {lock_left}")
+        ok = not lost and not lock_left and stats["failures"] == 0 and stats["saves"] == savers * saves_per_saver
+        print("OK" if ok else "FAILED")
+        return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(a) for a in sys.argv[1:3])))
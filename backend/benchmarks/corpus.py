@@ -0,0 +1,173 @@
+"""Synthetic resumes for benchmarks.
+
+Documents follow the schema BuildFromXML reads (personal_info, education,
+skills, experience, margins) and are deterministic for a given seed, so
+timings are comparable between runs and machines.
+
+Run from backend/ to write a corpus to disk:
+    python benchmarks/corpus.py OUT_DIR [pages ...]
+"""
+import functools
+import os
+import random
+import sys
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Page counts covered by the benchmark suite, from a typical resume to a
+# pathological one
+CORPUS_PAGES = (1, 2, 3, 5, 10, 20)
+
+BULLET = ("Led a cross-functional team to redesign the {n} pipeline, cutting turnaround "
+          "time by {pct}% and saving hundreds of engineering hours per quarter")
+
+WORDS = ("designed", "built", "automated", "composite", "tooling", "fixtures", "analysis",
+         "production", "robotics", "firmware", "validated", "prototype", "reduced", "cost",
+         "throughput", "sensor", "integration", "CAD", "FEA", "workflow", "customers",
+         "manufacturing", "scheduled", "mentored", "interns", "documentation", "Python")
+LONG_WORD = "Supercalifragilisticexpialidocious-thermomechanical-characterization"
+
+
+def three_page_resume(jobs: int = 8, bullets: int = 6) -> ET.Element:
+    """Fixed-text resume (three pages at the defaults) used by the layout benchmarks."""
+    root = ET.Element("resume")
+    info = ET.SubElement(root, "personal_info")
+    ET.SubElement(info, "name").text = "Jordan Example"
+    ET.SubElement(info, "email").text = "jordan@example.com"
+    education = ET.SubElement(root, "education")
+    for i in range(2):
+        inst = ET.SubElement(education, "institution")
+        ET.SubElement(inst, "name").text = f"University {i}"
+        ET.SubElement(inst, "degree").text = "BS in Mechanical Engineering"
+        ET.SubElement(inst, "gpa").text = "3.9"
+        ET.SubElement(inst, "graduation_date").text = "June 2028"
+        ET.SubElement(inst, "location").text = "Evanston, IL"
+    skills = ET.SubElement(root, "skills")
+    for i in range(4):
+        group = ET.SubElement(skills, "skillgroup")
+        ET.SubElement(group, "category").text = f"Category {i}"
+        items = ET.SubElement(group, "items")
+        for j in range(8):
+            ET.SubElement(items, "item").text = f"Skill {i}.{j}"
+    experience = ET.SubElement(root, "experience")
+    for i in range(jobs):
+        job = ET.SubElement(experience, "job")
+        ET.SubElement(job, "company").text = f"Company {i}"
+        ET.SubElement(job, "location").text = "Burlington, VT"
+        ET.SubElement(job, "duration").text = "July 2024 – Present"
+        ET.SubElement(job, "position").text = "Engineering Intern"
+        resps = ET.SubElement(job, "responsibilities")
+        for j in range(bullets):
+            ET.SubElement(resps, "responsibility").text = BULLET.format(n=f"{i}-{j}", pct=10 + j)
+    return root
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:]
+
+
+def synthetic_resume(jobs: int, seed: int = 0, bullets: int = 5, pathological: bool = False) -> ET.Element:
+    """Random-but-deterministic resume with `jobs` jobs.
+
+    With `pathological`, bullets vary much more in length, some contain
+    unbreakable words and non-Latin text, and a share are deactivated.
+    """
+    rng = random.Random(seed)
+    root = ET.Element("resume")
+    info = ET.SubElement(root, "personal_info")
+    ET.SubElement(info, "name").text = f"Candidate {seed}"
+    ET.SubElement(info, "email").text = f"candidate{seed}@example.com"
+    ET.SubElement(info, "phone").text = "+1 (555) 010-%04d" % rng.randrange(10000)
+    ET.SubElement(info, "location").text = "Evanston, IL"
+
+    education = ET.SubElement(root, "education")
+    for i in range(rng.randint(1, 3)):
+        inst = ET.SubElement(education, "institution")
+        ET.SubElement(inst, "name").text = f"University {i}"
+        ET.SubElement(inst, "degree").text = "BS in " + _sentence(rng, rng.randint(2, 5))
+        ET.SubElement(inst, "gpa").text = f"{rng.uniform(3.0, 4.0):.2f}"
+        ET.SubElement(inst, "graduation_date").text = f"June {2020 + i}"
+        ET.SubElement(inst, "location").text = "Evanston, IL"
+
+    skills = ET.SubElement(root, "skills")
+    for i in range(rng.randint(2, 6) * (3 if pathological else 1)):
+        group = ET.SubElement(skills, "skillgroup")
+        ET.SubElement(group, "category").text = f"Category {i}"
+        items = ET.SubElement(group, "items")
+        for j in range(rng.randint(3, 12)):
+            ET.SubElement(items, "item").text = rng.choice(WORDS).capitalize()
+
+    experience = ET.SubElement(root, "experience")
+    for i in range(jobs):
+        job = ET.SubElement(experience, "job")
+        ET.SubElement(job, "company").text = f"Company {i}"
+        ET.SubElement(job, "location").text = "Burlington, VT"
+        ET.SubElement(job, "duration").text = f"July {2024 - i} – June {2025 - i}"
+        ET.SubElement(job, "position").text = _sentence(rng, rng.randint(2, 6))
+        resps = ET.SubElement(job, "responsibilities")
+        for j in range(max(1, bullets + rng.randint(-2, 2))):
+            if pathological:
+                text = _sentence(rng, rng.choice((4, 20, 60)))
+                if rng.random() < 0.2:
+                    text += " " + LONG_WORD
+                if rng.random() < 0.1:
+                    text += " – résumé naïveté Ελληνικά"
+            else:
+                text = _sentence(rng, rng.randint(10, 28))
+            resp = ET.SubElement(resps, "responsibility")
+            resp.text = text
+            if pathological and rng.random() < 0.15:
+                resp.set("deactivated", "true")
+
+    margins = ET.SubElement(root, "margins")
+    for side in ("top", "bottom", "left", "right"):
+        ET.SubElement(margins, side).text = "0.75"
+    return root
+
+
+def page_count(root: ET.Element) -> int:
+    from makeresume import RenderToBytes
+    from resumeindex import count_pages
+    return count_pages(RenderToBytes(ET.tostring(root)))
+
+
+@functools.lru_cache(maxsize=None)
+def resume_for_pages(pages: int, seed: int = 0) -> bytes:
+    """Serialized synthetic resume that renders to exactly `pages` pages.
+
+    Inputs above five pages are generated in pathological mode. The job
+    count starts from an estimate and is adjusted by rendering.
+    """
+    pathological = pages > 5
+    jobs = max(1, round(pages * (2.2 if pathological else 3)) - 1)
+    count = page_count(synthetic_resume(jobs, seed, pathological=pathological))
+    while count != pages:
+        step = 1 if count < pages else -1
+        if jobs + step < 1:
+            break
+        jobs += step
+        new_count = page_count(synthetic_resume(jobs, seed, pathological=pathological))
+        if (new_count - pages) * (count - pages) < 0 and new_count > pages:
+            # One job overshoots the target: keep the shorter document
+            jobs -= step
+            break
+        count = new_count
+    return ET.tostring(synthetic_resume(jobs, seed, pathological=pathological), encoding="utf-8")
+
+
+def main(out_dir: str, *pages):
+    os.makedirs(out_dir, exist_ok=True)
+    for n in [int(p) for p in pages] or CORPUS_PAGES:
+        path = os.path.join(out_dir, f"synthetic_{n}p.xml")
+        with open(path, "wb") as f:
+            f.write(resume_for_pages(n))
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    sys.exit(main(*sys.argv[1:]))
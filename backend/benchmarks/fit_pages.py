@@ -0,0 +1,88 @@
+"""Fit-to-pages: exact page measurement and a single PDF write per fitted render.
+
+Checks that MeasurePages gives the page count of the real layout across the
+whole fit range, and that RenderFitted writes exactly one PDF and lands on
+the requested page count whenever the most compact settings allow it. Prints
+fitted and plain render times for comparison.
+
+Run from backend/:  python benchmarks/fit_pages.py
+"""
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.pdfgen import canvas  # noqa: E402
+
+import makeresume  # noqa: E402
+from corpus import resume_for_pages  # noqa: E402
+
+FIT_CASES = ((5, 3), (4, 3), (3, 2), (2, 1), (1, 1))
+STEPS = 16
+
+
+def real_pages(resume, settings) -> int:
+    doc = makeresume.MakeDocTemplate(io.BytesIO(), settings["margins"])
+    doc.build(makeresume.BuildStory(resume, settings["font_scale"], settings["leading_scale"], doc.width))
+    return doc.page
+
+
+def measured_pages(resume, settings) -> int:
+    doc = makeresume.MakeDocTemplate(None, settings["margins"])
+    story = makeresume.BuildStory(resume, settings["font_scale"], settings["leading_scale"], doc.width)
+    return makeresume.MeasurePages(doc, story)
+
+
+def main():
+    failures = []
+
+    def check(ok: bool, message: str):
+        print(f"  {'ok  ' if ok else 'FAIL'} {message}")
+        if not ok:
+            failures.append(message)
+
+    makeresume.GetRenderer().warm()
+    writes = []
+    save = canvas.Canvas.save
+    canvas.Canvas.save = lambda self: (writes.append(1), save(self))[1]
+
+    print("Measurement")
+    for pages in (1, 3, 5):
+        resume = makeresume.ParseResume(resume_for_pages(pages))
+        requested = makeresume.ResolveMargins(resume)
+        wrong = [i / STEPS for i in range(STEPS + 1)
+                 if measured_pages(resume, makeresume.FitSettings(requested, i / STEPS))
+                 != real_pages(resume, makeresume.FitSettings(requested, i / STEPS))]
+        check(not wrong, f"{pages}-page resume: measured pages match the real layout at every step {wrong or ''}")
+
+    print("Fitted renders")
+    for source, target in FIT_CASES:
+        xml = resume_for_pages(source)
+        tightest = real_pages(makeresume.ParseResume(xml), makeresume.FitSettings(
+            makeresume.ResolveMargins(makeresume.ParseResume(xml)), 1.0))
+        fitted, plain = [], []
+        for _ in range(3):
+            makeresume.ClearLayoutCache()
+            writes.clear()
+            start = time.perf_counter()
+            _, settings = makeresume.RenderFitted(xml, target)
+            fitted.append(time.perf_counter() - start)
+            pdf_writes = len(writes)
+            makeresume.ClearLayoutCache()
+            start = time.perf_counter()
+            makeresume.RenderToBytes(xml)
+            plain.append(time.perf_counter() - start)
+        check(pdf_writes == 1 and settings["pages"] == max(target, tightest),
+              f"{source} pages into {target}: {settings['pages']} pages, {pdf_writes} PDF written, "
+              f"{statistics.median(fitted) * 1000:.0f} ms (plain render {statistics.median(plain) * 1000:.0f} ms)")
+
+    canvas.Canvas.save = save
+    print("OK" if not failures else "FAILED")
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
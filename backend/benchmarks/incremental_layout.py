@@ -0,0 +1,50 @@
+"""Preview latency for a single-bullet edit, with and without section reuse.
+
+Run from backend/:  python benchmarks/incremental_layout.py
+"""
+import os
+import statistics
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import BULLET, three_page_resume  # noqa: E402
+from makeresume import ClearLayoutCache, RenderToBytes  # noqa: E402
+
+ROUNDS = 20
+
+
+def edit_one_bullet(root: ET.Element, n: int) -> bytes:
+    """Change a single responsibility and return the serialized document."""
+    resp = root.find("experience/job/responsibilities/responsibility")
+    resp.text = BULLET.format(n=f"edit-{n}", pct=n % 90)
+    return ET.tostring(root)
+
+
+def measure(clear_cache: bool) -> list:
+    root = three_page_resume()
+    RenderToBytes(ET.tostring(root))
+    timings = []
+    for n in range(ROUNDS):
+        xml = edit_one_bullet(root, n)
+        if clear_cache:
+            ClearLayoutCache()
+        start = time.perf_counter()
+        RenderToBytes(xml)
+        timings.append(1000 * (time.perf_counter() - start))
+    return timings
+
+
+def main():
+    before = measure(clear_cache=True)
+    after = measure(clear_cache=False)
+    print(f"single-bullet edit, 3-page resume, {ROUNDS} rounds")
+    print(f"  full rebuild:   median {statistics.median(before):7.2f} ms")
+    print(f"  section reuse:  median {statistics.median(after):7.2f} ms")
+    print(f"  speedup:        {statistics.median(before) / statistics.median(after):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
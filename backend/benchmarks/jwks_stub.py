@@ -0,0 +1,161 @@
+"""Authentication against a local stand-in JWKS server, including an outage.
+
+Serves an ES256 key set from a local HTTP server that starts out slow and
+failing, points the API at it, and checks that:
+  - while no keys are loaded, requests fail fast with 503 and the event loop
+    keeps running (nothing fetches keys on the request path)
+  - once the server recovers, the background refresher loads the keys and
+    requests succeed, with few fetches and repeat tokens served from cache
+  - an unknown `kid` is rejected with 401 and triggers at most one refetch
+  - a slow JWKS server does not hold up requests
+
+Run from backend/:  python benchmarks/jwks_stub.py [requests]
+"""
+import asyncio
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+import jwt  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import ec  # noqa: E402
+from jwt.algorithms import ECAlgorithm  # noqa: E402
+
+RETRY_INTERVAL = 0.2
+# Longest the event loop may go without running another task
+MAX_LOOP_STALL = 0.1
+
+
+class StubJWKS:
+    """JWKS endpoint that can fail or answer slowly on request."""
+
+    def __init__(self, jwk: dict):
+        self.jwk = jwk
+        self.up = False
+        self.delay = 0.0
+        self.fetches = 0
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.fetches += 1
+                time.sleep(stub.delay)
+                if not stub.up:
+                    self.send_error(503)
+                    return
+                body = json.dumps({"keys": [stub.jwk]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+
+def token(key, kid: str = "stub-key", sub: str = "stub-user") -> str:
+    claims = {"sub": sub, "aud": "authenticated", "exp": int(time.time()) + 600}
+    return jwt.encode(claims, key, algorithm="ES256", headers={"kid": kid})
+
+
+async def watch_loop(stop: asyncio.Event) -> float:
+    """Longest gap between wakeups of a 10 ms ticker until `stop` is set."""
+    longest, last = 0.0, time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0.01)
+        now = time.perf_counter()
+        longest, last = max(longest, now - last - 0.01), now
+    return longest
+
+
+async def scenario(api, stub: StubJWKS, key, requests: int) -> list:
+    failures = []
+
+    def check(ok: bool, message: str):
+        print(f"  {'ok  ' if ok else 'FAIL'} {message}")
+        if not ok:
+            failures.append(message)
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with api.lifespan(api.app), httpx.AsyncClient(transport=transport, base_url="http://stub") as client:
+        async def get(tok: str):
+            return await client.get("/list-resumes", headers={"Authorization": f"Bearer {tok}"})
+
+        # Slow outage at startup: fail fast, never block the loop
+        stub.delay = 0.3
+        stop = asyncio.Event()
+        watcher = asyncio.create_task(watch_loop(stop))
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(get(token(key, sub=f"user{i}")) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(3 * RETRY_INTERVAL)
+        stop.set()
+        stall = await watcher
+        check(all(r.status_code == 503 for r in responses), f"{requests} requests during the outage get 503")
+        check(elapsed < 1.0, f"they fail fast ({elapsed * 1000:.0f} ms in all)")
+        check(stall < MAX_LOOP_STALL, f"event loop never stalled (longest gap {stall * 1000:.1f} ms)")
+        # One fetch at startup, then at most one per retry interval however many requests ask
+        check(stub.fetches <= 5, f"outage refetches are rate limited ({stub.fetches} fetches)")
+
+        # Recovery: the background thread loads the keys
+        stub.up, stub.delay = True, 0.0
+        deadline = time.monotonic() + 10 * RETRY_INTERVAL
+        response = await get(token(key))
+        while response.status_code == 503 and time.monotonic() < deadline:
+            await asyncio.sleep(RETRY_INTERVAL / 4)
+            response = await get(token(key))
+        check(response.status_code == 200, f"requests succeed once the server is back ({response.status_code})")
+
+        fetches = stub.fetches
+        tokens = [token(key, sub=f"user{i}") for i in range(requests)]
+        responses = await asyncio.gather(*(get(tok) for tok in tokens + tokens))
+        check(all(r.status_code == 200 for r in responses), f"{2 * requests} requests with valid tokens get 200")
+        check(stub.fetches == fetches, "no fetches on the request path once keys are loaded")
+        check(len(api.token_verifier.cache) >= requests, "verified tokens are cached")
+
+        # Unknown kid: 401 and one rate-limited refetch; a slow server blocks nobody
+        stub.delay = 1.0
+        await asyncio.sleep(RETRY_INTERVAL)
+        fetches = stub.fetches
+        start = time.perf_counter()
+        unknown = await asyncio.gather(*(get(token(key, kid="rotated")) for _ in range(requests)))
+        known = await get(tokens[0])
+        elapsed = time.perf_counter() - start
+        check(all(r.status_code == 401 for r in unknown), "tokens with an unknown kid get 401")
+        check(known.status_code == 200 and elapsed < 0.5,
+              f"a slow JWKS server holds up no request ({elapsed * 1000:.0f} ms)")
+        await asyncio.sleep(1.5)
+        check(stub.fetches - fetches <= 1, f"unknown kids trigger at most one refetch ({stub.fetches - fetches})")
+    return failures
+
+
+def main(requests: int = 20):
+    key = ec.generate_private_key(ec.SECP256R1())
+    jwk = json.loads(ECAlgorithm.to_jwk(key.public_key()))
+    jwk.update(kid="stub-key", alg="ES256", use="sig")
+    stub = StubJWKS(jwk)
+    os.environ["SUPABASE_URL"] = stub.url
+    os.environ["JWKS_RETRY_INTERVAL"] = str(RETRY_INTERVAL)
+    import api
+
+    print(f"JWKS stand-in at {stub.url}")
+    failures = asyncio.run(scenario(api, stub, key, requests))
+    print("OK" if not failures else "FAILED")
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(a) for a in sys.argv[1:2])))
@@ -0,0 +1,45 @@
+"""Output size of rendered PDFs, default versus compact.
+
+Renders the synthetic corpus both ways and prints the PDF size, the size
+per page and the median render time, so changes to fonts or output options
+can be checked for bytes on the wire as well as speed.
+
+Run from backend/:  python benchmarks/pdf_size.py [rounds]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import makeresume  # noqa: E402
+from corpus import CORPUS_PAGES, resume_for_pages  # noqa: E402
+from resumeindex import count_pages  # noqa: E402
+
+
+def measure(xml: bytes, compact: bool, rounds: int):
+    pdf = makeresume.RenderToBytes(xml, compact=compact)
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        makeresume.RenderToBytes(xml, compact=compact)
+        timings.append(1000 * (time.perf_counter() - start))
+    return len(pdf), count_pages(pdf), statistics.median(timings)
+
+
+def main(rounds: int = 5):
+    makeresume.GetRenderer().warm()
+    print(f"{'resume':<14}{'default':>12}{'compact':>12}{'saved':>8}{'per page':>12}"
+          f"{'default ms':>12}{'compact ms':>12}")
+    for pages in CORPUS_PAGES:
+        xml = resume_for_pages(pages)
+        size, real_pages, default_ms = measure(xml, False, rounds)
+        compact_size, _, compact_ms = measure(xml, True, rounds)
+        print(f"{f'{pages}p':<14}{size:>12,}{compact_size:>12,}{1 - compact_size / size:>8.0%}"
+              f"{compact_size // real_pages:>12,}{default_ms:>12.1f}{compact_ms:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(a) for a in sys.argv[1:2])))
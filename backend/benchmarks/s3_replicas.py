@@ -0,0 +1,169 @@
+"""S3 storage and per-replica resume indexes against a stubbed S3 client.
+
+Runs S3Storage on an in-memory stand-in for the boto3 client, then two
+replicas, each with its own local ResumeIndex, on the same bucket. Checks
+that saves, rewrites and deletes made through one replica show up in the
+other's listing, and that a listing with nothing changed reads no objects.
+
+Needs boto3 (the s3 extra). Run from backend/:  python benchmarks/s3_replicas.py
+"""
+import datetime
+import hashlib
+import io
+import os
+import sys
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botocore.exceptions import ClientError  # noqa: E402
+
+from corpus import resume_for_pages  # noqa: E402
+from resumeindex import ResumeIndex  # noqa: E402
+from storage import S3Storage  # noqa: E402
+
+BUCKET = "resumes"
+
+
+class StubS3Client:
+    """The parts of a boto3 S3 client that S3Storage uses, over a dict."""
+
+    def __init__(self, page_size: int = 2):
+        self.objects = {}  # key -> (bytes, last modified)
+        self.calls = Counter()
+        self.page_size = page_size
+
+    def _get(self, bucket: str, key: str, operation: str):
+        assert bucket == BUCKET
+        self.calls[operation] += 1
+        if key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey" if operation == "GetObject" else "404"}}, operation)
+        return self.objects[key]
+
+    @staticmethod
+    def _etag(data: bytes) -> str:
+        return f'"{hashlib.md5(data).hexdigest()}"'
+
+    def get_object(self, Bucket, Key):
+        data, _ = self._get(Bucket, Key, "GetObject")
+        return {"Body": io.BytesIO(data)}
+
+    def head_object(self, Bucket, Key):
+        data, modified = self._get(Bucket, Key, "HeadObject")
+        return {"ContentLength": len(data), "LastModified": modified, "ETag": self._etag(data)}
+
+    def put_object(self, Bucket, Key, Body):
+        assert Bucket == BUCKET
+        self.calls["PutObject"] += 1
+        self.objects[Key] = (bytes(Body), datetime.datetime.now(datetime.timezone.utc))
+
+    def delete_object(self, Bucket, Key):
+        assert Bucket == BUCKET
+        self.calls["DeleteObject"] += 1
+        self.objects.pop(Key, None)
+
+    def get_paginator(self, operation):
+        assert operation == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket, Prefix, Delimiter):
+        assert Bucket == BUCKET and Delimiter == "/"
+        keys = sorted(k for k in self.objects if k.startswith(Prefix) and "/" not in k[len(Prefix):])
+        for start in range(0, max(len(keys), 1), self.page_size):
+            self.calls["ListObjectsV2"] += 1
+            page = keys[start:start + self.page_size]
+            yield {"Contents": [{"Key": k, "Size": len(self.objects[k][0]), "LastModified": self.objects[k][1],
+                                 "ETag": self._etag(self.objects[k][0])} for k in page]} if page else {}
+
+
+def fake_pdf(pages: int) -> bytes:
+    return b"%PDF-1.4\n" + b"".join(b"<< /Type /Page >>\n" for _ in range(pages)) + b"%%EOF\n"
+
+
+def main():
+    failures = []
+
+    def check(ok: bool, message: str):
+        print(f"  {'ok  ' if ok else 'FAIL'} {message}")
+        if not ok:
+            failures.append(message)
+
+    client = StubS3Client()
+    storage = S3Storage(BUCKET, prefix="app", client=client, io_threads=1)
+
+    print("S3Storage")
+    storage.write_sync("u/xml/a.xml", b"<resume/>")
+    stat = storage.stat_sync("u/xml/a.xml")
+    check(storage.read_sync("u/xml/a.xml") == b"<resume/>" and "app/u/xml/a.xml" in client.objects,
+          "write and read under the key prefix")
+    check(stat is not None and stat.size == 9 and stat.version, "stat gives size and version")
+    try:
+        storage.read_sync("u/xml/missing.xml")
+        check(False, "reading a missing object raises FileNotFoundError")
+    except FileNotFoundError:
+        check(True, "reading a missing object raises FileNotFoundError")
+    check(storage.stat_sync("u/xml/missing.xml") is None, "stat of a missing object is None")
+    for i in range(5):
+        storage.write_sync(f"u/xml/r{i}.xml", b"x" * i)
+    storage.write_sync("u/xml/nested/deep.xml", b"")
+    scanned = storage.scan_sync("u/xml/")
+    check(sorted(storage.list_sync("u/xml/")) == ["a.xml"] + [f"r{i}.xml" for i in range(5)],
+          "list spans pages and skips nested keys")
+    check(scanned["r3.xml"].version == storage.stat_sync("u/xml/r3.xml").version,
+          "scan gives the same versions as stat")
+    check(storage.delete_sync("u/xml/a.xml") and not storage.delete_sync("u/xml/a.xml"),
+          "delete reports whether the object existed")
+
+    print("Two replicas on one bucket")
+    xml_one, xml_two = resume_for_pages(1), resume_for_pages(2)
+    with tempfile.TemporaryDirectory() as dir_a, tempfile.TemporaryDirectory() as dir_b:
+        index_a = ResumeIndex(dir_a, storage, reconcile_interval=0)
+        index_b = ResumeIndex(dir_b, storage, reconcile_interval=0)
+
+        def save(name: str, xml: bytes, pages: int):
+            storage.write_sync(f"user/xml/{name}.xml", xml)
+            storage.write_sync(f"user/pdf/{name}.pdf", fake_pdf(pages))
+            index_a.upsert("user", name, xml, fake_pdf(pages))
+
+        def names(index) -> list:
+            return [row["name"] for row in index.list("user")[0]]
+
+        save("first", xml_one, 1)
+        check(names(index_b) == ["first"], "B's new index is built from the bucket")
+
+        save("second", xml_two, 2)
+        rows = {row["name"]: row for row in index_b.list("user")[0]}
+        check(sorted(rows) == ["first", "second"], "a save through A shows up in B's existing index")
+        check(rows.get("second", {}).get("pages") == 2, "with its page count")
+
+        save("first", xml_two, 2)
+        entry = index_b.get("user", "first")
+        check(entry is not None and entry["content_hash"] == hashlib.sha256(xml_two).hexdigest()
+              and entry["pages"] == 2, "a rewrite through A updates B's row and summary")
+
+        storage.delete_sync("user/xml/second.xml")
+        storage.delete_sync("user/pdf/second.pdf")
+        index_a.remove("user", "second")
+        check(names(index_b) == ["first"], "a delete through A drops B's row")
+
+        reads = client.calls["GetObject"]
+        names(index_b)
+        names(index_b)
+        check(client.calls["GetObject"] == reads, "listings with nothing changed read no objects")
+
+        index_c = ResumeIndex(dir_b, storage, reconcile_interval=3600)
+        names(index_c)
+        lists = client.calls["ListObjectsV2"]
+        save("third", xml_one, 1)
+        stale = names(index_c)
+        check(client.calls["ListObjectsV2"] == lists and "third" not in stale,
+              "within the interval, reads trust the index")
+
+    storage.close()
+    print("OK" if not failures else "FAILED")
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
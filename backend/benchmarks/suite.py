@@ -0,0 +1,241 @@
+"""Rendering benchmark suite with stored baselines.
+
+Three groups:
+  micro   per-call cost of each section builder (StyledJobHeader, ...) and
+          of parsing a three-page resume into the model
+  render  BuildFromXML end to end on the synthetic corpus, 1 to 20 pages
+  load    concurrent /preview-resume requests through an in-process ASGI client
+
+Every result has a median and p95 latency; micro and render results also
+record peak traced memory. Results are compared with benchmarks/baseline.json
+and anything slower or larger than the tolerance is flagged as a regression
+(exit status 1). Record a new baseline with --save after an intended change.
+
+Run from backend/:  python benchmarks/suite.py [--only micro,render,load] [--save]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import makeresume  # noqa: E402
+from corpus import CORPUS_PAGES, resume_for_pages  # noqa: E402
+from resumemodel import parse_resume  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+GROUPS = ("micro", "render", "load")
+
+# Allowed growth over the baseline before a result counts as a regression
+LATENCY_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.10
+# Differences below these are noise, whatever the ratio
+LATENCY_FLOOR_MS = 0.05
+MEMORY_FLOOR_KIB = 16
+
+LOAD_CONCURRENCY = 8
+LOAD_REQUESTS = 48
+
+
+def summarize(timings_ms, peak_bytes=None) -> dict:
+    timings_ms = sorted(timings_ms)
+    result = {
+        "median_ms": round(statistics.median(timings_ms), 3),
+        "p95_ms": round(timings_ms[min(len(timings_ms) - 1, int(len(timings_ms) * 0.95))], 3),
+    }
+    if peak_bytes is not None:
+        result["peak_kib"] = round(peak_bytes / 1024, 1)
+    return result
+
+
+def bench(fn, rounds: int, setup=None) -> dict:
+    """Time `fn` over `rounds` calls, then measure its peak memory in one traced call."""
+    fn()
+    timings = []
+    for _ in range(rounds):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(1000 * (time.perf_counter() - start))
+    # Tracing slows allocation-heavy code, so memory gets its own call
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return summarize(timings, peak)
+
+
+def run_micro(scale: float) -> dict:
+    xml = resume_for_pages(3)
+    resume = parse_resume(xml)
+    sheet = makeresume.GetStyles()
+    sections = {type(section).__name__: section for section in resume.sections}
+    job = resume.jobs[0]
+    bullet = job.responsibilities[0].text
+    rounds = max(1, int(300 * scale))
+    cases = {
+        "StyledName": lambda: makeresume.StyledName("Candidate 0", sheet),
+        "StyledContactInfo": lambda: makeresume.StyledContactInfo("a@example.com", "+1 555", "Evanston, IL", sheet),
+        "StyledSectionHeader": lambda: makeresume.StyledSectionHeader("EXPERIENCE", sheet),
+        "StyledEduHeader": lambda: makeresume.StyledEduHeader("University 0", "BS", "3.9", "June 2028", "Evanston, IL", sheet),
+        "StyledSkillItem": lambda: makeresume.StyledSkillItem("Category 0", "Python, CAD, FEA", sheet=sheet),
+        "StyledJobHeader": lambda: makeresume.StyledJobHeader("Company 0", "Burlington, VT", "July 2024 – Present",
+                                                              "Engineering Intern", sheet),
+        "StyledResponsibility": lambda: makeresume.StyledResponsibility(bullet, sheet),
+        "BuildPersonalInfo": lambda: makeresume.BuildPersonalInfo(sections["PersonalInfo"], sheet),
+        "BuildEducation": lambda: makeresume.BuildEducation(sections["Education"], sheet),
+        "BuildSkills": lambda: makeresume.BuildSkills(sections["Skills"], sheet),
+        "BuildJob": lambda: makeresume.BuildJob(job, sheet),
+        "parse_resume/3p": lambda: parse_resume(xml),
+    }
+    results = {}
+    for name, fn in cases.items():
+        results[f"micro/{name}"] = bench(fn, rounds)
+    return results
+
+
+def run_render(scale: float) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in CORPUS_PAGES:
+            xml_path = os.path.join(tmp, f"synthetic_{pages}p.xml")
+            with open(xml_path, "wb") as f:
+                f.write(resume_for_pages(pages))
+            pdf_path = os.path.join(tmp, f"synthetic_{pages}p.pdf")
+            rounds = max(3, int(60 * scale / pages))
+            # Clear memoized sections so every round lays out from scratch
+            results[f"render/BuildFromXML/{pages}p"] = bench(
+                lambda: makeresume.BuildFromXML(xml_path, pdf_path), rounds, setup=makeresume.ClearLayoutCache)
+    return results
+
+
+async def _load(app, xml_docs, concurrency: int) -> list:
+    import httpx
+
+    queue = asyncio.Queue()
+    for xml in xml_docs:
+        queue.put_nowait(xml)
+    timings = []
+
+    async def client_loop(client, user: str):
+        while not queue.empty():
+            xml = queue.get_nowait()
+            start = time.perf_counter()
+            # Previews are latest-wins per user, so each client is its own user
+            response = await client.post("/preview-resume", json={"xml": xml, "save_name": "bench"},
+                                         headers={"X-Bench-User": user})
+            response.raise_for_status()
+            timings.append(1000 * (time.perf_counter() - start))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await asyncio.gather(*(client_loop(client, f"bench-user-{n}") for n in range(concurrency)))
+    return timings
+
+
+def run_load(scale: float) -> dict:
+    import api
+
+    def bench_user(request: api.Request) -> str:
+        return request.headers["X-Bench-User"]
+
+    api.app.dependency_overrides[api.get_current_user] = bench_user
+    requests = max(LOAD_CONCURRENCY, int(LOAD_REQUESTS * scale))
+    base = resume_for_pages(2).decode("utf-8")
+    # A distinct name per request defeats the render cache
+    unique = [base.replace("Candidate 0", f"Candidate {i}") for i in range(requests)]
+    repeated = [base.replace("Candidate 0", "Candidate cached")] * requests
+
+    async def scenario():
+        async with api.lifespan(api.app):
+            results = {}
+            for label, docs in (("uncached", unique), ("cached", repeated)):
+                if label == "cached":
+                    await _load(api.app, docs[:1], 1)
+                start = time.perf_counter()
+                timings = await _load(api.app, docs, LOAD_CONCURRENCY)
+                elapsed = time.perf_counter() - start
+                result = summarize(timings)
+                result["rps"] = round(len(docs) / elapsed, 1)
+                results[f"load/preview-resume/{label}/c{LOAD_CONCURRENCY}"] = result
+            return results
+
+    return asyncio.run(scenario())
+
+
+def compare(results: dict, baseline: dict) -> list:
+    """Return (name, metric, baseline, current) for every regression."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric, tolerance, floor in (("median_ms", LATENCY_TOLERANCE, LATENCY_FLOOR_MS),
+                                         ("p95_ms", LATENCY_TOLERANCE, LATENCY_FLOOR_MS),
+                                         ("peak_kib", MEMORY_TOLERANCE, MEMORY_FLOOR_KIB)):
+            if metric not in result or metric not in base:
+                continue
+            current, previous = result[metric], base[metric]
+            if current > previous * (1 + tolerance) and current - previous > floor:
+                regressions.append((name, metric, previous, current))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(GROUPS), help="comma-separated groups to run")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the number of rounds")
+    parser.add_argument("--save", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    runners = {"micro": run_micro, "render": run_render, "load": run_load}
+    results = {}
+    for group in args.only.split(","):
+        results.update(runners[group](args.scale))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    for name, result in results.items():
+        base = baseline.get(name, {})
+        line = f"{name:<45} median {result['median_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms"
+        if "peak_kib" in result:
+            line += f"  peak {result['peak_kib']:9.1f} KiB"
+        if "rps" in result:
+            line += f"  {result['rps']:7.1f} req/s"
+        if "median_ms" in base:
+            line += f"  ({result['median_ms'] / base['median_ms'] - 1:+.0%} vs baseline)"
+        print(line)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline)
+    for name, metric, previous, current in regressions:
+        print(f"REGRESSION {name} {metric}: {previous} -> {current}")
+    if not baseline:
+        print("No baseline recorded yet; run with --save to create one")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
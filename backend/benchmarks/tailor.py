@@ -0,0 +1,64 @@
+"""Latency of /tailor's bullet ranking as a user's saved bullets grow.
+
+Saves synthetic resumes for one user into temporary local storage, then
+times building the user's index from storage, re-indexing one saved
+resume, and tailoring a resume to a job posting against every bullet.
+
+Run from backend/:  python benchmarks/tailor.py [resumes ...]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulletindex import BulletIndex  # noqa: E402
+from corpus import synthetic_resume  # noqa: E402
+from resumemodel import parse_resume  # noqa: E402
+from storage import LocalStorage  # noqa: E402
+
+JOB_POSTING = ("Manufacturing engineer to design composite tooling and fixtures, automate production "
+               "workflow with Python, run FEA and CAD analysis, and validate sensor integration")
+ROUNDS = 20
+
+
+def median_ms(fn, rounds: int = ROUNDS) -> float:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append(1000 * (time.perf_counter() - start))
+    return statistics.median(timings)
+
+
+def main(*sizes: int):
+    sizes = sizes or (10, 100, 500)
+    print(f"{'resumes':>8}{'bullets':>9}{'build ms':>10}{'update ms':>11}{'tailor ms':>11}")
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = LocalStorage(tmp, fsync=False)
+            xmls = [ET.tostring(synthetic_resume(8, seed=i, bullets=6), encoding="unicode") for i in range(count)]
+            for i, xml in enumerate(xmls):
+                storage.write_sync(f"bench/xml/r{i}.xml", xml.encode("utf-8"))
+
+            index = BulletIndex(storage)
+            start = time.perf_counter()
+            index.tailor("bench", xmls[0], JOB_POSTING)
+            build_ms = 1000 * (time.perf_counter() - start)
+            bullets = index.stats()["bullets"]
+
+            edited = parse_resume(xmls[1].replace("Designed", "Designed and shipped", 1))
+            update_ms = median_ms(lambda: index.update("bench", "r1", edited), rounds=5)
+            # The first query after an update reassembles the matrix; time steady state
+            index.tailor("bench", xmls[0], JOB_POSTING)
+            tailor_ms = median_ms(lambda: index.tailor("bench", xmls[0], JOB_POSTING))
+            storage.close()
+        print(f"{count:>8}{bullets:>9,}{build_ms:>10.1f}{update_ms:>11.2f}{tailor_ms:>11.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(a) for a in sys.argv[1:])))
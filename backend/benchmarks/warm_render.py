@@ -0,0 +1,54 @@
+"""Renders that reuse cached section layouts match cold renders.
+
+Renders the same resumes with a series of margins and page fits, each one
+right after the others so the fragment cache is warm, and checks that every
+PDF is byte-identical to a render of the same input with an empty cache.
+
+Run from backend/:  python benchmarks/warm_render.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab import rl_config  # noqa: E402
+
+from corpus import resume_for_pages  # noqa: E402
+from makeresume import ClearLayoutCache, RenderFitted, RenderToBytes  # noqa: E402
+
+MARGINS = (
+    None,
+    {"top": 0.5, "bottom": 0.5, "left": 1.5, "right": 1.5},
+    {"top": 0.75, "bottom": 0.75, "left": 0.4, "right": 0.4},
+    None,
+)
+FIT_PAGES = (None, 1, 2)
+
+
+def render(xml: bytes, margins, fit_to_pages):
+    if fit_to_pages:
+        return RenderFitted(xml, fit_to_pages, margins)[0]
+    return RenderToBytes(xml, margins)
+
+
+def main():
+    # Fixed document IDs and dates, so equal layouts give equal bytes
+    rl_config.invariant = 1
+    mismatches = checked = 0
+    for pages in (1, 3):
+        xml = resume_for_pages(pages)
+        cases = [(margins, fit) for fit in FIT_PAGES for margins in MARGINS]
+        warm = [render(xml, margins, fit) for margins, fit in cases]
+        for (margins, fit), pdf in zip(cases, warm):
+            ClearLayoutCache()
+            checked += 1
+            if render(xml, margins, fit) != pdf:
+                mismatches += 1
+                print(f"  {pages}-page resume, margins {margins}, fit {fit}: warm render differs")
+    print(f"{checked} warm renders compared with cold ones, {mismatches} differ")
+    print("OK" if not mismatches else "FAILED")
+    return 0 if not mismatches else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""Per-user index of resume bullets for tailoring a resume to a job posting.
+
+Every responsibility and skill item in a user's saved resumes is one entry,
+deduplicated by text (the same bullet saved in twenty variants is indexed
+once). Entries are vectorized when first seen into hashed word unigrams and
+bigrams with log term frequencies. The user's entries form one sparse matrix
+held as flat NumPy arrays (row, feature, weight), and document frequencies
+are kept alongside, so a posting is scored against every bullet with TF-IDF
+cosine similarity in a few vectorized operations. Saves and deletes update the entries of the one resume involved;
+the matrix is reassembled from the stored vectors on the next query.
+
+A user's index is built from storage on first use and kept in memory for
+the most recently active users. Like the SQLite index it is per replica.
+"""
+import re
+import threading
+import xml.etree.ElementTree as ET
+import zlib
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from resumemodel import Resume, ResumeValidationError, parse_resume
+
+N_FEATURES = 1 << 18
+# Best-matching skill items listed in a /tailor report
+MAX_SKILLS_REPORTED = 20
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#]*(?:[.\-/][a-z0-9+#]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in into is it its of on or our that the their this to "
+    "was we were will with you your".split()
+)
+
+
+def _hash(term: str) -> int:
+    return zlib.crc32(term.encode("utf-8")) & (N_FEATURES - 1)
+
+
+def vectorize(text: str):
+    """Sparse (indices, weights) of `text`: hashed unigrams and bigrams, 1 + log(tf)."""
+    words = [w for w in _TOKEN_RE.findall(text.lower()) if w not in STOPWORDS]
+    terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not terms:
+        return np.empty(0, np.int32), np.empty(0, np.float32)
+    features, counts = np.unique(np.fromiter((_hash(t) for t in terms), np.int32, len(terms)), return_counts=True)
+    return features, (1 + np.log(counts)).astype(np.float32)
+
+
+class Bullet(NamedTuple):
+    kind: str  # "responsibility" or "skill"
+    group: str  # normalized company for responsibilities, category for skills
+    text: str
+
+
+class _Matrix(NamedTuple):
+    keys: list  # Bullet of each row
+    row_of: dict  # Bullet -> row
+    groups: dict  # (kind, group) -> array of rows
+    rows: np.ndarray  # row of each stored weight
+    indices: np.ndarray  # feature of each stored weight
+    tfidf: np.ndarray
+    idf: np.ndarray
+    norms: np.ndarray
+
+
+def _group(value: str) -> str:
+    return " ".join(value.lower().split())
+
+
+def bullets(resume: Resume) -> list:
+    """The indexable entries of a resume, in document order."""
+    entries = [Bullet("responsibility", _group(job.company), r.text.strip())
+               for job in resume.jobs for r in job.responsibilities]
+    entries += [Bullet("skill", _group(group.category), item.strip())
+                for group in resume.skill_groups for item in group.items]
+    return [b for b in entries if b.text]
+
+
+class _UserIndex:
+    """One user's entries, their vectors and the assembled matrix."""
+
+    def __init__(self):
+        self.entries = {}  # Bullet -> (indices, weights)
+        self.refs = {}  # Bullet -> set of resume names
+        self.by_resume = {}  # resume name -> list of Bullets
+        self.df = np.zeros(N_FEATURES, np.int32)
+        self._matrix = None
+
+    def set_resume(self, name: str, resume: Optional[Resume]):
+        new = list(dict.fromkeys(bullets(resume))) if resume is not None else []
+        for bullet in self.by_resume.pop(name, ()):
+            refs = self.refs[bullet]
+            refs.discard(name)
+            if not refs:
+                del self.refs[bullet]
+                indices, _ = self.entries.pop(bullet)
+                self.df[indices] -= 1
+        for bullet in new:
+            if bullet not in self.entries:
+                indices, weights = vectorize(bullet.text)
+                self.entries[bullet] = indices, weights
+                self.df[indices] += 1
+            self.refs.setdefault(bullet, set()).add(name)
+        if new:
+            self.by_resume[name] = new
+        self._matrix = None
+
+    def matrix(self) -> _Matrix:
+        """The entries as one matrix, assembled again after any change."""
+        if self._matrix is None:
+            keys = list(self.entries)
+            groups = {}
+            for row, bullet in enumerate(keys):
+                groups.setdefault((bullet.kind, bullet.group), []).append(row)
+            vectors = [self.entries[k] for k in keys]
+            lengths = np.fromiter((len(v[0]) for v in vectors), np.int64, len(vectors))
+            rows = np.repeat(np.arange(len(keys)), lengths)
+            indices = np.concatenate([v[0] for v in vectors]) if vectors else np.empty(0, np.int32)
+            weights = np.concatenate([v[1] for v in vectors]) if vectors else np.empty(0, np.float32)
+            idf = (np.log((1 + len(keys)) / (1 + self.df)) + 1).astype(np.float32)
+            tfidf = weights * idf[indices]
+            norms = np.sqrt(np.bincount(rows, tfidf * tfidf, minlength=len(keys)))
+            self._matrix = _Matrix(
+                keys, {bullet: row for row, bullet in enumerate(keys)},
+                {key: np.array(group_rows) for key, group_rows in groups.items()},
+                rows, indices, tfidf, idf, norms,
+            )
+        return self._matrix
+
+    def score(self, text: str) -> np.ndarray:
+        """Cosine similarity of `text` to every row of the matrix."""
+        m = self.matrix()
+        q_indices, q_weights = vectorize(text)
+        query = np.zeros(N_FEATURES, np.float32)
+        query[q_indices] = q_weights * m.idf[q_indices]
+        q_norm = np.linalg.norm(query[q_indices])
+        if not q_norm:
+            return np.zeros(len(m.keys))
+        dots = np.bincount(m.rows, m.tfidf * query[m.indices], minlength=len(m.keys))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(m.norms > 0, dots / (m.norms * q_norm), 0.0)
+
+    def top(self, scores: np.ndarray, kind: str, group: Optional[str], limit: int) -> list:
+        """(bullet, score) of the best `limit` rows of a group with a positive score.
+
+        `group` None takes every group of `kind`.
+        """
+        m = self.matrix()
+        if group is None:
+            parts = [r for (k, _), r in m.groups.items() if k == kind]
+            rows = np.concatenate(parts) if parts else np.empty(0, np.int64)
+        else:
+            rows = m.groups.get((kind, group), np.empty(0, np.int64))
+        rows = rows[scores[rows] > 0]
+        if len(rows) > limit:
+            rows = rows[np.argpartition(-scores[rows], limit - 1)[:limit]]
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return [(m.keys[r], float(scores[r])) for r in rows]
+
+    def score_one(self, text: str, query_text: str) -> float:
+        """Similarity of a bullet that is not in the index (from unsaved XML)."""
+        idf = self.matrix().idf
+        a_idx, a_w = vectorize(text)
+        q_idx, q_w = vectorize(query_text)
+        a = dict(zip(a_idx.tolist(), (a_w * idf[a_idx]).tolist()))
+        q = dict(zip(q_idx.tolist(), (q_w * idf[q_idx]).tolist()))
+        dot = sum(w * q.get(f, 0.0) for f, w in a.items())
+        norm = np.sqrt(sum(w * w for w in a.values()) * sum(w * w for w in q.values()))
+        return float(dot / norm) if norm else 0.0
+
+
+class BulletIndex:
+    """Bullet indexes of the most recently active users.
+
+    Args:
+        storage: Where saved resume XML is, for building a user's index.
+        max_users: Users kept in memory; the least recently used is dropped.
+    """
+
+    def __init__(self, storage, max_users: int = 64):
+        self.storage = storage
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self._user_locks = {}
+
+    def _user_lock(self, user_id: str) -> threading.Lock:
+        with self._lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def _load(self, user_id: str) -> _UserIndex:
+        index = _UserIndex()
+        prefix = f"{user_id}/xml/"
+        for filename in self.storage.list_sync(prefix):
+            if not filename.endswith(".xml"):
+                continue
+            try:
+                index.set_resume(filename[:-4], parse_resume(self.storage.read_sync(prefix + filename)))
+            except (FileNotFoundError, ResumeValidationError):
+                continue
+        return index
+
+    def _get(self, user_id: str, load: bool = True) -> Optional[_UserIndex]:
+        """The user's index; call with the user's lock held."""
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                self._users.move_to_end(user_id)
+                return index
+        if not load:
+            return None
+        index = self._load(user_id)
+        with self._lock:
+            self._users[user_id] = index
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return index
+
+    def update(self, user_id: str, name: str, resume: Optional[Resume]):
+        """Re-index a saved resume, or drop it when `resume` is None.
+
+        A user whose index is not in memory is skipped: it is built from
+        storage, which already holds the save, on first use.
+        """
+        with self._user_lock(user_id):
+            index = self._get(user_id, load=False)
+            if index is not None:
+                index.set_resume(name, resume)
+
+    def remove(self, user_id: str, name: str):
+        self.update(user_id, name, None)
+
+    def tailor(self, user_id: str, xml: str, job_text: str, per_job: int = 4, borrow: bool = True):
+        """Activate the bullets of `xml` that best match `job_text`.
+
+        For each job, the `per_job` best-scoring responsibilities are made
+        active and the rest deactivated; ties (bullets that match nothing)
+        go to those already active. With `borrow`, matching responsibilities
+        the user saved for the same company in other resumes compete too, and
+        the chosen ones are added to the job. Returns (tailored_xml, report).
+        """
+        resume = parse_resume(xml)
+        own_bullets = {job: [Bullet("responsibility", _group(job.company), r.text.strip())
+                             for r in job.responsibilities] for job in resume.jobs}
+        with self._user_lock(user_id):
+            index = self._get(user_id)
+            scores = index.score(job_text)
+            row_of = index.matrix().row_of
+            own_scores = {}
+            for own in own_bullets.values():
+                for b in own:
+                    row = row_of.get(b)
+                    # Bullets of unsaved edits are scored one by one against the same statistics
+                    own_scores[b] = float(scores[row]) if row is not None else index.score_one(b.text, job_text)
+            # Enough per company that `per_job` remain after dropping the job's own bullets
+            borrowable = {} if not borrow else {
+                own[0].group: index.top(scores, "responsibility", own[0].group, per_job + len(own))
+                for own in own_bullets.values() if own
+            }
+            skills = index.top(scores, "skill", None, MAX_SKILLS_REPORTED)
+            indexed = len(scores)
+
+        root = ET.fromstring(xml)
+        job_elems = [job for experience in root.findall("experience") for job in experience.findall("job")]
+        report = []
+        for job, job_elem in zip(resume.jobs, job_elems):
+            group = _group(job.company)
+            own = own_bullets[job]
+            candidates = [(own_scores[b], i, b, False) for i, b in enumerate(own)]
+            own_set = set(own)
+            candidates += [(value, len(own) + i, b, True)
+                           for i, (b, value) in enumerate(borrowable.get(group, ())) if b not in own_set]
+
+            def rank(candidate):
+                value, position, _, borrowed = candidate
+                was_active = not borrowed and job.responsibilities[position].active
+                return -value, not was_active, position
+
+            chosen = {c[1] for c in sorted(candidates, key=rank)[:per_job]}
+
+            entries = []
+            resp_elems = job_elem.findall("responsibilities/responsibility")
+            container = job_elem.find("responsibilities")
+            if container is None:
+                container = ET.SubElement(job_elem, "responsibilities")
+            for value, position, bullet, borrowed in sorted(candidates, key=lambda c: c[1]):
+                active = position in chosen
+                if borrowed and not active:
+                    continue
+                if borrowed:
+                    elem = ET.SubElement(container, "responsibility")
+                    elem.text = bullet.text
+                else:
+                    elem = resp_elems[position]
+                if active:
+                    elem.attrib.pop("deactivated", None)
+                else:
+                    elem.set("deactivated", "true")
+                entries.append({"text": bullet.text, "score": round(value, 4), "active": active,
+                                "borrowed": borrowed})
+            report.append({"company": job.company, "position": job.position, "bullets": entries})
+
+        skills = [{"category": b.group, "item": b.text, "score": round(value, 4)} for b, value in skills]
+        tailored = ET.tostring(root, encoding="unicode", xml_declaration=True)
+        return tailored, {"jobs": report, "skills": skills, "indexed": indexed}
+
+    def stats(self) -> dict:
+        with self._lock:
+            users = list(self._users.values())
+        return {"users": len(users), "bullets": sum(len(u.entries) for u in users)}
@@ -0,0 +1,137 @@
+"""Background worker that batches resume saves into git commits.
+
+All access to the resumes repo goes through one long-lived Repo handle on a
+single thread, so concurrent saves never race on the index lock, and a burst
+of saves within the coalescing window becomes one commit.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+import git
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class CommitWorker:
+    """Commits saved files to a git repo from a background thread.
+
+    Args:
+        repo_dir: Working tree of the repo. If it is not a git repo the
+                  worker stays disabled and submitted saves are dropped.
+        window: Seconds to keep collecting saves after the first one before
+                committing them together.
+    """
+
+    def __init__(self, repo_dir: str, window: float = 2.0):
+        self.repo_dir = repo_dir
+        self.window = window
+        self._queue = queue.Queue()
+        self._repo = None
+        self._thread = None
+        self.commits = 0
+        self.saves = 0
+        self.failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._repo is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        try:
+            self._repo = git.Repo(self.repo_dir)
+        except (git.InvalidGitRepositoryError, git.NoSuchPathError):
+            self._repo = None
+            return
+        self._thread = threading.Thread(target=self._run, name="git-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, paths, message: str):
+        """Queue files for the next commit. Returns immediately."""
+        if self.enabled:
+            self._queue.put(([os.path.abspath(p) for p in paths], message))
+
+    def flush(self):
+        """Block until every queued save has been committed."""
+        if self.enabled:
+            self._queue.join()
+
+    def stop(self):
+        """Commit whatever is pending and stop the worker thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                with telemetry.tracing() as trace, telemetry.stage("git_commit"):
+                    self._commit(batch)
+                telemetry.observe_stages(trace.stages)
+            except Exception as e:
+                self.failures += 1
+                logger.error("git commit failed", extra={"error": str(e), "saves": len(batch)})
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stopping:
+                self._queue.task_done()
+                return
+
+    def _commit(self, batch):
+        paths = {}
+        messages = {}
+        for batch_paths, message in batch:
+            paths.update(dict.fromkeys(batch_paths))
+            messages[message] = None
+        # A file deleted before its commit ran has nothing left to add
+        paths = [p for p in paths if os.path.exists(p)]
+        messages = list(messages)
+        self.saves += len(batch)
+        if not paths:
+            return
+        self._repo.index.add(paths)
+        if len(messages) == 1:
+            summary = messages[0]
+        else:
+            summary = f"Update {len(messages)} resumes\n\n" + "\n".join(messages)
+        self._repo.index.commit(summary)
+        self.commits += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending": self._queue.unfinished_tasks,
+            "saves": self.saves,
+            "commits": self.commits,
+            "failures": self.failures,
+        }
@@ -0,0 +1,66 @@
+"""Streaming zip archives for bulk export.
+
+The archive is written to a non-seekable sink and drained after every chunk,
+so memory use stays at roughly one chunk no matter how many files go in.
+"""
+import asyncio
+import io
+import os
+import time
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, non-seekable buffer that zipfile streams into."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStream:
+    """Builds a zip archive incrementally, handing back bytes as they are produced."""
+
+    def __init__(self):
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def _info(self, arcname: str, mtime: float) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(arcname, date_time=time.localtime(mtime)[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        return info
+
+    async def add_file(self, arcname: str, path: str):
+        """Copy a file into the archive chunk by chunk, yielding archive bytes."""
+        with open(path, "rb") as src, self._zip.open(self._info(arcname, os.path.getmtime(path)), "w") as dest:
+            while chunk := await asyncio.to_thread(src.read, CHUNK_SIZE):
+                dest.write(chunk)
+                data = self._sink.drain()
+                if data:
+                    yield data
+        data = self._sink.drain()
+        if data:
+            yield data
+
+    def add_bytes(self, arcname: str, content: bytes, mtime: float = None) -> bytes:
+        """Add an in-memory file and return the archive bytes it produced."""
+        self._zip.writestr(self._info(arcname, mtime or time.time()), content)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        """Write the central directory and return the final archive bytes."""
+        self._zip.close()
+        return self._sink.drain()
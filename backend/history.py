@@ -0,0 +1,210 @@
+"""Version history of saved resumes, stored as deduplicated XML deltas.
+
+Each save appends a revision to `<user>/history/<name>/log.json`. The XML
+itself goes into a content-addressed object store beside the log, keyed by
+its sha256, so saving content that is already there (an unchanged re-save,
+or a revert) stores nothing new. A new object is a line delta against the
+previous revision, zlib-compressed; every `max_chain` deltas, or when a delta
+would not be smaller, a full snapshot starts a new chain so reading any
+revision touches a bounded number of objects. Storage therefore grows with
+the size of the edits, not with the number of saves.
+
+PDFs are not kept: a revision is rendered on demand from its XML and the
+margin and fit settings it was saved with, through the render cache.
+
+Appends are serialized per resume within this process. Two replicas saving
+the same resume at the same instant can still race on the log.
+"""
+import difflib
+import hashlib
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+from storage import Storage
+
+# Reconstructed XML texts kept in memory, by content hash
+TEXT_CACHE_SIZE = 256
+
+
+class RevisionNotFound(KeyError):
+    pass
+
+
+def _delta(base: list, lines: list) -> list:
+    """Ops rebuilding `lines` from `base`: ["c", start, end] copies base lines, ["i", text] inserts."""
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(["c", i1, i2])
+        elif tag in ("replace", "insert"):
+            ops.append(["i", "".join(lines[j1:j2])])
+    return ops
+
+
+def _apply(base: list, ops: list) -> str:
+    parts = []
+    for op in ops:
+        if op[0] == "c":
+            parts.extend(base[op[1]:op[2]])
+        else:
+            parts.append(op[1])
+    return "".join(parts)
+
+
+class VersionHistory:
+    """Revision logs and delta-compressed XML objects for every user's resumes.
+
+    Args:
+        storage: Where logs and objects are kept (the same backend as the resumes).
+        max_chain: Most deltas read to rebuild one revision.
+    """
+
+    def __init__(self, storage: Storage, max_chain: int = 16):
+        self.storage = storage
+        self.max_chain = max_chain
+        self._texts = OrderedDict()
+        self._texts_lock = threading.Lock()
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self.recorded = 0
+        self.deduplicated = 0
+        self.snapshots = 0
+        self.deltas = 0
+
+    @staticmethod
+    def _prefix(user_id: str, name: str) -> str:
+        return f"{user_id}/history/{name}/"
+
+    def _lock(self, user_id: str, name: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault((user_id, name), threading.Lock())
+
+    def _object_key(self, user_id: str, name: str, digest: str) -> str:
+        return self._prefix(user_id, name) + "objects/" + digest
+
+    def revisions(self, user_id: str, name: str) -> list:
+        """The resume's revisions, oldest first. Empty if it has no history."""
+        try:
+            log = self.storage.read_sync(self._prefix(user_id, name) + "log.json")
+        except FileNotFoundError:
+            return []
+        return json.loads(log)["revisions"]
+
+    def record(self, user_id: str, name: str, xml_data: bytes, margins: Optional[dict] = None,
+               fit_to_pages: Optional[int] = None) -> dict:
+        """Append a revision for a save and return its log entry.
+
+        Saving the latest revision again with the same settings adds nothing
+        and returns that revision.
+        """
+        digest = hashlib.sha256(xml_data).hexdigest()
+        with self._lock(user_id, name):
+            revisions = self.revisions(user_id, name)
+            latest = revisions[-1] if revisions else None
+            if (latest is not None and latest["hash"] == digest
+                    and latest["margins"] == margins and latest["fit_to_pages"] == fit_to_pages):
+                self.deduplicated += 1
+                return latest
+
+            stored = 0
+            object_key = self._object_key(user_id, name, digest)
+            if self.storage.stat_sync(object_key) is None:
+                text = xml_data.decode("utf-8")
+                obj = self._encode(user_id, name, text, latest)
+                self.storage.write_sync(object_key, obj)
+                stored = len(obj)
+                # The next save diffs against this text
+                self._remember(digest, text)
+            else:
+                self.deduplicated += 1
+
+            entry = {
+                "rev": len(revisions) + 1,
+                "hash": digest,
+                "saved_at": time.time(),
+                "size": len(xml_data),
+                "stored": stored,
+                "margins": margins,
+                "fit_to_pages": fit_to_pages,
+            }
+            revisions.append(entry)
+            self.storage.write_sync(self._prefix(user_id, name) + "log.json",
+                                    json.dumps({"revisions": revisions}).encode("utf-8"))
+            self.recorded += 1
+            return entry
+
+    def _encode(self, user_id: str, name: str, text: str, latest: Optional[dict]) -> bytes:
+        """Compressed object for `text`: a delta against the latest revision, or a full snapshot."""
+        snapshot = zlib.compress(json.dumps({"base": None, "depth": 0, "text": text}).encode("utf-8"))
+        if latest is not None:
+            base_obj = self._load_object(user_id, name, latest["hash"])
+            depth = base_obj["depth"] + 1
+            if depth <= self.max_chain:
+                base_lines = self._text(user_id, name, latest["hash"]).splitlines(keepends=True)
+                ops = _delta(base_lines, text.splitlines(keepends=True))
+                delta = zlib.compress(json.dumps(
+                    {"base": latest["hash"], "depth": depth, "ops": ops}).encode("utf-8"))
+                if len(delta) < len(snapshot):
+                    self.deltas += 1
+                    return delta
+        self.snapshots += 1
+        return snapshot
+
+    def _load_object(self, user_id: str, name: str, digest: str) -> dict:
+        return json.loads(zlib.decompress(self.storage.read_sync(self._object_key(user_id, name, digest))))
+
+    def _text(self, user_id: str, name: str, digest: str) -> str:
+        """XML text of the object `digest`, following its delta chain back to a snapshot."""
+        with self._texts_lock:
+            text = self._texts.get(digest)
+            if text is not None:
+                self._texts.move_to_end(digest)
+                return text
+        obj = self._load_object(user_id, name, digest)
+        if obj["base"] is None:
+            text = obj["text"]
+        else:
+            text = _apply(self._text(user_id, name, obj["base"]).splitlines(keepends=True), obj["ops"])
+        if hashlib.sha256(text.encode("utf-8")).hexdigest() != digest:
+            raise ValueError(f"History object {digest} of {name} is corrupt")
+        self._remember(digest, text)
+        return text
+
+    def _remember(self, digest: str, text: str):
+        with self._texts_lock:
+            self._texts[digest] = text
+            self._texts.move_to_end(digest)
+            while len(self._texts) > TEXT_CACHE_SIZE:
+                self._texts.popitem(last=False)
+
+    def read(self, user_id: str, name: str, rev: int):
+        """Return (xml_bytes, log entry) of revision `rev` (1-based).
+
+        Raises RevisionNotFound if the resume has no such revision.
+        """
+        revisions = self.revisions(user_id, name)
+        if not 1 <= rev <= len(revisions):
+            raise RevisionNotFound(rev)
+        entry = revisions[rev - 1]
+        return self._text(user_id, name, entry["hash"]).encode("utf-8"), entry
+
+    def delete(self, user_id: str, name: str):
+        """Remove a resume's log and all of its objects."""
+        prefix = self._prefix(user_id, name)
+        with self._lock(user_id, name):
+            for filename in self.storage.list_sync(prefix + "objects/"):
+                self.storage.delete_sync(prefix + "objects/" + filename)
+            self.storage.delete_sync(prefix + "log.json")
+
+    def stats(self) -> dict:
+        return {
+            "recorded": self.recorded,
+            "deduplicated": self.deduplicated,
+            "snapshots": self.snapshots,
+            "deltas": self.deltas,
+        }
@@ -0,0 +1,57 @@
+"""Validators and conditional-request checks for cacheable responses.
+
+Endpoints build an ETag (from a content hash, or from the stored object's
+version when only a stat is at hand) and a modification time, then answer 304
+when the client's If-None-Match or If-Modified-Since shows it already has
+that version. Browsers revalidate `private, no-cache` responses on every
+use, so an unchanged resume costs one header exchange.
+"""
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from storage import StorageStat
+
+REVALIDATE = "private, no-cache"
+
+
+def stat_etag(stat: StorageStat) -> str:
+    """Strong ETag for a stored object, which is only ever replaced whole."""
+    return f'"{stat.version}"'
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match value against `etag`, as RFC 9110 requires."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def not_modified(headers, etag: str, last_modified: Optional[float] = None) -> bool:
+    """Whether request `headers` show the client already holds this version.
+
+    If-None-Match takes precedence; If-Modified-Since is only consulted
+    without it, and has one-second resolution.
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[float] = None, cache_control: str = REVALIDATE) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
@@ -0,0 +1,106 @@
+"""Per-connection state of the /ws/preview live-preview channel.
+
+A session holds the parsed resume of one editor. The client loads the XML
+once, then sends structural patches (see resumemodel.apply_patch), and
+every change bumps the document version. Renders run one at a time per
+session: edits that arrive while a render is in flight coalesce, and only
+the latest version renders next. A result whose render key matches the PDF
+last sent is announced as unchanged instead of sent again.
+"""
+import asyncio
+from typing import Optional
+
+import telemetry
+from resumemodel import Resume, ResumeValidationError, apply_patch
+
+
+class LiveSession:
+    """Document, render settings and render loop of one connection.
+
+    Args:
+        user_id: Owner of the connection.
+        render: Coroutine function (resume, margins, fit_to_pages, max_pages)
+                returning (pdf_bytes, fit_settings, cache_key).
+        send: Coroutine function (header, pdf_bytes_or_None) that delivers
+              one message to the client.
+    """
+
+    def __init__(self, user_id: str, render, send):
+        self.user_id = user_id
+        self._render = render
+        self._send = send
+        self.resume: Optional[Resume] = None
+        self.version = 0
+        self.margins: Optional[dict] = None
+        self.fit_to_pages: Optional[int] = None
+        self.first_page_only = False
+        self._last_key = None
+        self._changed = asyncio.Event()
+        self.renders = 0
+        self.unchanged = 0
+
+    def settings(self, **changes):
+        """Update margins, fit_to_pages or first_page_only; they apply to the next render."""
+        for name, value in changes.items():
+            setattr(self, name, value)
+
+    def load(self, resume: Resume) -> int:
+        """Replace the document; returns the new version."""
+        self.resume = resume
+        return self._bump()
+
+    def patch(self, operations: list, base: Optional[int] = None) -> int:
+        """Apply a patch against version `base` (if given); returns the new version.
+
+        Raises ResumeValidationError for a bad patch, a stale base or no
+        loaded document. The document is unchanged when it raises.
+        """
+        if self.resume is None:
+            raise ResumeValidationError("Send a load message before patches")
+        if base is not None and base != self.version:
+            raise ResumeValidationError(f"Patch is against version {base}, the document is at {self.version}")
+        self.resume = apply_patch(self.resume, operations)
+        return self._bump()
+
+    def _bump(self) -> int:
+        self.version += 1
+        self._changed.set()
+        return self.version
+
+    def touch(self):
+        """Render again with the current document (after a settings change)."""
+        if self.resume is not None:
+            self._changed.set()
+
+    async def run(self):
+        """Render the latest version whenever the document changes, until cancelled."""
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            version, resume = self.version, self.resume
+            max_pages = 1 if self.first_page_only and not self.fit_to_pages else None
+            try:
+                with telemetry.tracing() as trace:
+                    pdf_bytes, fit_settings, cache_key = await self._render(
+                        resume, self.margins, self.fit_to_pages, max_pages)
+                telemetry.observe_stages(trace.stages)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self._send({"type": "error", "version": version,
+                                  "status": getattr(e, "status_code", 500),
+                                  "detail": getattr(e, "detail", str(e))}, None)
+                continue
+
+            header = {"type": "pdf", "version": version, "etag": f'"{cache_key}"'}
+            if fit_settings is not None:
+                header["fit"] = fit_settings
+            if cache_key == self._last_key:
+                self.unchanged += 1
+                header["type"] = "unchanged"
+                await self._send(header, None)
+                continue
+            self._last_key = cache_key
+            self.renders += 1
+            header["bytes"] = len(pdf_bytes)
+            await self._send(header, pdf_bytes)
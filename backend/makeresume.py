@@ -3,79 +3,383 @@ from reportlab.lib.enums import TA_LEFT, TA_RIGHT
 from reportlab.lib.pagesizes import LETTER
 from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.lib.units import inch
-from reportlab.platypus import (HRFlowable, ListFlowable, Paragraph,
+from reportlab.platypus import (Frame, HRFlowable, ListFlowable, Paragraph,
                                 SimpleDocTemplate, Spacer, Table, TableStyle)
-import xml.etree.ElementTree as ET
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+import hashlib
+import io
+import json
+import logging
+import struct
+import tempfile
+import zlib
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+import reportlab
+from reportlab.pdfbase import pdfdoc, pdfmetrics
+from reportlab.pdfbase.ttfonts import (FF_NONSYMBOLIC, FF_SYMBOLIC, TTEncoding, TTFNameBytes, TTFont,
+                                       TTFontFace, TTFontMaker, TTFontParser)
 from reportlab.pdfgen import canvas
+from resumemodel import (Education, Experience, Job, PersonalInfo, Resume, Skills,
+                         load_resume, parse_resume)
+from telemetry import stage
+
+logger = logging.getLogger(__name__)
 
 # get the root direcotry of the project
 import os
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-# 1. Register the font
-# RegisterFont(internal_name, font_file_path)
-pdfmetrics.registerFont(TTFont('TimesNR', os.path.join(ROOT_DIR, 'fonts/times.ttf')))
-
-styles = getSampleStyleSheet()
-
-styles.add(ParagraphStyle(
-    name="Name",
-    fontName="TimesNR",
-    fontSize=24,
-    spaceAfter=18,
-))
-
-styles.add(ParagraphStyle(
-    name="SectionHeader",
-    fontName="TimesNR",
-    fontSize=14,
-    textColor=black,
-    spaceBefore=0,
-    spaceAfter=6,
-))
-
-styles.add(ParagraphStyle(
-    name="JobTitle",
-    fontName="TimesNR",
-    fontSize=12,
-))
-
-styles.add(ParagraphStyle(
-    name="DateLocation",
-    fontName="TimesNR",
-    fontSize=12,
-    alignment=TA_RIGHT,
-    leading=14
-))
-
-styles.add(ParagraphStyle(
-    name="JobMeta",
-    fontName="TimesNR",
-    fontSize=12,
-    textColor=grey,
-    spaceBefore =2,
-    spaceAfter=4,
-))
-
-styles.add(ParagraphStyle(
-    name="Body",
-    fontName="TimesNR",
-    fontSize=12,
-    leading=14,
-    spaceAfter=0,
-))
-
-styles.add(ParagraphStyle(
-    name="Skills",
-    fontName="TimesNR",
-    fontSize=12,
-))
+FONTS = {"TimesNR": os.path.join(ROOT_DIR, 'fonts/times.ttf')}
+
+# Parsed font metrics are cached here as JSON so later processes skip TTF parsing
+FONT_CACHE_DIR = os.environ.get("FONT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "ezapp", "fonts"))
+
+SCALED_STYLE_NAMES = ("Name", "SectionHeader", "JobTitle", "DateLocation", "JobMeta", "Body", "Skills")
+
+
+def _EncodeFontState(value):
+    """Turn parsed font metrics into JSON-safe data that _DecodeFontState restores exactly."""
+    if isinstance(value, TTFNameBytes):
+        return {"name": value.ustr}
+    if isinstance(value, bytes):
+        return {"bytes": value.hex()}
+    if isinstance(value, tuple):
+        return {"tuple": [_EncodeFontState(v) for v in value]}
+    if isinstance(value, list):
+        return [_EncodeFontState(v) for v in value]
+    if isinstance(value, dict):
+        # Keys are glyph and code point numbers as well as strings
+        return {"items": [[_EncodeFontState(k), _EncodeFontState(v)] for k, v in value.items()]}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise TypeError(f"Cannot cache font metric of type {type(value).__name__}")
+
+def _DecodeFontState(value):
+    if isinstance(value, list):
+        return [_DecodeFontState(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    (kind, data), = value.items()
+    if kind == "name":
+        return TTFNameBytes(data.encode("utf-8"))
+    if kind == "bytes":
+        return bytes.fromhex(data)
+    if kind == "tuple":
+        return tuple(_DecodeFontState(v) for v in data)
+    if kind == "items":
+        return {_DecodeFontState(k): _DecodeFontState(v) for k, v in data}
+    raise ValueError(f"Unknown font cache entry {kind!r}")
+
+def LoadTTFont(name: str, path: str, cache_dir: str = None):
+    """Load a TrueType font, reusing metrics parsed by an earlier process when cached.
+
+    The cache holds plain data (JSON), never code, keyed by a hash of the
+    font file, so a changed font or a tampered cache file cannot run anything.
+    """
+    if not cache_dir:
+        font = TTFont(name, path)
+        font.face.__class__ = SubsetCachingFace
+        return font
+    # The raw font program is needed anyway to embed subsets
+    with open(path, "rb") as f:
+        ttf_data = f.read()
+    key = hashlib.sha256(ttf_data)
+    key.update(f":{reportlab.Version}".encode("utf-8"))
+    cache_path = os.path.join(cache_dir, f"{name}-{key.hexdigest()}.json")
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        font_state, face_state = _DecodeFontState(cached["font"]), _DecodeFontState(cached["face"])
+    except FileNotFoundError:
+        cached = None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning("ignoring unreadable font cache", extra={"path": cache_path, "error": str(e)})
+        cached = None
+    if cached is None:
+        font = TTFont(name, path)
+        font_state = {k: v for k, v in vars(font).items() if k not in ("face", "state", "encoding")}
+        face_state = {k: v for k, v in vars(font.face).items() if k not in ("_pdfScale", "_ttf_data")}
+        try:
+            encoded = json.dumps({"font": _EncodeFontState(font_state), "face": _EncodeFontState(face_state)})
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(encoded)
+            os.replace(tmp_path, cache_path)
+        except (OSError, TypeError) as e:
+            logger.warning("font cache write failed", extra={"path": cache_path, "error": str(e)})
+        font.face.__class__ = SubsetCachingFace
+        return font
+
+    face = SubsetCachingFace.__new__(SubsetCachingFace)
+    face.__dict__.update(face_state)
+    units = face.unitsPerEm
+    face._pdfScale = (lambda x: x) if units == 1000 else (lambda x: x * 1000 / units)
+    face._ttf_data = ttf_data
+    font = TTFont.__new__(TTFont)
+    font.__dict__.update(font_state)
+    font.encoding = TTEncoding()
+    font.face = face
+    font.state = WeakKeyDictionary()
+    return font
+
+
+# Tables a PDF viewer reads from an embedded TrueType subset. Compact output
+# drops the rest (name, OS/2, post and the hinting programs) along with the
+# hinting instructions in each glyph, which are most of a glyph's bytes.
+COMPACT_FONT_TABLES = ("cmap", "glyf", "head", "hhea", "hmtx", "loca", "maxp")
+
+# Composite glyph component flags
+_ARG_1_AND_2_ARE_WORDS = 0x0001
+_WE_HAVE_A_SCALE = 0x0008
+_MORE_COMPONENTS = 0x0020
+_WE_HAVE_AN_X_AND_Y_SCALE = 0x0040
+_WE_HAVE_A_TWO_BY_TWO = 0x0080
+_WE_HAVE_INSTRUCTIONS = 0x0100
+
+def _StripGlyphInstructions(glyph: bytes) -> bytes:
+    if not glyph:
+        return glyph
+    contours = struct.unpack(">h", glyph[:2])[0]
+    if contours >= 0:
+        # Simple glyph: header, contour end points, then the instructions
+        pos = 10 + 2 * contours
+        length = struct.unpack(">H", glyph[pos:pos + 2])[0]
+        return glyph[:pos] + b"\0\0" + glyph[pos + 2 + length:]
+    # Composite glyph: instructions follow the last component
+    glyph = bytearray(glyph)
+    pos, flags = 10, _MORE_COMPONENTS
+    while flags & _MORE_COMPONENTS:
+        flags = struct.unpack(">H", glyph[pos:pos + 2])[0]
+        glyph[pos:pos + 2] = struct.pack(">H", flags & ~_WE_HAVE_INSTRUCTIONS)
+        pos += 4 + (4 if flags & _ARG_1_AND_2_ARE_WORDS else 2)
+        if flags & _WE_HAVE_A_SCALE:
+            pos += 2
+        elif flags & _WE_HAVE_AN_X_AND_Y_SCALE:
+            pos += 4
+        elif flags & _WE_HAVE_A_TWO_BY_TWO:
+            pos += 8
+    return bytes(glyph[:pos])
+
+def CompactFontProgram(program: bytes) -> bytes:
+    """Shrink a TrueType subset to the tables PDF viewers use, without hinting."""
+    font = TTFontParser(io.BytesIO(program))
+    head = font.get_table("head")
+    long_offsets = struct.unpack(">h", head[50:52])[0]
+    loca = font.get_table("loca")
+    if long_offsets:
+        offsets = struct.unpack(">%dL" % (len(loca) // 4), loca)
+    else:
+        offsets = [offset * 2 for offset in struct.unpack(">%dH" % (len(loca) // 2), loca)]
+
+    glyph_data = font.get_table("glyf")
+    glyf, new_offsets, pos = [], [], 0
+    for start, end in zip(offsets, offsets[1:]):
+        glyph = _StripGlyphInstructions(glyph_data[start:end])
+        glyph += b"\0" * (-len(glyph) % 4)
+        new_offsets.append(pos)
+        glyf.append(glyph)
+        pos += len(glyph)
+    new_offsets.append(pos)
+
+    output = TTFontMaker()
+    for tag in COMPACT_FONT_TABLES:
+        if tag not in ("glyf", "loca", "head"):
+            output.add(tag, font.get_table(tag))
+    output.add("glyf", b"".join(glyf))
+    long_offsets = int((pos + 1) >> 1 > 0xFFFF)
+    if long_offsets:
+        output.add("loca", struct.pack(">%dL" % len(new_offsets), *new_offsets))
+    else:
+        output.add("loca", struct.pack(">%dH" % len(new_offsets), *(o >> 1 for o in new_offsets)))
+    output.add("head", head[:50] + struct.pack(">h", long_offsets) + head[52:])
+    return output.makeStream()
+
+# Embedded font programs, keyed by font file, glyph set and output options
+SUBSET_CACHE_SIZE = 64
+_subset_cache = OrderedDict()
+
+class SubsetCachingFace(TTFontFace):
+    """TTFontFace that reuses the font program it embedded for a glyph set.
+
+    Building and compressing a subset is a sizeable share of a render, and
+    consecutive renders of a resume mostly use the same characters. A PDF
+    document with `compactFonts` set embeds CompactFontProgram subsets.
+    """
+
+    def addSubsetObjects(self, doc, fontname, subset):
+        compact = getattr(doc, "compactFonts", False)
+        key = (self.filename, tuple(subset), compact, bool(doc.compression))
+        entry = _subset_cache.get(key)
+        if entry is None:
+            program = self.makeSubset(subset)
+            if compact:
+                program = CompactFontProgram(program)
+            entry = (len(program), zlib.compress(program) if doc.compression else program)
+            _subset_cache[key] = entry
+            if len(_subset_cache) > SUBSET_CACHE_SIZE:
+                _subset_cache.popitem(last=False)
+        else:
+            _subset_cache.move_to_end(key)
+
+        fontFile = pdfdoc.PDFStream()
+        fontFile.content = entry[1]
+        fontFile.dictionary['Length1'] = entry[0]
+        if doc.compression:
+            # Already compressed; a Filter entry stops PDFStream encoding it again
+            fontFile.dictionary['Filter'] = pdfdoc.PDFArray([pdfdoc.PDFName(pdfdoc.PDFZCompress.pdfname)])
+        fontFileRef = doc.Reference(fontFile, 'fontFile:%s(%s)' % (self.filename, fontname))
+
+        fontDescriptor = pdfdoc.PDFDictionary({
+            'Type': '/FontDescriptor',
+            'Ascent': self.ascent,
+            'CapHeight': self.capHeight,
+            'Descent': self.descent,
+            'Flags': (self.flags & ~FF_NONSYMBOLIC) | FF_SYMBOLIC,
+            'FontBBox': pdfdoc.PDFArray(self.bbox),
+            'FontName': pdfdoc.PDFName(fontname),
+            'ItalicAngle': self.italicAngle,
+            'StemV': self.stemV,
+            'FontFile2': fontFileRef,
+            'MissingWidth': self.defaultWidth,
+            })
+        return doc.Reference(fontDescriptor, 'fontDescriptor:' + fontname)
+
+
+def _BuildStyleSheet():
+    sheet = getSampleStyleSheet()
+
+    sheet.add(ParagraphStyle(
+        name="Name",
+        fontName="TimesNR",
+        fontSize=24,
+        spaceAfter=18,
+    ))
+
+    sheet.add(ParagraphStyle(
+        name="SectionHeader",
+        fontName="TimesNR",
+        fontSize=14,
+        textColor=black,
+        spaceBefore=0,
+        spaceAfter=6,
+    ))
+
+    sheet.add(ParagraphStyle(
+        name="JobTitle",
+        fontName="TimesNR",
+        fontSize=12,
+    ))
+
+    sheet.add(ParagraphStyle(
+        name="DateLocation",
+        fontName="TimesNR",
+        fontSize=12,
+        alignment=TA_RIGHT,
+        leading=14
+    ))
+
+    sheet.add(ParagraphStyle(
+        name="JobMeta",
+        fontName="TimesNR",
+        fontSize=12,
+        textColor=grey,
+        spaceBefore =2,
+        spaceAfter=4,
+    ))
+
+    sheet.add(ParagraphStyle(
+        name="Body",
+        fontName="TimesNR",
+        fontSize=12,
+        leading=14,
+        spaceAfter=0,
+    ))
+
+    sheet.add(ParagraphStyle(
+        name="Skills",
+        fontName="TimesNR",
+        fontSize=12,
+    ))
+    return sheet
+
+
+class RendererContext:
+    """Fonts and styles shared by every render in this process, set up on first use.
+
+    Importing makeresume stays cheap; the first render (or warm()) registers
+    the fonts and builds the stylesheet.
+    """
+
+    def __init__(self, fonts: dict = None, font_cache_dir: str = FONT_CACHE_DIR):
+        self.fonts = FONTS if fonts is None else fonts
+        self.font_cache_dir = font_cache_dir
+        self._fonts_registered = False
+        self._styles = None
+        self._scaled_styles = {}
+
+    def register_fonts(self):
+        if not self._fonts_registered:
+            for name, path in self.fonts.items():
+                pdfmetrics.registerFont(LoadTTFont(name, path, self.font_cache_dir))
+            self._fonts_registered = True
+
+    @property
+    def styles(self):
+        if self._styles is None:
+            self.register_fonts()
+            self._styles = _BuildStyleSheet()
+        return self._styles
+
+    def get_styles(self, font_scale: float = 1.0, leading_scale: float = 1.0):
+        """Return the stylesheet with font sizes and leading scaled (cached per scale)."""
+        if font_scale == 1.0 and leading_scale == 1.0:
+            return self.styles
+        key = (font_scale, leading_scale)
+        sheet = self._scaled_styles.get(key)
+        if sheet is None:
+            sheet = {}
+            for name in SCALED_STYLE_NAMES:
+                base = self.styles[name]
+                sheet[name] = ParagraphStyle(
+                    name=name,
+                    parent=base,
+                    fontSize=base.fontSize * font_scale,
+                    leading=base.leading * font_scale * leading_scale,
+                )
+            self._scaled_styles[key] = sheet
+        return sheet
+
+    def warm(self):
+        """Register fonts and build styles now rather than on the first render."""
+        self.styles
+
+
+_renderer = None
+
+def GetRenderer() -> RendererContext:
+    """Return this process's shared RendererContext."""
+    global _renderer
+    if _renderer is None:
+        _renderer = RendererContext()
+    return _renderer
+
+def GetStyles(font_scale: float = 1.0, leading_scale: float = 1.0):
+    """Return the (optionally scaled) stylesheet from the shared renderer context."""
+    return GetRenderer().get_styles(font_scale, leading_scale)
+
+def __getattr__(name):
+    # `makeresume.styles` keeps working, built lazily on first access
+    if name == "styles":
+        return GetRenderer().styles
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 SECTION_SPACING = 2  # Spacing before section content and between sections
 
+# Bump whenever fonts, styles or layout change so cached renders are invalidated
+RENDERER_VERSION = "2"
+
 JOB_HEADER_TABLE_STYLE = (TableStyle(
     [("VALIGN", (0, 0), (-1, -1), "TOP"),
      ("LEFTPADDING", (0, 0), (-1, -1), 0),
@@ -84,19 +388,113 @@ JOB_HEADER_TABLE_STYLE = (TableStyle(
      ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
     ]))
 
-doc = SimpleDocTemplate(
-    "resume.pdf",
-    pagesize=LETTER,
-    rightMargin=0.75 * inch,
-    leftMargin=0.75 * inch,
-    topMargin=0.75 * inch,
-    bottomMargin=0.75 * inch,
-)
+# Memoized section fragments, keyed by the (immutable) section model
+FRAGMENT_CACHE_SIZE = 256
+_fragment_cache = OrderedDict()
+
+
+class CachedParagraph(Paragraph):
+    """Paragraph that remembers its line breaks for each available width.
+
+    Fragments are reused across renders, so an unchanged paragraph skips
+    ReportLab's line breaking when it is laid out again at the same width.
+    """
+
+    def wrap(self, availWidth, availHeight):
+        wrap_cache = self.__dict__.setdefault("_wrap_cache", {})
+        measured = wrap_cache.get(availWidth)
+        if measured is None:
+            size = Paragraph.wrap(self, availWidth, availHeight)
+            wrap_cache[availWidth] = (size, self.blPara, self._wrapWidths)
+            return size
+        size, self.blPara, self._wrapWidths = measured
+        self.width, self.height = size
+        return size
+
+def _SkipDraw(*args, **kwargs):
+    pass
+
+class _PlaceUndrawn:
+    """Frame.add for measuring passes: places a flowable exactly as Frame does, but skips drawing it."""
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def __call__(self, flowable, canv, trySplit=0):
+        # Layout only needs wrap and split; drawing is most of a render's time
+        flowable.drawOn = _SkipDraw
+        try:
+            return Frame._add(self.frame, flowable, canv, trySplit)
+        finally:
+            del flowable.drawOn
+
+class ResumeDocTemplate(SimpleDocTemplate):
+    """SimpleDocTemplate that rolls back its edits to flowables after each build.
+
+    ReportLab marks flowables it pushes to the next page as postponed and
+    never clears the mark. Fragments are reused across renders, so the marks
+    are undone afterwards, the same way multiBuild does between passes.
+
+    With `max_pages` set, layout stops once that many pages are finished and
+    the rest of the story is dropped unlaid. With `compact` set, fonts are
+    embedded as CompactFontProgram subsets. With `measure_only` set,
+    flowables are laid out but not drawn (see MeasurePages).
+    """
+
+    max_pages = None
+    compact = False
+    measure_only = False
+    _truncated = False
+
+    def _startBuild(self, filename=None, canvasmaker=canvas.Canvas):
+        SimpleDocTemplate._startBuild(self, filename, canvasmaker)
+        # Read by SubsetCachingFace when the fonts are embedded on save
+        self.canv._doc.compactFonts = self.compact
+
+    def handle_frameBegin(self, *args, **kwargs):
+        SimpleDocTemplate.handle_frameBegin(self, *args, **kwargs)
+        if self.measure_only:
+            self.frame.add = _PlaceUndrawn(self.frame)
+
+    def handle_pageEnd(self):
+        SimpleDocTemplate.handle_pageEnd(self)
+        if self.max_pages is not None and self.page >= self.max_pages:
+            self._truncated = True
 
-def StyledName(text: str):
-    return Paragraph(f"<b>{text}</b>", styles["Name"])
+    def clean_hanging(self):
+        # Leave the next page's PageBegin pending; _endBuild discards it
+        if not self._truncated:
+            SimpleDocTemplate.clean_hanging(self)
 
-def StyledContactInfo(email: str, phone: str, location: str):
+    def filterFlowables(self, flowables):
+        if self._truncated:
+            # handle_flowable skips a None entry, so this ends the build loop
+            del flowables[1:]
+            flowables[0] = None
+
+    def build(self, flowables, **kwds):
+        edits = []
+        self._multiBuildEdits = edits.append
+        try:
+            SimpleDocTemplate.build(self, flowables, **kwds)
+        finally:
+            del self._multiBuildEdits
+            for edit in edits:
+                edit[0](*edit[1:])
+
+    def _endBuild(self):
+        # Writing out the PDF, as opposed to laying it out
+        with stage("serialize"):
+            SimpleDocTemplate._endBuild(self)
+
+def StyledName(text: str, sheet=None):
+    if sheet is None:
+        sheet = GetStyles()
+    return CachedParagraph(f"<b>{text}</b>", sheet["Name"])
+
+def StyledContactInfo(email: str, phone: str, location: str, sheet=None):
+    if sheet is None:
+        sheet = GetStyles()
     # Build contact info only with non-empty fields
     contact_parts = []
     if email:
@@ -107,11 +505,13 @@ def StyledContactInfo(email: str, phone: str, location: str):
         contact_parts.append(location)
     
     contact_text = " | ".join(contact_parts) if contact_parts else ""
-    return [Paragraph(contact_text, styles['Body']), 
+    return [CachedParagraph(contact_text, sheet["Body"]), 
             Spacer(1, 4)]
 
-def StyledSectionHeader(text: str):
-    return [Spacer(1, SECTION_SPACING), Paragraph(text, styles["SectionHeader"]),
+def StyledSectionHeader(text: str, sheet=None):
+    if sheet is None:
+        sheet = GetStyles()
+    return [Spacer(1, SECTION_SPACING), CachedParagraph(text, sheet["SectionHeader"]),
             HRFlowable(
                 width="100%",
                 thickness=0.75,
@@ -121,12 +521,14 @@ def StyledSectionHeader(text: str):
             )
     ]
 
-def StyledEduHeader(name: str, degree: str, gpa: str, graduation_date: str, location: str):
+def StyledEduHeader(name: str, degree: str, gpa: str, graduation_date: str, location: str, sheet=None):
+    if sheet is None:
+        sheet = GetStyles()
     header = Table(
         [
             [
-                [Paragraph(f"<b>{name}</b>", styles["JobTitle"]), Paragraph(f"{degree} | GPA: {gpa}", styles["JobMeta"])],
-                Paragraph(f"{graduation_date}<br/>{location}", styles["DateLocation"]),
+                [CachedParagraph(f"<b>{name}</b>", sheet["JobTitle"]), CachedParagraph(f"{degree} | GPA: {gpa}", sheet["JobMeta"])],
+                CachedParagraph(f"{graduation_date}<br/>{location}", sheet["DateLocation"]),
             ]
         ],
         colWidths=[None, 1.5 * inch],
@@ -134,17 +536,21 @@ def StyledEduHeader(name: str, degree: str, gpa: str, graduation_date: str, loca
     header.setStyle(JOB_HEADER_TABLE_STYLE)
     return [Spacer(1, SECTION_SPACING), header]
 
-def StyledSkillItem(category: str, items: str, is_first: bool = False):
+def StyledSkillItem(category: str, items: str, is_first: bool = False, sheet=None):
+    if sheet is None:
+        sheet = GetStyles()
     spacing = SECTION_SPACING if is_first else 3
     skill_text = f"<i>{category}:</i> {items}"
-    return [Spacer(1, spacing), Paragraph(skill_text, styles["Body"])]
+    return [Spacer(1, spacing), CachedParagraph(skill_text, sheet["Body"])]
 
-def StyledJobHeader(company: str, location: str, duration: str, position: str):
+def StyledJobHeader(company: str, location: str, duration: str, position: str, sheet=None):
+    if sheet is None:
+        sheet = GetStyles()
     header = Table(
         [
             [
-                [Paragraph(f"<b>{company}</b>", styles["JobTitle"]), Paragraph(position, styles["JobMeta"])],
-                Paragraph(f"{duration}<br/>{location}", styles["DateLocation"]),
+                [CachedParagraph(f"<b>{company}</b>", sheet["JobTitle"]), CachedParagraph(position, sheet["JobMeta"])],
+                CachedParagraph(f"{duration}<br/>{location}", sheet["DateLocation"]),
             ]
         ],
         colWidths=[None, 1.75 * inch],
@@ -153,12 +559,14 @@ def StyledJobHeader(company: str, location: str, duration: str, position: str):
     return [Spacer(1, SECTION_SPACING), header]
     
     
-def StyledResponsibility(text: str):
+def StyledResponsibility(text: str, sheet=None):
+    if sheet is None:
+        sheet = GetStyles()
     return [ListFlowable(
             [
-                Paragraph(
+                CachedParagraph(
                     text,
-                    styles["Body"],
+                    sheet["Body"],
                 )
             ],
             bulletType="bullet",
@@ -168,114 +576,254 @@ def StyledResponsibility(text: str):
         ),
         Spacer(1, 1)]
 
-def get_txt(el, tag, default=""):
-    """Safely extracts text or returns an empty string."""
-    found = el.find(tag)
-    if found is not None and found.text is not None:
-        return found.text.strip()
-    return default
+def BuildPersonalInfo(personal: PersonalInfo, sheet=None):
+    return ([StyledName(personal.name.strip(), sheet)]
+            + StyledContactInfo(personal.email.strip(), personal.phone.strip(), personal.location.strip(), sheet))
 
-def BuildFromXML(xml_path: str, output_path: str, margins: dict = None):
-    """Build a PDF resume from XML.
-    
-    Args:
-        xml_path: Path to the XML file
-        output_path: Path for the output PDF
-        margins: Optional dict with keys 'top', 'bottom', 'left', 'right' (in inches)
-                 If not provided, reads from XML. Defaults to 0.75 inches for all.
-    """
-    # Parse XML first to potentially read margins from it
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-    
-    # Read margins from XML if not provided as parameter
-    if margins is None:
-        margins = {}
-        margins_elem = root.find('margins')
-        if margins_elem is not None:
-            margins['top'] = float(get_txt(margins_elem, 'top', '0.75'))
-            margins['bottom'] = float(get_txt(margins_elem, 'bottom', '0.75'))
-            margins['left'] = float(get_txt(margins_elem, 'left', '0.75'))
-            margins['right'] = float(get_txt(margins_elem, 'right', '0.75'))
+def BuildEducation(education: Education, sheet=None):
+    story = []
+    institutions = education.institutions
+    if institutions:
+        story.extend(StyledSectionHeader("EDUCATION", sheet))
+        for i, institution in enumerate(institutions):
+            story.extend(StyledEduHeader(institution.name.strip(), institution.degree.strip(), institution.gpa.strip(),
+                                         institution.graduation_date.strip(), institution.location.strip(), sheet))
+            # Add spacing between institutions, but not after the last one
+            if i < len(institutions) - 1:
+                story.append(Spacer(1, 8))
+    return story
+
+def BuildSkills(skills: Skills, sheet=None):
+    story = []
+    # Only add Skills section if there are skillgroups with content
+    has_skills = False
+    skill_items = []
+    is_first_skill = True
     
-    top_margin = margins.get('top', 0.75) * inch
-    bottom_margin = margins.get('bottom', 0.75) * inch
-    left_margin = margins.get('left', 0.75) * inch
-    right_margin = margins.get('right', 0.75) * inch
+    for skillgroup in skills.groups:
+        category = skillgroup.category.strip()
+        if category and skillgroup.items:
+            has_skills = True
+            items_str = ", ".join(skillgroup.items)
+            skill_items.extend(StyledSkillItem(category, items_str, is_first=is_first_skill, sheet=sheet))
+            is_first_skill = False
     
-    doc = SimpleDocTemplate(
-        output_path,
-        pagesize=LETTER,
-        rightMargin=right_margin,
-        leftMargin=left_margin,
-        topMargin=top_margin,
-        bottomMargin=bottom_margin,
-    )
+    if has_skills:
+        story.extend(StyledSectionHeader("SKILLS", sheet))
+        story.extend(skill_items)
+        story.append(Spacer(1, 4))  # Match spacing after education section
+    return story
+
+def BuildJob(job: Job, sheet=None):
+    story = StyledJobHeader(job.company.strip(), job.location.strip(), job.duration.strip(), job.position.strip(), sheet)
+    for resp in job.responsibilities:
+        if resp.active:
+            story.extend(StyledResponsibility(resp.text, sheet))
+    return story
+
+def CachedFragment(builder, section, font_scale: float = 1.0, leading_scale: float = 1.0, width: float = None):
+    """Return builder(section), reusing the flowables from an earlier render of an equal section."""
+    # Model objects are frozen, so an equal section lays out identically at the
+    # same width. Tables fix their column widths on first wrap, so a fragment
+    # is never reused in a frame of another width
+    key = (builder, font_scale, leading_scale, width, section)
+    fragment = _fragment_cache.get(key)
+    if fragment is not None:
+        _fragment_cache.move_to_end(key)
+        return fragment
+    fragment = builder(section, GetStyles(font_scale, leading_scale))
+    _fragment_cache[key] = fragment
+    if len(_fragment_cache) > FRAGMENT_CACHE_SIZE:
+        _fragment_cache.popitem(last=False)
+    return fragment
+
+def ClearLayoutCache():
+    """Drop all memoized section fragments."""
+    _fragment_cache.clear()
+
+def BuildStory(resume: Resume, font_scale: float = 1.0, leading_scale: float = 1.0, width: float = None):
+    """Assemble the flowables for a resume, one cached fragment per section or job.
+
+    `width` is the frame width the story will be laid out in.
+    """
+    scale = (font_scale, leading_scale, width)
     story = []
-    
-    for child in root:
-        if child.tag == "personal_info":
-            name = get_txt(child, "name", "")
-            email = get_txt(child, "email", "")
-            phone = get_txt(child, "phone", "")
-            location = get_txt(child, "location", "")
-            story.append(StyledName(name))
-            story.extend(StyledContactInfo(email, phone, location))
-        elif child.tag == "education":
-            institutions = child.findall("institution")
-            if institutions:
-                story.extend(StyledSectionHeader("EDUCATION"))
-                for i, institution in enumerate(institutions):
-                    name = get_txt(institution, "name", "")
-                    degree = get_txt(institution, "degree", "")
-                    gpa = get_txt(institution, "gpa", "")
-                    graduation_date = get_txt(institution, "graduation_date", "")
-                    location = get_txt(institution, "location", "")
-                    story.extend(StyledEduHeader(name, degree, gpa, graduation_date, location))
-                    # Add spacing between institutions, but not after the last one
-                    if i < len(institutions) - 1:
-                        story.append(Spacer(1, 8))
-        elif child.tag == "skills":
-            skillgroups = child.findall("skillgroup")
-            # Only add Skills section if there are skillgroups with content
-            has_skills = False
-            skill_items = []
-            is_first_skill = True
-            
-            for skillgroup in skillgroups:
-                category = get_txt(skillgroup, "category", "")
-                items_elem = skillgroup.find("items")
-                items = [item.text for item in items_elem.findall("item") if item.text] if items_elem is not None else []
-                
-                if category and items:
-                    has_skills = True
-                    items_str = ", ".join(items)
-                    skill_items.extend(StyledSkillItem(category, items_str, is_first=is_first_skill))
-                    is_first_skill = False
-            
-            if has_skills:
-                story.extend(StyledSectionHeader("SKILLS"))
-                story.extend(skill_items)
-                story.append(Spacer(1, 4))  # Match spacing after education section
-        elif child.tag == "experience":
-            jobs = child.findall("job")
+    for section in resume.sections:
+        if isinstance(section, PersonalInfo):
+            story.extend(CachedFragment(BuildPersonalInfo, section, *scale))
+        elif isinstance(section, Education):
+            story.extend(CachedFragment(BuildEducation, section, *scale))
+        elif isinstance(section, Skills):
+            story.extend(CachedFragment(BuildSkills, section, *scale))
+        elif isinstance(section, Experience):
+            jobs = section.jobs
             # Only add Experience section if there are jobs
             if jobs:
-                story.extend(StyledSectionHeader("EXPERIENCE"))
+                story.extend(StyledSectionHeader("EXPERIENCE", GetStyles(font_scale, leading_scale)))
                 for i, job in enumerate(jobs):
-                    company = get_txt(job, "company", "")
-                    location = get_txt(job, "location", "")
-                    duration = get_txt(job, "duration", "")
-                    position = get_txt(job, "position", "")
-                    story.extend(StyledJobHeader(company, location, duration, position))
-                    responsibilities = job.find("responsibilities")
-                    for resp in responsibilities.findall("responsibility"):
-                        if resp.get('deactivated', 'false') == 'true':
-                            continue
-                        story.extend(StyledResponsibility(resp.text))
+                    story.extend(CachedFragment(BuildJob, job, *scale))
                     # Add spacing between jobs, but not after the last one
                     if i < len(jobs) - 1:
                         story.append(Spacer(1, 8))
+    return story
+
+def ParseResume(source) -> Resume:
+    """Return the Resume model for a model, an ElementTree, an Element, or XML str/bytes.
+
+    Raises ResumeValidationError for input that fails validation.
+    """
+    return parse_resume(source)
+
+def ResolveMargins(resume: Resume, margins: dict = None) -> dict:
+    """Return all four margins in inches, reading them from the resume if not given."""
+    if margins is None:
+        margins = resume.margins.resolved() if resume.margins is not None else {}
+    return {side: margins.get(side, 0.75) for side in ('top', 'bottom', 'left', 'right')}
+
+def MakeDocTemplate(buffer, margins: dict, max_pages: int = None, compact: bool = False):
+    doc = ResumeDocTemplate(
+        buffer,
+        pagesize=LETTER,
+        rightMargin=margins['right'] * inch,
+        leftMargin=margins['left'] * inch,
+        topMargin=margins['top'] * inch,
+        bottomMargin=margins['bottom'] * inch,
+        # Compact output compresses page streams whatever rl_config says
+        pageCompression=1 if compact else None,
+    )
+    doc.max_pages = max_pages
+    doc.compact = compact
+    return doc
+
+def BuildToBuffer(source, buffer, margins: dict = None, max_pages: int = None, compact: bool = False):
+    """Render a resume into a writable binary file-like object.
+    
+    Args:
+        source: Resume model, parsed tree/element or XML string/bytes (see ParseResume)
+        buffer: File-like object the PDF is written to, e.g. io.BytesIO
+        margins: Optional dict with keys 'top', 'bottom', 'left', 'right' (in inches)
+                 If not provided, reads from XML. Defaults to 0.75 inches for all.
+        max_pages: Optional page count to stop after, e.g. 1 for a quick first-page preview
+        compact: Embed fonts without hinting or unused tables for a smaller file
+    """
+    with stage("parse"):
+        resume = ParseResume(source)
+    doc = MakeDocTemplate(buffer, ResolveMargins(resume, margins), max_pages, compact)
+    with stage("story"):
+        story = BuildStory(resume, width=doc.width)
+    with stage("layout"):
+        doc.build(story)
+    return buffer
+
+def RenderToBytes(source, margins: dict = None, max_pages: int = None, compact: bool = False) -> bytes:
+    """Render a resume entirely in memory and return the PDF bytes."""
+    return BuildToBuffer(source, io.BytesIO(), margins, max_pages, compact).getvalue()
+
+# Limits for fit-to-pages: how far margins, font size and leading may shrink
+FIT_MIN_MARGIN = 0.4  # inches
+FIT_MIN_FONT_SCALE = 0.85
+FIT_MIN_LEADING_SCALE = 0.9
+FIT_SEARCH_STEPS = 7
+
+class _MeasuringCanvas(canvas.Canvas):
+    """Canvas whose save() writes nothing, for layout passes that only count pages."""
+
+    def save(self):
+        pass
+
+def MeasurePages(doc, story) -> int:
+    """Lay `story` out in `doc` as a real render would and return the page count.
+
+    Flowables are wrapped and split exactly as in doc.build, so the count is
+    exact, but nothing is drawn and no PDF is written. With doc.max_pages
+    set, layout stops after that many pages, so a story that needs more is
+    counted as max_pages.
+    """
+    doc.measure_only = True
+    doc.build(story, canvasmaker=_MeasuringCanvas)
+    return doc.page
+
+def FitSettings(margins: dict, t: float) -> dict:
+    """Interpolate between the requested settings (t=0) and the most compact ones (t=1)."""
+    return {
+        "margins": {side: round(value - t * max(0.0, value - FIT_MIN_MARGIN), 4)
+                    for side, value in margins.items()},
+        "font_scale": round(1 - t * (1 - FIT_MIN_FONT_SCALE), 4),
+        "leading_scale": round(1 - t * (1 - FIT_MIN_LEADING_SCALE), 4),
+    }
+
+def RenderFitted(source, pages: int = 1, margins: dict = None, compact: bool = False):
+    """Render with the largest margins, font size and leading that fit in `pages` pages.
+
+    Binary-searches FitSettings using MeasurePages, which lays pages out
+    exactly as the real build does but draws nothing, then renders once with
+    the result, so only that pass writes a PDF. Returns (pdf_bytes, settings); settings also records the
+    resulting page count. If even the most compact settings overflow, those
+    are used.
+    """
+    with stage("parse"):
+        resume = ParseResume(source)
+    requested = ResolveMargins(resume, margins)
+
+    def story_for(settings, doc):
+        with stage("story"):
+            return BuildStory(resume, settings["font_scale"], settings["leading_scale"], doc.width)
+
+    def fits(t):
+        settings = FitSettings(requested, t)
+        # One page past the target is enough to know it overflows
+        doc = MakeDocTemplate(None, settings["margins"], max_pages=pages + 1)
+        story = story_for(settings, doc)
+        with stage("measure"):
+            return MeasurePages(doc, story) <= pages
+
+    if fits(0.0):
+        t = 0.0
+    elif not fits(1.0):
+        t = 1.0
+    else:
+        low, high = 0.0, 1.0
+        for _ in range(FIT_SEARCH_STEPS):
+            mid = (low + high) / 2
+            if fits(mid):
+                high = mid
+            else:
+                low = mid
+        t = high
+
+    settings = FitSettings(requested, t)
+    buffer = io.BytesIO()
+    doc = MakeDocTemplate(buffer, settings["margins"], compact=compact)
+    story = story_for(settings, doc)
+    with stage("layout"):
+        doc.build(story)
+    settings["pages"] = doc.page
+    return buffer.getvalue(), settings
+
+def BuildFromXML(xml_path: str, output_path: str, margins: dict = None, fit_to_pages: int = None,
+                 compact: bool = False):
+    """Build a PDF resume from XML.
     
-    doc.build(story)
-            
\ No newline at end of file
+    Args:
+        xml_path: Path to the XML file
+        output_path: Path for the output PDF
+        margins: Optional dict with keys 'top', 'bottom', 'left', 'right' (in inches)
+                 If not provided, reads from XML. Defaults to 0.75 inches for all.
+        fit_to_pages: Optional page count to shrink margins, font size and leading
+                      into (see RenderFitted)
+        compact: Embed fonts without hinting or unused tables for a smaller file
+
+    Returns:
+        The chosen settings when fit_to_pages is given, otherwise None.
+    """
+    settings = None
+    with stage("parse"):
+        resume = load_resume(xml_path)
+    if fit_to_pages:
+        pdf_bytes, settings = RenderFitted(resume, fit_to_pages, margins, compact)
+    else:
+        pdf_bytes = RenderToBytes(resume, margins, compact=compact)
+    with stage("file_io"):
+        with open(output_path, "wb") as f:
+            f.write(pdf_bytes)
+    return settings
@@ -0,0 +1,117 @@
+"""Per-user scheduling of preview renders: one at a time, latest wins.
+
+While a user's preview is rendering, a newer request waits in a single
+slot. A still newer one takes that slot and the request it displaced is
+answered as superseded without being rendered. Typing fast therefore costs
+at most the render in flight plus the latest version, however many requests
+arrive in between.
+"""
+import asyncio
+import itertools
+
+import telemetry
+
+
+class PreviewSuperseded(Exception):
+    """Raised for a queued preview that a newer request from the same user replaced."""
+
+    def __init__(self, seq: int):
+        super().__init__(f"Preview {seq} was superseded by a newer request")
+        self.seq = seq
+
+
+class _UserState:
+    __slots__ = ("busy", "waiting")
+
+    def __init__(self):
+        self.busy = False
+        self.waiting = None  # (seq, future) of the one request queued behind the busy one
+
+
+class PreviewScheduler:
+    """Runs at most one preview job per user, replacing queued jobs with the newest.
+
+    Args:
+        debounce: Seconds a job waits before it starts. A request arriving in
+                  that window supersedes it, so a burst of edits renders once.
+    """
+
+    def __init__(self, debounce: float = 0.0):
+        self.debounce = debounce
+        # One counter for all users keeps sequence numbers increasing per user
+        # even after an idle user's state is dropped
+        self._seq = itertools.count(1)
+        self._users = {}
+        self.submitted = 0
+        self.superseded = 0
+        self.completed = 0
+
+    def next_seq(self) -> int:
+        return next(self._seq)
+
+    async def run(self, user_id: str, seq: int, job):
+        """Await `job()` once it is `user_id`'s turn and return its result.
+
+        Raises PreviewSuperseded if a newer request for the same user arrives
+        before this one starts.
+        """
+        self.submitted += 1
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = _UserState()
+
+        if state.busy:
+            if state.waiting is not None:
+                self._supersede(*state.waiting)
+            future = asyncio.get_running_loop().create_future()
+            state.waiting = (seq, future)
+            try:
+                # Resolves when the running job hands this request the slot
+                with telemetry.stage("preview_wait"):
+                    await future
+            except asyncio.CancelledError:
+                if state.waiting is not None and state.waiting[1] is future:
+                    state.waiting = None
+                elif future.done() and not future.cancelled() and future.exception() is None:
+                    self._release(user_id, state)
+                raise
+        else:
+            state.busy = True
+
+        try:
+            if self.debounce:
+                await asyncio.sleep(self.debounce)
+                if state.waiting is not None:
+                    self.superseded += 1
+                    raise PreviewSuperseded(seq)
+            result = await job()
+            self.completed += 1
+            return result
+        finally:
+            self._release(user_id, state)
+
+    def _supersede(self, seq: int, future):
+        if not future.done():
+            future.set_exception(PreviewSuperseded(seq))
+            self.superseded += 1
+
+    def _release(self, user_id: str, state: _UserState):
+        """Hand the user's slot to the queued request, or free it."""
+        while state.waiting is not None:
+            _, future = state.waiting
+            state.waiting = None
+            if not future.done():
+                future.set_result(None)
+                return
+        state.busy = False
+        if self._users.get(user_id) is state:
+            del self._users[user_id]
+
+    def stats(self) -> dict:
+        return {
+            "active_users": len(self._users),
+            "queued": sum(1 for s in self._users.values() if s.waiting is not None),
+            "submitted": self.submitted,
+            "superseded": self.superseded,
+            "completed": self.completed,
+        }
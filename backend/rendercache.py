@@ -0,0 +1,204 @@
+"""Content-addressed cache for rendered resume PDFs.
+
+Renders are keyed by a hash of the parsed resume model, the margin settings
+and the renderer version, so an identical preview (or saving what was just
+previewed) can skip ReportLab entirely.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from makeresume import RENDERER_VERSION
+from resumemodel import Resume
+
+logger = logging.getLogger(__name__)
+
+
+def render_key(resume: Resume, margins: Optional[dict] = None, fit_to_pages: Optional[int] = None,
+               max_pages: Optional[int] = None, compact: bool = False) -> str:
+    """Return the cache key for rendering `resume` with `margins` and the other render options."""
+    # The model's repr covers everything the renderer reads and nothing else, so
+    # formatting, attribute order and ignored elements do not change the key
+    canonical = repr(resume)
+    settings = {"renderer": RENDERER_VERSION, "margins": margins, "fit": fit_to_pages}
+    # Options are only added when set, so keys of plain renders stay as they were
+    if max_pages is not None:
+        settings["max_pages"] = max_pages
+    if compact:
+        settings["compact"] = True
+    settings = json.dumps(settings, sort_keys=True)
+    digest = hashlib.sha256(settings.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(canonical.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def source_key(xml_hash: str, margins: Optional[dict], fit_to_pages: Optional[int], compact: bool) -> str:
+    """Return the key of what a saved PDF was rendered from: its XML's SHA-256, settings and renderer.
+
+    Stored with the PDF in the resume index, so an offline re-render can tell
+    which saved PDFs are current without rendering or parsing anything.
+    """
+    settings = {"renderer": RENDERER_VERSION, "xml": xml_hash, "margins": margins, "fit": fit_to_pages,
+                "compact": compact}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """Byte-bounded LRU cache of rendered PDFs with an optional on-disk tier.
+
+    Args:
+        max_bytes: Upper bound on the total size of PDFs held in memory.
+        disk_dir: Optional directory for a second, persistent tier. Entries
+                  evicted from memory stay on disk and are promoted on a hit.
+        disk_max_bytes: Upper bound on the disk tier; the least recently used
+                        files (by mtime, which hits refresh) are deleted first.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None, disk_max_bytes: int = 1024 ** 3):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._disk_entries = OrderedDict()  # key -> bytes on disk, least recently used first
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def _scan_disk(self):
+        """Index the files a previous process left, oldest first, and trim them to the bound."""
+        found = {}
+        for root, _, filenames in os.walk(self.disk_dir):
+            for filename in filenames:
+                key, ext = os.path.splitext(filename)
+                if ext not in (".pdf", ".json"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, filename))
+                except FileNotFoundError:
+                    continue
+                size, mtime = found.get(key, (0, 0.0))
+                found[key] = (size + st.st_size, max(mtime, st.st_mtime) if ext == ".pdf" else mtime)
+        for key, (size, _) in sorted(found.items(), key=lambda item: item[1][1]):
+            self._disk_entries[key] = size
+            self._disk_size += size
+        self._evict_disk()
+
+    def _disk_path(self, key: str, ext: str = ".pdf") -> str:
+        return os.path.join(self.disk_dir, key[:2], key + ext)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached PDF for `key`, or None on a miss."""
+        entry = self.lookup(key)
+        return entry[0] if entry is not None else None
+
+    def lookup(self, key: str):
+        """Return (pdf_bytes, meta) for `key`, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if key in self._disk_entries:
+                self._disk_entries.move_to_end(key)
+        try:
+            # The mtime keeps the recency order across restarts
+            os.utime(self._disk_path(key))
+        except OSError:
+            pass
+        meta = None
+        if os.path.exists(self._disk_path(key, ".json")):
+            with open(self._disk_path(key, ".json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        self._remember(key, data, meta)
+        return data, meta
+
+    def put(self, key: str, data: bytes, meta: Optional[dict] = None):
+        """Store a rendered PDF under `key`, with optional JSON-serializable metadata."""
+        self._remember(key, data, meta)
+        if self.disk_dir:
+            if len(data) > self.disk_max_bytes:
+                return
+            size = len(data)
+            # Metadata first: a reader that finds the PDF also finds its sidecar
+            if meta is not None:
+                encoded = json.dumps(meta).encode("utf-8")
+                if not self._write_atomic(self._disk_path(key, ".json"), encoded):
+                    return
+                size += len(encoded)
+            if not self._write_atomic(self._disk_path(key), data):
+                return
+            with self._lock:
+                self._disk_size += size - self._disk_entries.pop(key, 0)
+                self._disk_entries[key] = size
+            self._evict_disk()
+
+    def _evict_disk(self):
+        while True:
+            with self._lock:
+                if self._disk_size <= self.disk_max_bytes or not self._disk_entries:
+                    return
+                key, size = self._disk_entries.popitem(last=False)
+                self._disk_size -= size
+            for ext in (".pdf", ".json"):
+                try:
+                    os.unlink(self._disk_path(key, ext))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning("render cache eviction failed", extra={"key": key, "error": str(e)})
+
+    def _write_atomic(self, path: str, data: bytes) -> bool:
+        """Write-and-rename so concurrent readers never see a partial file; False if it failed."""
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            return True
+        except OSError as e:
+            # The memory tier still has the entry; the render is only lost to other processes
+            logger.warning("render cache write failed", extra={"path": path, "error": str(e)})
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return False
+
+    def _remember(self, key: str, data: bytes, meta: Optional[dict] = None):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._entries[key] = (data, meta)
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {"entries": len(self._entries), "bytes": self._size, "max_bytes": self.max_bytes}
+            if self.disk_dir:
+                stats["disk"] = {"entries": len(self._disk_entries), "bytes": self._disk_size,
+                                 "max_bytes": self.disk_max_bytes}
+            return stats
@@ -0,0 +1,173 @@
+"""Process pool that runs ReportLab renders off the event loop."""
+import asyncio
+import os
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+
+class RenderQueueFull(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class RenderTimeout(Exception):
+    """Raised when a render job does not finish within the executor timeout."""
+
+
+class RenderWorkerCrashed(Exception):
+    """Raised when a worker process died while running the job; the pool is rebuilt."""
+
+
+def _warm_up():
+    """Worker initializer: load fonts and build styles before the first job arrives."""
+    import makeresume
+    makeresume.GetRenderer().warm()
+
+
+def _run_traced(fn, *args):
+    """Run a job in the worker and return its result with the stages it recorded."""
+    with telemetry.tracing() as trace:
+        result = fn(*args)
+    return result, trace.stages
+
+
+class RenderExecutor:
+    """Bounded process pool for CPU-bound renders.
+
+    Args:
+        workers: Number of worker processes (defaults to the CPU count).
+        max_queue: Jobs allowed to wait for a free worker before new ones are
+                   rejected with RenderQueueFull.
+        timeout: Seconds a caller waits for a job before RenderTimeout.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_queue: int = 16, timeout: float = 20.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool = None
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._crashes = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def start(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _replace(self, pool):
+        """Drop `pool` after a worker died in it; the next job starts a fresh one."""
+        if self._pool is pool:
+            self._crashes += 1
+            logger.warning("render worker died, restarting the pool", extra={"workers": self.workers})
+            self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def _submit(self, fn, *args):
+        """Submit a job, first replacing the pool if an earlier crash left it broken."""
+        pool = self._pool
+        try:
+            return pool, pool.submit(_run_traced, fn, *args)
+        except BrokenProcessPool:
+            # Nothing of this job ran yet, so it can go to the new pool
+            self._replace(pool)
+            pool = self._pool
+            return pool, pool.submit(_run_traced, fn, *args)
+
+    async def run(self, fn, *args, on_done=None):
+        """Run `fn(*args)` in a worker process and return its result.
+
+        `on_done()`, if given, is called on the event loop once the job no
+        longer occupies the pool: when the worker finishes, which can be after
+        the caller timed out or was cancelled, or at once if it was rejected.
+        Raises RenderWorkerCrashed if the worker died mid-job; the pool is
+        replaced, so later jobs run normally.
+        """
+        self.start()
+        if self._pending >= self.workers + self.max_queue:
+            self._rejected += 1
+            if on_done is not None:
+                on_done()
+            raise RenderQueueFull()
+
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        try:
+            pool, job = self._submit(fn, *args)
+        except BaseException:
+            self._finished(on_done)
+            raise
+        # The worker keeps running after a timeout or cancellation; only the caller
+        # gives up, so the job counts against the pool until the worker is done
+        job.add_done_callback(lambda _: self._call_soon(loop, self._finished, on_done))
+
+        start = time.perf_counter()
+        try:
+            result, stages = await asyncio.wait_for(asyncio.wrap_future(job), self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise RenderTimeout()
+        except BrokenProcessPool:
+            self._replace(pool)
+            raise RenderWorkerCrashed("Render worker crashed")
+        except Exception:
+            # The job ran and raised; it still finished
+            self._completed_job(time.perf_counter() - start)
+            raise
+        elapsed = time.perf_counter() - start
+        self._completed_job(elapsed)
+        # Whatever the worker did not account for is queueing and transfer
+        stages.append(("render_wait", elapsed - sum(s[1] for s in stages), 0))
+        trace = telemetry.current_trace()
+        if trace is not None:
+            trace.merge(stages)
+        else:
+            telemetry.observe_stages(stages)
+        return result
+
+    def _completed_job(self, elapsed: float):
+        self._completed += 1
+        self._latency_total += elapsed
+        self._latency_max = max(self._latency_max, elapsed)
+
+    @staticmethod
+    def _call_soon(loop, callback, *args):
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # The loop closed during shutdown; nothing is waiting any more
+            pass
+
+    def _finished(self, on_done):
+        self._pending -= 1
+        if on_done is not None:
+            on_done()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": min(self._pending, self.workers),
+            "queue_depth": max(0, self._pending - self.workers),
+            "max_queue": self.max_queue,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "timeouts": self._timeouts,
+            "crashes": self._crashes,
+            "latency_avg_ms": round(1000 * self._latency_total / self._completed, 2) if self._completed else 0.0,
+            "latency_max_ms": round(1000 * self._latency_max, 2),
+        }
@@ -0,0 +1,197 @@
+"""Re-render saved resume PDFs offline, in parallel, skipping up-to-date ones.
+
+Walks `<base>/<user>/xml/*.xml` and writes `<base>/<user>/pdf/<name>.pdf`
+with the margins and page fit of the resume's latest saved revision. The
+resume index records, with each PDF, the key of what it was rendered from
+(rendercache.source_key: the XML's content hash, those settings, the
+renderer version and the compact-PDF option), whether the API or this tool
+wrote it. A PDF whose key still matches is skipped, and its XML is not even
+read. A run after a font or style change (bump makeresume.RENDERER_VERSION)
+re-renders everything.
+
+Renders are spread over a process pool. The per-user index and thumbnails
+are updated as PDFs are written, and every PDF the run wrote is committed
+in one git commit at the end.
+
+Run from backend/:  python rerender.py [--base DIR] [--jobs N] [--user ID ...] [--force]
+                    [--dry-run] [--no-commit] [--push]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import git
+
+from history import VersionHistory
+from makeresume import RENDERER_VERSION
+from rendercache import source_key
+from renderpool import _warm_up
+from resumeindex import ResumeIndex
+from storage import LocalStorage
+import thumbnails
+
+DEFAULT_BASE = os.path.join(os.path.expanduser("~"), "Documents", "resumes")
+COMPACT_PDF = os.environ.get("COMPACT_PDF", "1").lower() in ("1", "true", "yes")
+
+
+def _render(xml_bytes: bytes, margins, fit_to_pages, compact: bool) -> bytes:
+    """Worker job: the PDF of one resume."""
+    import makeresume
+    if fit_to_pages:
+        return makeresume.RenderFitted(xml_bytes, fit_to_pages, margins, compact)[0]
+    return makeresume.RenderToBytes(xml_bytes, margins, None, compact)
+
+
+class Progress:
+    """One status line on a terminal; a line every few seconds otherwise."""
+
+    def __init__(self, total: int, stream=sys.stderr):
+        self.total = total
+        self.stream = stream
+        self.tty = stream.isatty()
+        self.start = self._last = time.monotonic()
+
+    def update(self, done: int, failed: int, final: bool = False):
+        now = time.monotonic()
+        if not final and now - self._last < (0.2 if self.tty else 5):
+            return
+        self._last = now
+        elapsed = now - self.start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - done) / rate if rate else 0.0
+        line = (f"[{done:>{len(str(self.total))}}/{self.total}] {done / max(self.total, 1):6.1%}"
+                f"  {rate:6.1f} renders/s  eta {eta:5.0f}s" + (f"  {failed} failed" if failed else ""))
+        if self.tty:
+            self.stream.write("\r" + line + ("\n" if final else ""))
+        else:
+            self.stream.write(line + "\n")
+        self.stream.flush()
+
+
+def plan(storage: LocalStorage, history: VersionHistory, index: ResumeIndex, users, force: bool):
+    """Split the resumes into (jobs to render, how many are up to date).
+
+    A job is (user, name, xml_bytes, settings, render_key); settings are the
+    latest revision's margins and fit_to_pages.
+    """
+    jobs, current = [], 0
+    for user in users:
+        rendered = index.render_keys(user)
+        for filename in sorted(storage.list_sync(f"{user}/xml/")):
+            if not filename.endswith(".xml"):
+                continue
+            name = filename[:-4]
+            revisions = history.revisions(user, name)
+            latest = revisions[-1] if revisions else {}
+            settings = (latest.get("margins"), latest.get("fit_to_pages"))
+            xml_hash, key = rendered.get(name, (None, None))
+            if not force and xml_hash is not None and key == source_key(xml_hash, *settings, COMPACT_PDF):
+                current += 1
+                continue
+            try:
+                xml_bytes = storage.read_sync(f"{user}/xml/{filename}")
+            except FileNotFoundError:
+                continue
+            key = source_key(hashlib.sha256(xml_bytes).hexdigest(), *settings, COMPACT_PDF)
+            jobs.append((user, name, xml_bytes, settings, key))
+    return jobs, current
+
+
+def commit(base: str, paths: list, push: bool) -> int:
+    """Commit the written PDFs, new or already tracked; returns how many changed."""
+    try:
+        repo = git.Repo(base)
+    except (git.InvalidGitRepositoryError, git.NoSuchPathError):
+        print("Not a git repository, nothing committed", file=sys.stderr)
+        return 0
+    repo.index.add(paths)
+    # Re-rendering can reproduce a committed PDF byte for byte
+    changed = repo.index.diff("HEAD", paths=paths) if repo.head.is_valid() else paths
+    if not changed:
+        return 0
+    repo.index.commit(f"Re-render {len(changed)} resumes (renderer {RENDERER_VERSION})")
+    if push:
+        repo.remote(name="origin").push()
+    return len(changed)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--base", default=os.environ.get("RESUME_STORAGE_DIR", DEFAULT_BASE),
+                        help="resumes directory (default: %(default)s)")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--user", action="append", help="only this user (repeatable)")
+    parser.add_argument("--force", action="store_true", help="render even up-to-date PDFs")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be rendered")
+    parser.add_argument("--no-commit", action="store_true", help="do not commit to git")
+    parser.add_argument("--push", action="store_true", help="push the commit to origin")
+    args = parser.parse_args(argv)
+
+    base = os.path.abspath(args.base)
+    # Durability comes from one sync at the end, not an fsync per file
+    storage = LocalStorage(base, fsync=False, io_threads=1)
+    history = VersionHistory(storage)
+    # Reconcile each user's index with the files first, so edits made outside the API are seen
+    index = ResumeIndex(os.environ.get("RESUME_INDEX_DIR") or base, storage, reconcile_interval=0)
+
+    users = args.user or sorted(e.name for e in os.scandir(base)
+                                if e.is_dir() and os.path.isdir(os.path.join(e.path, "xml")))
+    start = time.monotonic()
+    jobs, current = plan(storage, history, index, users, args.force)
+    print(f"{len(jobs)} to render, {current} up to date ({time.monotonic() - start:.1f}s to check)",
+          file=sys.stderr)
+    if args.dry_run:
+        for user, name, _, _, _ in jobs:
+            print(f"{user}/{name}")
+        return 0
+
+    written, failures = [], []
+    progress = Progress(len(jobs))
+    if jobs:
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=_warm_up) as pool:
+            pending = {}
+            queue = iter(jobs)
+            while True:
+                # A bounded window keeps only a few XMLs and PDFs per worker in memory
+                for job in queue:
+                    user, name, xml_bytes, settings, key = job
+                    future = pool.submit(_render, xml_bytes, *settings, COMPACT_PDF)
+                    pending[future] = job
+                    if len(pending) >= 4 * args.jobs:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    user, name, xml_bytes, settings, key = pending.pop(future)
+                    try:
+                        pdf_bytes = future.result()
+                    except Exception as e:
+                        failures.append((f"{user}/{name}", str(e)))
+                        continue
+                    pdf_key = f"{user}/pdf/{name}.pdf"
+                    storage.write_sync(pdf_key, pdf_bytes)
+                    index.upsert(user, name, xml_bytes, pdf_bytes, render_key=key)
+                    pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
+                    thumb_prefix = f"{user}/thumbs/"
+                    for filename in thumbnails.stale(storage.list_sync(thumb_prefix), name, pdf_hash):
+                        storage.delete_sync(thumb_prefix + filename)
+                    written.append(storage.local_path(pdf_key))
+                progress.update(len(written) + len(failures), len(failures))
+        progress.update(len(written) + len(failures), len(failures), final=True)
+
+    os.sync()
+    committed = 0 if args.no_commit or not written else commit(base, written, args.push)
+    print(f"Rendered {len(written)}, failed {len(failures)}, committed {committed}"
+          f" in {time.monotonic() - start:.1f}s", file=sys.stderr)
+    for key, error in failures:
+        print(f"  {key}: {error}", file=sys.stderr)
+    storage.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""Per-user metadata index of saved resumes.
+
+Each user directory holds an `index.sqlite3` with one row per resume: name,
+mtime, PDF size, page count, XML and PDF content hashes, the JSON summary
+served by /get-resume, and the key of what the PDF was rendered from (see
+rendercache.source_key). It is updated on save and delete, so listing and opening a
+resume never has to scan the directory or re-parse XML. A missing index is
+rebuilt from storage on first use.
+
+The index files always live on local disk under `base_dir`. With remote
+storage they are a per-replica cache of what is in the bucket, so each row
+also records the storage versions it was built from. With a
+`reconcile_interval`, reads first compare those with a listing of the
+bucket (at most once per interval per user) and re-index only the resumes
+that another replica added, rewrote or deleted.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Optional
+
+from resumemodel import Resume, ResumeValidationError, parse_resume, resume_json
+from storage import LocalStorage, Storage
+
+SORT_COLUMNS = {"name", "mtime", "size", "pages"}
+
+_PAGE_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+
+def count_pages(pdf_bytes: bytes) -> int:
+    """Count page objects in a ReportLab-generated PDF."""
+    return len(_PAGE_RE.findall(pdf_bytes))
+
+
+def resume_summary(source) -> dict:
+    """Build the JSON view of a resume (everything /get-resume returns except save_name).
+
+    `source` is XML text or an already parsed Resume.
+    """
+    return resume_json(parse_resume(source))
+
+
+class ResumeIndex:
+    """SQLite-backed metadata for every user under `base_dir`.
+
+    Args:
+        base_dir: Local directory holding `<user>/index.sqlite3`.
+        storage: Where the resumes themselves are, for rebuilding a missing
+                 index. Defaults to files under `base_dir`.
+        reconcile_interval: Seconds between checks of a user's rows against
+                            storage before a read. None trusts the index, for
+                            a single replica that sees every save.
+    """
+
+    def __init__(self, base_dir: str, storage: Optional[Storage] = None,
+                 reconcile_interval: Optional[float] = None):
+        self.base_dir = base_dir
+        self.storage = storage if storage is not None else LocalStorage(base_dir, io_threads=1)
+        self.reconcile_interval = reconcile_interval
+        self._reconciled = {}  # user -> monotonic time of the last reconcile
+        self._reconciled_lock = threading.Lock()
+
+    def _connect(self, user_id: str) -> sqlite3.Connection:
+        user_dir = os.path.join(self.base_dir, user_id)
+        path = os.path.join(user_dir, "index.sqlite3")
+        is_new = not os.path.exists(path)
+        os.makedirs(user_dir, exist_ok=True)
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS resumes ("
+            " name TEXT PRIMARY KEY, mtime REAL, size INTEGER, pages INTEGER,"
+            " content_hash TEXT, summary TEXT, pdf_hash TEXT, xml_version TEXT, pdf_version TEXT,"
+            " render_key TEXT)"
+        )
+        if not is_new:
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(resumes)")}
+            # Indexes written before thumbnails, reconciliation or render keys; filled in as resumes are saved again
+            for column in ("pdf_hash", "xml_version", "pdf_version", "render_key"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE resumes ADD COLUMN {column} TEXT")
+        if is_new:
+            self._reconcile(conn, user_id)
+        return conn
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            return self.storage.read_sync(key)
+        except FileNotFoundError:
+            return None
+
+    def _reconcile(self, conn: sqlite3.Connection, user_id: str):
+        """Index resumes that are new or rewritten in storage and drop deleted ones."""
+        stats = {}
+        for folder in ("xml", "pdf"):
+            ext = "." + folder
+            stats[folder] = {f[:-4]: stat for f, stat in self.storage.scan_sync(f"{user_id}/{folder}/").items()
+                             if f.endswith(ext)}
+        known = {row["name"]: row for row in conn.execute(
+            "SELECT name, xml_version, pdf_version, content_hash, pdf_hash, render_key FROM resumes")}
+        for name in known.keys() - stats["xml"].keys() - stats["pdf"].keys():
+            conn.execute("DELETE FROM resumes WHERE name = ?", (name,))
+        for name in stats["xml"].keys() | stats["pdf"].keys():
+            xml_stat, pdf_stat = stats["xml"].get(name), stats["pdf"].get(name)
+            versions = (xml_stat.version if xml_stat else None, pdf_stat.version if pdf_stat else None)
+            old = known.get(name)
+            if old is not None and (old["xml_version"], old["pdf_version"]) == versions:
+                continue
+            # A rewrite between the listing and these reads is caught by the next reconcile
+            xml_bytes = self._read(f"{user_id}/xml/{name}.xml") if xml_stat else None
+            pdf_bytes = self._read(f"{user_id}/pdf/{name}.pdf") if pdf_stat else None
+            mtime = max(stat.mtime for stat in (xml_stat, pdf_stat) if stat is not None)
+            self._upsert(conn, name, xml_bytes, pdf_bytes, mtime, versions=versions)
+            if old is not None and old["render_key"] is not None:
+                # Same XML and PDF bytes as when the key was recorded: it still holds
+                conn.execute(
+                    "UPDATE resumes SET render_key = ? WHERE name = ? AND content_hash IS ? AND pdf_hash IS ?",
+                    (old["render_key"], name, old["content_hash"], old["pdf_hash"]),
+                )
+        conn.commit()
+
+    def _refresh(self, conn: sqlite3.Connection, user_id: str):
+        """Reconcile before a read, unless the user was reconciled within the interval."""
+        if self.reconcile_interval is None:
+            return
+        now = time.monotonic()
+        with self._reconciled_lock:
+            last = self._reconciled.get(user_id)
+            if last is not None and now - last < self.reconcile_interval:
+                return
+            self._reconciled[user_id] = now
+        self._reconcile(conn, user_id)
+
+    def _upsert(self, conn, name, xml_bytes, pdf_bytes, mtime, resume=None, versions=(None, None),
+                render_key=None):
+        summary = content_hash = None
+        if xml_bytes is not None:
+            content_hash = hashlib.sha256(xml_bytes).hexdigest()
+            try:
+                summary = json.dumps(resume_summary(resume if resume is not None else xml_bytes))
+            except ResumeValidationError:
+                pass
+        conn.execute(
+            "INSERT OR REPLACE INTO resumes"
+            " (name, mtime, size, pages, content_hash, summary, pdf_hash, xml_version, pdf_version, render_key)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                name,
+                mtime,
+                len(pdf_bytes) if pdf_bytes is not None else None,
+                count_pages(pdf_bytes) if pdf_bytes is not None else None,
+                content_hash,
+                summary,
+                hashlib.sha256(pdf_bytes).hexdigest() if pdf_bytes is not None else None,
+                *versions,
+                render_key,
+            ),
+        )
+
+    def upsert(self, user_id: str, name: str, xml_bytes: bytes, pdf_bytes: Optional[bytes],
+               resume: Optional[Resume] = None, render_key: Optional[str] = None):
+        """Record a saved resume. Pass the parsed `resume` to avoid parsing `xml_bytes` again.
+
+        `render_key` is the rendercache.source_key the PDF was rendered from.
+        The row's storage versions are left unknown, so the next reconcile
+        reads the objects once to pick them up.
+        """
+        with closing(self._connect(user_id)) as conn:
+            self._upsert(conn, name, xml_bytes, pdf_bytes, time.time(), resume, render_key=render_key)
+            conn.commit()
+
+    def render_keys(self, user_id: str) -> dict:
+        """Return {name: (content_hash, render_key)} for the user's resumes with a PDF.
+
+        content_hash is the SHA-256 of the XML now in storage (as of the last
+        reconcile); render_key is None when what the PDF was rendered from is
+        unknown.
+        """
+        with closing(self._connect(user_id)) as conn:
+            self._refresh(conn, user_id)
+            rows = conn.execute("SELECT name, content_hash, render_key FROM resumes WHERE size IS NOT NULL")
+            return {row["name"]: (row["content_hash"], row["render_key"]) for row in rows}
+
+    def remove(self, user_id: str, name: str):
+        with closing(self._connect(user_id)) as conn:
+            conn.execute("DELETE FROM resumes WHERE name = ?", (name,))
+            conn.commit()
+
+    def get(self, user_id: str, name: str) -> Optional[dict]:
+        """Return the row for `name` with `summary` decoded, or None."""
+        with closing(self._connect(user_id)) as conn:
+            self._refresh(conn, user_id)
+            row = conn.execute("SELECT * FROM resumes WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["summary"] = json.loads(entry["summary"]) if entry["summary"] else None
+        return entry
+
+    def list(self, user_id: str, sort: str = "name", descending: bool = False,
+             offset: int = 0, limit: Optional[int] = None, with_pdf: bool = True):
+        """Return (rows, total) for one page of the user's resumes.
+
+        Rows are dicts without the summary. `with_pdf` restricts the listing to
+        resumes that have a rendered PDF.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort!r}")
+        where = " WHERE size IS NOT NULL" if with_pdf else ""
+        order = "DESC" if descending else "ASC"
+        with closing(self._connect(user_id)) as conn:
+            self._refresh(conn, user_id)
+            total = conn.execute(f"SELECT COUNT(*) FROM resumes{where}").fetchone()[0]
+            rows = conn.execute(
+                f"SELECT name, mtime, size, pages, content_hash, pdf_hash FROM resumes{where}"
+                f" ORDER BY {sort} {order}, name LIMIT ? OFFSET ?",
+                (limit if limit is not None else -1, offset),
+            ).fetchall()
+        return [dict(row) for row in rows], total
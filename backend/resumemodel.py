@@ -0,0 +1,505 @@
+"""Typed, validated model of a resume document.
+
+Resume XML is parsed once, in a single streaming pass, into frozen slotted
+dataclasses; the PDF builder (makeresume) and the JSON view (resumeindex,
+/get-resume) both work from the model. Size, nesting depth and element
+count are checked while the document streams in, so oversized or malformed
+input is rejected before anything is built from it.
+
+Models are immutable and hashable: makeresume memoizes section layouts keyed
+by the section objects themselves, and the render cache keys on repr().
+`apply_patch` edits a model in place of re-parsing the document; the
+sections a patch does not touch are the same objects as before, so their
+layouts stay memoized.
+"""
+import dataclasses
+import math
+import os
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Optional
+
+MAX_XML_BYTES = int(os.environ.get("RESUME_MAX_BYTES", 1024 * 1024))
+MAX_DEPTH = int(os.environ.get("RESUME_MAX_DEPTH", 12))
+MAX_ELEMENTS = int(os.environ.get("RESUME_MAX_ELEMENTS", 20000))
+MAX_TEXT_LENGTH = int(os.environ.get("RESUME_MAX_TEXT_LENGTH", 5000))
+MAX_MARGIN = 3.0  # inches
+
+READ_CHUNK_SIZE = 64 * 1024
+DEFAULT_MARGIN = 0.75
+
+
+class ResumeValidationError(ValueError):
+    """The document is not well-formed, breaks a limit, or does not fit the schema."""
+
+
+@dataclass(frozen=True, slots=True)
+class PersonalInfo:
+    name: str = ""
+    email: str = ""
+    phone: str = ""
+    location: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class Institution:
+    name: str = ""
+    degree: str = ""
+    gpa: str = ""
+    graduation_date: str = ""
+    location: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class Education:
+    institutions: tuple = ()
+
+
+@dataclass(frozen=True, slots=True)
+class SkillGroup:
+    category: str = ""
+    items: tuple = ()
+
+
+@dataclass(frozen=True, slots=True)
+class Skills:
+    groups: tuple = ()
+
+
+@dataclass(frozen=True, slots=True)
+class Responsibility:
+    text: str = ""
+    active: bool = True
+
+
+@dataclass(frozen=True, slots=True)
+class Job:
+    company: str = ""
+    location: str = ""
+    duration: str = ""
+    position: str = ""
+    responsibilities: tuple = ()
+
+
+@dataclass(frozen=True, slots=True)
+class Experience:
+    jobs: tuple = ()
+
+
+@dataclass(frozen=True, slots=True)
+class Margins:
+    """Margins in inches; a side missing from the XML is None."""
+    top: Optional[float] = None
+    bottom: Optional[float] = None
+    left: Optional[float] = None
+    right: Optional[float] = None
+
+    def resolved(self) -> dict:
+        return {side: DEFAULT_MARGIN if value is None else value
+                for side, value in dataclasses.asdict(self).items()}
+
+
+@dataclass(frozen=True, slots=True)
+class Resume:
+    """A whole resume. `sections` keeps the document order the PDF follows."""
+    sections: tuple = ()
+    margins: Optional[Margins] = None
+
+    def _first(self, kind):
+        for section in self.sections:
+            if isinstance(section, kind):
+                return section
+        return None
+
+    @property
+    def personal(self) -> PersonalInfo:
+        return self._first(PersonalInfo) or PersonalInfo()
+
+    @property
+    def institutions(self) -> tuple:
+        return tuple(i for s in self.sections if isinstance(s, Education) for i in s.institutions)
+
+    @property
+    def skill_groups(self) -> tuple:
+        return tuple(g for s in self.sections if isinstance(s, Skills) for g in s.groups)
+
+    @property
+    def jobs(self) -> tuple:
+        return tuple(j for s in self.sections if isinstance(s, Experience) for j in s.jobs)
+
+    def with_active(self, changes: dict) -> "Resume":
+        """Return a copy with responsibilities switched on or off.
+
+        `changes` maps (job_index, responsibility_index), counted across all
+        jobs in document order, to the new `active` value. Raises IndexError
+        for a reference that does not exist.
+        """
+        counts = [len(job.responsibilities) for job in self.jobs]
+        for job_index, resp_index in changes:
+            if not (0 <= job_index < len(counts) and 0 <= resp_index < counts[job_index]):
+                raise IndexError((job_index, resp_index))
+
+        sections = []
+        job_index = 0
+        for section in self.sections:
+            if isinstance(section, Experience):
+                jobs = []
+                for job in section.jobs:
+                    resps = tuple(
+                        dataclasses.replace(resp, active=changes.get((job_index, i), resp.active))
+                        for i, resp in enumerate(job.responsibilities)
+                    )
+                    jobs.append(dataclasses.replace(job, responsibilities=resps))
+                    job_index += 1
+                section = Experience(tuple(jobs))
+            sections.append(section)
+        return dataclasses.replace(self, sections=tuple(sections))
+
+
+def _text(elem, tag: str) -> str:
+    """Text of the first `tag` child, like findtext(tag, '')."""
+    return elem.findtext(tag, "")
+
+
+def _margin(elem, side: str) -> Optional[float]:
+    text = elem.findtext(side)
+    if text is None:
+        return None
+    try:
+        value = float(text)
+    except ValueError:
+        raise ResumeValidationError(f"Margin {side} is not a number: {text!r}")
+    if math.isnan(value) or not 0 <= value <= MAX_MARGIN:
+        raise ResumeValidationError(f"Margin {side} must be between 0 and {MAX_MARGIN} inches")
+    return value
+
+
+def _section(elem):
+    """Model for a completed top-level element, or None for tags the renderer ignores."""
+    if elem.tag == "personal_info":
+        return PersonalInfo(_text(elem, "name"), _text(elem, "email"), _text(elem, "phone"), _text(elem, "location"))
+    if elem.tag == "education":
+        return Education(tuple(
+            Institution(_text(i, "name"), _text(i, "degree"), _text(i, "gpa"),
+                        _text(i, "graduation_date"), _text(i, "location"))
+            for i in elem.findall("institution")
+        ))
+    if elem.tag == "skills":
+        return Skills(tuple(
+            SkillGroup(_text(g, "category"), tuple(item.text for item in g.findall("items/item") if item.text))
+            for g in elem.findall("skillgroup")
+        ))
+    if elem.tag == "experience":
+        return Experience(tuple(
+            Job(_text(j, "company"), _text(j, "location"), _text(j, "duration"), _text(j, "position"), tuple(
+                Responsibility(r.text or "", r.get("deactivated", "false") != "true")
+                for r in j.findall("responsibilities/responsibility")
+            ))
+            for j in elem.findall("job")
+        ))
+    return None
+
+
+class _Loader:
+    """Feeds chunks to a pull parser, enforcing limits and building sections as they close."""
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._size = 0
+        self._tail = b""
+        self._depth = 0
+        self._elements = 0
+        self._root = None
+        self._sections = []
+        self._margins = None
+
+    def feed(self, chunk):
+        """Parse the next chunk of bytes, or of text if the document was given as str."""
+        text = isinstance(chunk, str)
+        self._size += len(chunk.encode("utf-8")) if text else len(chunk)
+        if self._size > MAX_XML_BYTES:
+            raise ResumeValidationError(f"Resume XML is larger than {MAX_XML_BYTES} bytes")
+        # No DTDs means no entity definitions to expand; keep a tail in case the
+        # keyword straddles two chunks
+        window = self._tail + chunk if type(self._tail) is type(chunk) else chunk
+        if ("<!DOCTYPE" if text else b"<!DOCTYPE") in window:
+            raise ResumeValidationError("Resume XML may not contain a DOCTYPE")
+        self._tail = chunk[-8:]
+        try:
+            self._parser.feed(chunk)
+        except ET.ParseError as e:
+            raise ResumeValidationError(f"Malformed XML: {e}")
+        self._drain()
+
+    def close(self) -> Resume:
+        try:
+            self._parser.close()
+        except ET.ParseError as e:
+            raise ResumeValidationError(f"Malformed XML: {e}")
+        self._drain()
+        if self._root is None:
+            raise ResumeValidationError("Resume XML is empty")
+        return Resume(tuple(self._sections), self._margins)
+
+    def _drain(self):
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                self._depth += 1
+                self._elements += 1
+                if self._depth > MAX_DEPTH:
+                    raise ResumeValidationError(f"Resume XML is nested deeper than {MAX_DEPTH} levels")
+                if self._elements > MAX_ELEMENTS:
+                    raise ResumeValidationError(f"Resume XML has more than {MAX_ELEMENTS} elements")
+                if self._root is None:
+                    if elem.tag != "resume":
+                        raise ResumeValidationError(f"Root element must be <resume>, not <{elem.tag}>")
+                    self._root = elem
+                continue
+
+            self._depth -= 1
+            if elem.text is not None and len(elem.text) > MAX_TEXT_LENGTH:
+                raise ResumeValidationError(f"<{elem.tag}> text is longer than {MAX_TEXT_LENGTH} characters")
+            if self._depth == 1:
+                # A top-level section is complete: model it, then free its subtree
+                if elem.tag == "margins" and self._margins is None:
+                    self._margins = Margins(*(_margin(elem, side) for side in ("top", "bottom", "left", "right")))
+                elif elem.tag != "margins":
+                    section = _section(elem)
+                    if section is not None:
+                        self._sections.append(section)
+                self._root.remove(elem)
+
+
+def parse_resume(source) -> Resume:
+    """Build a Resume from XML text (str or bytes), an Element or an ElementTree.
+
+    Raises ResumeValidationError for malformed, oversized or invalid input.
+    """
+    if isinstance(source, Resume):
+        return source
+    if isinstance(source, ET.ElementTree):
+        source = source.getroot()
+    if isinstance(source, ET.Element):
+        source = ET.tostring(source)
+    loader = _Loader()
+    for start in range(0, len(source), READ_CHUNK_SIZE):
+        loader.feed(source[start:start + READ_CHUNK_SIZE])
+    return loader.close()
+
+
+def load_resume(path: str) -> Resume:
+    """Stream a resume from an XML file, stopping as soon as a limit is exceeded."""
+    loader = _Loader()
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_CHUNK_SIZE):
+            loader.feed(chunk)
+    return loader.close()
+
+
+def resume_json(resume: Resume) -> dict:
+    """The JSON view of a resume served by /get-resume (without save_name)."""
+    personal = resume.personal
+    return {
+        "personal": {
+            "name": personal.name,
+            "email": personal.email,
+            "phone": personal.phone,
+            "location": personal.location,
+        },
+        "education": [
+            {
+                "institution": inst.name,
+                "degree": inst.degree,
+                "gpa": inst.gpa,
+                "date": inst.graduation_date,
+                "location": inst.location,
+            }
+            for inst in resume.institutions
+        ],
+        "skills": [
+            {"category": group.category, "items": list(group.items)}
+            for group in resume.skill_groups
+            if group.category or group.items
+        ],
+        "experience": [
+            {
+                "company": job.company,
+                "location": job.location,
+                "duration": job.duration,
+                "position": job.position,
+                "responsibilities": [{"text": r.text, "active": r.active} for r in job.responsibilities],
+            }
+            for job in resume.jobs
+        ],
+        "margins": (resume.margins or Margins()).resolved(),
+    }
+
+
+# Element type of each tuple field, for building patch values
+_ELEMENT_TYPES = {
+    (Experience, "jobs"): Job,
+    (Job, "responsibilities"): Responsibility,
+    (Education, "institutions"): Institution,
+    (Skills, "groups"): SkillGroup,
+    (SkillGroup, "items"): str,
+}
+
+# Top-level patch paths that address one list across all sections of a kind
+_VIEWS = {"jobs": (Experience, "jobs"), "institutions": (Education, "institutions"),
+          "skill_groups": (Skills, "groups")}
+
+MAX_PATCH_OPS = 1000
+
+
+def _build(kind, value, where: str):
+    """Model object of type `kind` from a JSON patch value."""
+    if kind is str:
+        if not isinstance(value, str):
+            raise ResumeValidationError(f"{where} must be a string")
+        if len(value) > MAX_TEXT_LENGTH:
+            raise ResumeValidationError(f"{where} is longer than {MAX_TEXT_LENGTH} characters")
+        return value
+    if kind is bool:
+        if not isinstance(value, bool):
+            raise ResumeValidationError(f"{where} must be true or false")
+        return value
+    if not isinstance(value, dict):
+        raise ResumeValidationError(f"{where} must be an object")
+    fields = {f.name: f for f in dataclasses.fields(kind)}
+    values = {}
+    for name, item in value.items():
+        if name not in fields:
+            raise ResumeValidationError(f"{where} has no field {name!r}")
+        values[name] = _build_field(kind, name, fields[name].default, item, f"{where}.{name}")
+    return kind(**values)
+
+
+def _build_field(owner, name: str, default, value, where: str):
+    if isinstance(default, tuple):
+        if not isinstance(value, list):
+            raise ResumeValidationError(f"{where} must be a list")
+        element = _ELEMENT_TYPES[(owner, name)]
+        return tuple(_build(element, item, f"{where}[{i}]") for i, item in enumerate(value))
+    return _build(type(default), value, where)
+
+
+def _apply_at(node, path: list, op: str, value, element=None):
+    """Copy of dataclass or tuple `node` with the operation applied at `path` below it."""
+    key, rest = path[0], path[1:]
+    if isinstance(node, tuple):
+        if type(key) is not int:
+            raise ResumeValidationError(f"Expected a list index, got {key!r}")
+        limit = len(node) + 1 if op == "insert" and not rest else len(node)
+        if not 0 <= key < limit:
+            raise ResumeValidationError(f"Index {key} is out of range")
+        if rest:
+            return node[:key] + (_apply_at(node[key], rest, op, value),) + node[key + 1:]
+        if op == "remove":
+            return node[:key] + node[key + 1:]
+        item = _build(element, value, f"[{key}]")
+        return node[:key] + (item,) + node[key + (op == "set"):]
+
+    if not isinstance(key, str) or key not in {f.name for f in dataclasses.fields(node)}:
+        raise ResumeValidationError(f"{type(node).__name__} has no field {key!r}")
+    current = getattr(node, key)
+    if rest:
+        child = _apply_at(current, rest, op, value, _ELEMENT_TYPES.get((type(node), key)))
+    elif op != "set":
+        raise ResumeValidationError(f"{op} needs a list index, not field {key!r}")
+    else:
+        child = _build_field(type(node), key, current, value, key)
+    return dataclasses.replace(node, **{key: child})
+
+
+def _apply_view(resume: Resume, path: list, op: str, value) -> Resume:
+    """Apply an operation under "jobs", "institutions" or "skill_groups", counted across sections."""
+    kind, field = _VIEWS[path[0]]
+    if len(path) < 2 or type(path[1]) is not int:
+        raise ResumeValidationError(f"{path[0]} needs an index")
+    index = path[1]
+    owners = [i for i, section in enumerate(resume.sections) if isinstance(section, kind)]
+    if not owners:
+        raise ResumeValidationError(f"Resume has no section for {path[0]}")
+    for position in owners:
+        size = len(getattr(resume.sections[position], field))
+        # Appending goes into the last section of the kind
+        if index < size or (index == size and op == "insert" and len(path) == 2 and position == owners[-1]):
+            break
+        index -= size
+    else:
+        raise ResumeValidationError(f"Index {path[1]} is out of range for {path[0]}")
+    section = _apply_at(resume.sections[position], [field, index, *path[2:]], op, value)
+    sections = resume.sections[:position] + (section,) + resume.sections[position + 1:]
+    return dataclasses.replace(resume, sections=sections)
+
+
+def _apply_one(resume: Resume, operation) -> Resume:
+    if not isinstance(operation, dict):
+        raise ResumeValidationError("Each patch operation must be an object")
+    op, path, value = operation.get("op"), operation.get("path"), operation.get("value")
+    if op not in ("set", "insert", "remove"):
+        raise ResumeValidationError(f"Unknown patch op {op!r}")
+    if not isinstance(path, list) or not path:
+        raise ResumeValidationError("Patch path must be a non-empty list")
+
+    if path[0] in _VIEWS:
+        return _apply_view(resume, path, op, value)
+    if path[0] == "personal":
+        sections = resume.sections
+        if not any(isinstance(s, PersonalInfo) for s in sections):
+            sections = (PersonalInfo(),) + sections
+        position = next(i for i, s in enumerate(sections) if isinstance(s, PersonalInfo))
+        if len(path) != 2:
+            raise ResumeValidationError("personal needs exactly one field")
+        section = _apply_at(sections[position], path[1:], op, value)
+        return dataclasses.replace(resume, sections=sections[:position] + (section,) + sections[position + 1:])
+    if path[0] == "margins":
+        if len(path) != 2 or path[1] not in ("top", "bottom", "left", "right") or op != "set":
+            raise ResumeValidationError("margins takes set on top, bottom, left or right")
+        if value is not None:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ResumeValidationError(f"Margin {path[1]} is not a number: {value!r}")
+            if math.isnan(value) or not 0 <= value <= MAX_MARGIN:
+                raise ResumeValidationError(f"Margin {path[1]} must be between 0 and {MAX_MARGIN} inches")
+            value = float(value)
+        return dataclasses.replace(resume, margins=dataclasses.replace(resume.margins or Margins(),
+                                                                       **{path[1]: value}))
+    raise ResumeValidationError(f"Unknown patch path {path[0]!r}")
+
+
+def _element_count(resume: Resume) -> int:
+    """Roughly the number of XML elements the resume would serialize to."""
+    count = 1
+    for job in resume.jobs:
+        count += 6 + len(job.responsibilities)
+    for group in resume.skill_groups:
+        count += 3 + len(group.items)
+    return count + 6 * len(resume.institutions) + 5 * len(resume.sections)
+
+
+def apply_patch(resume: Resume, operations: list) -> Resume:
+    """Return `resume` with a list of structural edits applied, all or nothing.
+
+    Each operation is {"op": "set" | "insert" | "remove", "path": [...],
+    "value": ...}. Paths start at "personal", "margins", or one of "jobs",
+    "institutions" and "skill_groups", which count entries across all
+    sections of their kind like `with_active` does; then they follow field
+    names and list indices of the model:
+
+        {"op": "set", "path": ["jobs", 2, "responsibilities", 3, "text"], "value": "..."}
+        {"op": "insert", "path": ["skill_groups", 0, "items", 1], "value": "Rust"}
+        {"op": "remove", "path": ["jobs", 0, "responsibilities", 4]}
+
+    Inserted objects are given as JSON objects of their fields. Raises
+    ResumeValidationError for an invalid operation or a result that breaks
+    the parser's limits; `resume` is never modified.
+    """
+    if not isinstance(operations, list):
+        raise ResumeValidationError("A patch is a list of operations")
+    if len(operations) > MAX_PATCH_OPS:
+        raise ResumeValidationError(f"A patch may have at most {MAX_PATCH_OPS} operations")
+    for operation in operations:
+        resume = _apply_one(resume, operation)
+    if _element_count(resume) > MAX_ELEMENTS:
+        raise ResumeValidationError(f"Resume would have more than {MAX_ELEMENTS} elements")
+    return resume
@@ -0,0 +1,276 @@
+"""Where saved resumes live: the local filesystem or an S3-compatible bucket.
+
+Objects are addressed by '/'-separated keys such as `<user>/pdf/<name>.pdf`.
+Every backend implements blocking `*_sync` methods; the async methods the
+API awaits run those on the storage's own thread pool, so a slow disk or
+bucket holds up only the requests waiting on it, never the event loop.
+
+Writes are atomic: readers see the old object or the new one, never a
+partial file. LocalStorage writes a temporary file and renames it over the
+target; S3 PUTs are atomic by nature.
+"""
+import asyncio
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = ClientError = None
+
+
+class StorageStat(NamedTuple):
+    size: int
+    mtime: float
+    # Opaque string that changes whenever the object is rewritten
+    version: str
+
+
+class Storage:
+    """Base class: async wrappers around a backend's blocking operations."""
+
+    def __init__(self, io_threads: int = 8):
+        self._executor = ThreadPoolExecutor(max_workers=io_threads, thread_name_prefix="storage")
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def read(self, key: str) -> bytes:
+        """Return the object's bytes. Raises FileNotFoundError if it does not exist."""
+        return await self._run(self.read_sync, key)
+
+    async def write(self, key: str, data: bytes):
+        """Replace the object atomically (and durably, where the backend can)."""
+        await self._run(self.write_sync, key, data)
+
+    async def delete(self, key: str) -> bool:
+        """Delete the object; return False if it did not exist."""
+        return await self._run(self.delete_sync, key)
+
+    async def stat(self, key: str) -> Optional[StorageStat]:
+        """Return the object's size, mtime and version, or None if it does not exist."""
+        return await self._run(self.stat_sync, key)
+
+    async def list(self, prefix: str) -> list:
+        """Names of the objects directly under `prefix` (a key ending in '/')."""
+        return await self._run(self.list_sync, prefix)
+
+    async def scan(self, prefix: str) -> dict:
+        """Stats of the objects directly under `prefix`, by name."""
+        return await self._run(self.scan_sync, prefix)
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path of the object, for backends that have one."""
+        return None
+
+    def read_sync(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    def write_sync(self, key: str, data: bytes):
+        raise NotImplementedError
+
+    def delete_sync(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def stat_sync(self, key: str) -> Optional[StorageStat]:
+        raise NotImplementedError
+
+    def list_sync(self, prefix: str) -> list:
+        raise NotImplementedError
+
+    def scan_sync(self, prefix: str) -> dict:
+        stats = {}
+        for name in self.list_sync(prefix):
+            stat = self.stat_sync(prefix + name)
+            if stat is not None:
+                stats[name] = stat
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class LocalStorage(Storage):
+    """Objects as files under `base_dir`, one directory level per key segment.
+
+    Directories are created on first write and remembered, so the hot path
+    does no existence checks; a directory removed behind our back (another
+    replica, or an admin) is recreated when a write into it fails.
+
+    Args:
+        base_dir: Root directory of all keys.
+        fsync: Flush each write to disk before it becomes visible.
+    """
+
+    def __init__(self, base_dir: str, fsync: bool = True, io_threads: int = 8):
+        super().__init__(io_threads)
+        self.base_dir = os.path.abspath(base_dir)
+        self.fsync = fsync
+        self._known_dirs = set()
+        self._dirs_lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.base_dir, key))
+        if not path.startswith(self.base_dir + os.sep):
+            raise ValueError(f"Invalid storage key: {key!r}")
+        return path
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+    def _ensure_dir(self, directory: str, recheck: bool = False):
+        with self._dirs_lock:
+            if directory in self._known_dirs and not recheck:
+                return
+        os.makedirs(directory, exist_ok=True)
+        with self._dirs_lock:
+            self._known_dirs.add(directory)
+
+    def read_sync(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def write_sync(self, key: str, data: bytes):
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        self._ensure_dir(directory)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        except FileNotFoundError:
+            self._ensure_dir(directory, recheck=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def delete_sync(self, key: str) -> bool:
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def stat_sync(self, key: str) -> Optional[StorageStat]:
+        try:
+            st = os.stat(self._path(key))
+        except FileNotFoundError:
+            return None
+        return StorageStat(st.st_size, st.st_mtime, f"{st.st_mtime_ns:x}-{st.st_size:x}")
+
+    def list_sync(self, prefix: str) -> list:
+        directory = self._path(prefix)
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            return []
+        with entries:
+            # Skip subdirectories and in-flight temporary files
+            return [e.name for e in entries if e.is_file() and not e.name.endswith(".tmp")]
+
+    def scan_sync(self, prefix: str) -> dict:
+        stats = {}
+        for name in self.list_sync(prefix):
+            try:
+                st = os.stat(os.path.join(self._path(prefix), name))
+            except FileNotFoundError:
+                continue
+            stats[name] = StorageStat(st.st_size, st.st_mtime, f"{st.st_mtime_ns:x}-{st.st_size:x}")
+        return stats
+
+
+class S3Storage(Storage):
+    """Objects in an S3-compatible bucket (AWS S3, MinIO, ...), under an optional key prefix.
+
+    Needs boto3. Credentials come from the usual AWS environment variables
+    or config files; `endpoint_url` points at a non-AWS service such as a
+    local MinIO. `client` replaces the boto3 client built from those.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, io_threads: int = 8, client=None):
+        if boto3 is None:
+            raise RuntimeError("S3 storage needs boto3 (pip install boto3)")
+        super().__init__(io_threads)
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        # boto3 clients are thread-safe; one is shared by every I/O thread
+        self._client = client or boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    @staticmethod
+    def _missing(error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def read_sync(self, key: str) -> bytes:
+        try:
+            response = self._client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if self._missing(e):
+                raise FileNotFoundError(key)
+            raise
+        with response["Body"] as body:
+            return body.read()
+
+    def write_sync(self, key: str, data: bytes):
+        self._client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def delete_sync(self, key: str) -> bool:
+        # DELETE succeeds whether or not the object existed, so ask first
+        if self.stat_sync(key) is None:
+            return False
+        self._client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        return True
+
+    def stat_sync(self, key: str) -> Optional[StorageStat]:
+        try:
+            head = self._client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if self._missing(e):
+                return None
+            raise
+        return StorageStat(head["ContentLength"], head["LastModified"].timestamp(), head["ETag"].strip('"'))
+
+    def list_sync(self, prefix: str) -> list:
+        return list(self.scan_sync(prefix))
+
+    def scan_sync(self, prefix: str) -> dict:
+        # A listing carries each object's size, mtime and ETag: no HEAD per object
+        full_prefix = self._key(prefix)
+        stats = {}
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=full_prefix, Delimiter="/"):
+            for obj in page.get("Contents", ()):
+                stats[obj["Key"][len(full_prefix):]] = StorageStat(
+                    obj["Size"], obj["LastModified"].timestamp(), obj["ETag"].strip('"'))
+        return stats
+
+
+def storage_from_env(default_dir: str) -> Storage:
+    """Build the backend named by STORAGE_BACKEND ("local", the default, or "s3")."""
+    backend = os.environ.get("STORAGE_BACKEND", "local").lower()
+    io_threads = int(os.environ.get("STORAGE_IO_THREADS", 8))
+    if backend == "s3":
+        return S3Storage(
+            os.environ["S3_BUCKET"],
+            prefix=os.environ.get("S3_PREFIX", ""),
+            endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None,
+            region=os.environ.get("S3_REGION") or None,
+            io_threads=io_threads,
+        )
+    if backend != "local":
+        raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}")
+    return LocalStorage(os.environ.get("RESUME_STORAGE_DIR", default_dir), io_threads=io_threads)
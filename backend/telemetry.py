@@ -0,0 +1,269 @@
+"""Per-stage timings, Prometheus-style histograms and structured logging.
+
+Code marks its stages with `stage("name")`. Inside a Trace (one per HTTP
+request, or one per render job in a pool worker) each stage records its
+wall time and the net number of memory blocks it allocated. Outside a trace,
+stage() costs one context-variable lookup.
+
+Render jobs run in other processes, so the worker returns its stages with
+the result and the parent merges them into the request's trace (see
+renderpool). Finished stages are observed into histograms that /metrics
+serves in the Prometheus text format.
+"""
+import contextvars
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BLOCKS_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536, 262144)
+BYTES_BUCKETS = (8192, 16384, 32768, 65536, 131072, 262144, 524288, 1048576, 4194304)
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+_NULL_STAGE = nullcontext()
+
+
+class Histogram:
+    """Cumulative histogram with one series per label value tuple."""
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts, then sum and count
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+        for labels, (counts, total, count) in items:
+            base = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels)]
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts + [count - sum(counts)]):
+                cumulative += n
+                bucket_labels = ",".join(base + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = f"{{{','.join(base)}}}" if base else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=SECONDS_BUCKETS) -> Histogram:
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, help, labelnames, buckets)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self._metrics.values())
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "ezapp_stage_duration_seconds", "Time spent in each request or render stage.", ("stage",))
+STAGE_BLOCKS = REGISTRY.histogram(
+    "ezapp_stage_allocated_blocks", "Net memory blocks allocated by each stage.", ("stage",), BLOCKS_BUCKETS)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "ezapp_request_duration_seconds", "HTTP request latency by endpoint.", ("method", "endpoint", "status"))
+PDF_BYTES = REGISTRY.histogram(
+    "ezapp_pdf_bytes", "Size of PDFs sent to clients or saved, by endpoint.", ("endpoint",), BYTES_BUCKETS)
+ADMISSION_WAIT = REGISTRY.histogram(
+    "ezapp_render_admission_wait_seconds", "Time renders waited for a render slot, by priority.", ("priority",))
+
+
+class Trace:
+    """Stages recorded for one request or render job, in completion order.
+
+    Stages may nest; each records only its own time and blocks, excluding
+    nested stages, so the stages of a trace add up without double counting.
+    """
+
+    def __init__(self):
+        self.stages = []
+        # Time and blocks used by nested stages, one entry per open stage
+        self._open = []
+
+    def add(self, name: str, seconds: float, blocks: int = 0):
+        self.stages.append((name, seconds, blocks))
+
+    def merge(self, stages):
+        self.stages.extend(stages)
+
+    def totals(self) -> dict:
+        """Seconds per stage name, summed over repeats."""
+        totals = {}
+        for name, seconds, _ in self.stages:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.totals().items())
+
+
+@contextmanager
+def tracing(trace: Trace = None):
+    """Make `trace` (or a new one) current for the enclosed code and yield it."""
+    trace = trace or Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def _timed(trace: Trace, name: str):
+    nested = [0.0, 0]
+    trace._open.append(nested)
+    blocks = sys.getallocatedblocks()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        blocks = sys.getallocatedblocks() - blocks
+        trace._open.pop()
+        if trace._open:
+            trace._open[-1][0] += seconds
+            trace._open[-1][1] += blocks
+        trace.add(name, seconds - nested[0], blocks - nested[1])
+
+
+def stage(name: str):
+    """Context manager that records `name` in the current trace, if there is one."""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_STAGE
+    return _timed(trace, name)
+
+
+def observe_stages(stages):
+    for name, seconds, blocks in stages:
+        STAGE_SECONDS.observe(seconds, name)
+        STAGE_BLOCKS.observe(max(blocks, 0), name)
+
+
+class SamplingFilter(logging.Filter):
+    """Pass every warning and error, and a random `rate` share of lower-level records."""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed via `extra=` become keys."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = "INFO", sample_rate: float = 1.0):
+    """Send structured, sampled log lines to stderr from the root logger."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(SamplingFilter(sample_rate))
+    root = logging.getLogger()
+    root.handlers = [h for h in root.handlers if not isinstance(h.formatter, JsonFormatter)]
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+_log = logging.getLogger("telemetry")
+
+
+class TelemetryMiddleware:
+    """ASGI middleware that traces each HTTP request.
+
+    Records request latency by endpoint, observes every stage, optionally adds
+    a Server-Timing header, and logs one (sampled) line per request. Requests
+    slower than `slow_seconds` are always logged, as warnings.
+    """
+
+    def __init__(self, app, server_timing: bool = False, slow_seconds: float = 2.0):
+        self.app = app
+        self.server_timing = server_timing
+        self.slow_seconds = slow_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    total = time.perf_counter() - start
+                    timing = trace.server_timing()
+                    value = f"{timing}, total;dur={total * 1000:.1f}" if timing else f"total;dur={total * 1000:.1f}"
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"server-timing", value.encode("latin-1"))]
+            await send(message)
+
+        with tracing() as trace:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                elapsed = time.perf_counter() - start
+                endpoint = scope.get("endpoint")
+                name = getattr(endpoint, "__name__", "unmatched")
+                REQUEST_SECONDS.observe(elapsed, scope["method"], name, str(status))
+                observe_stages(trace.stages)
+                fields = {"method": scope["method"], "endpoint": name, "status": status,
+                          "duration_ms": round(elapsed * 1000, 1),
+                          "stages_ms": {k: round(v * 1000, 2) for k, v in trace.totals().items()}}
+                if elapsed >= self.slow_seconds:
+                    _log.warning("slow request", extra=fields)
+                else:
+                    _log.info("request", extra=fields)
@@ -0,0 +1,114 @@
+"""Page thumbnails rasterized from rendered resume PDFs.
+
+ReportLab's renderPM draws ReportLab drawings, not finished PDFs, so pages
+are rasterized with PyMuPDF when it is installed (the `thumbnails` extra) or
+with poppler's `pdftoppm` when that is on the PATH. WebP output also needs
+Pillow. Without a rasterizer, `available()` is False and callers fall back
+to the PDF itself.
+
+Thumbnails are stored per user as `<name>.<pdf hash>.p<page>.w<width>.<fmt>`.
+A new save changes the PDF hash, so stale thumbnails are never served and
+`stale()` picks them out for deletion.
+"""
+import io
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from typing import Optional
+
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+THUMBNAIL_WIDTH = int(os.environ.get("THUMBNAIL_WIDTH", 300))
+MIN_WIDTH = 32
+MAX_WIDTH = 1200
+FORMATS = {"png": "image/png", "webp": "image/webp"}
+WEBP_QUALITY = 80
+
+PDFTOPPM = shutil.which("pdftoppm")
+
+_FILENAME_RE = re.compile(r"^(?P<name>.+)\.(?P<hash>[0-9a-f]{16})\.p\d+\.w\d+\.(?:png|webp)$")
+
+
+def available(fmt: str = "png") -> bool:
+    """Whether thumbnails in `fmt` can be produced on this machine."""
+    if pymupdf is None and PDFTOPPM is None:
+        return False
+    return fmt == "png" or (fmt == "webp" and Image is not None)
+
+
+def thumbnail_filename(name: str, pdf_hash: str, page: int, width: int, fmt: str) -> str:
+    return f"{name}.{pdf_hash[:16]}.p{page}.w{width}.{fmt}"
+
+
+def stale(filenames, name: str, keep_hash: Optional[str] = None) -> list:
+    """The thumbnail filenames of `name`, except those made from the PDF with `keep_hash`."""
+    keep = keep_hash[:16] if keep_hash else None
+    result = []
+    for filename in filenames:
+        match = _FILENAME_RE.match(filename)
+        if match and match["name"] == name and match["hash"] != keep:
+            result.append(filename)
+    return result
+
+
+def render_thumbnail(pdf_bytes: bytes, page: int = 1, width: int = THUMBNAIL_WIDTH, fmt: str = "png") -> bytes:
+    """Rasterize one page (1-based) of a PDF to `width` pixels wide.
+
+    Raises ValueError if the PDF has no such page and RuntimeError if no
+    rasterizer for `fmt` is installed.
+    """
+    if not available(fmt):
+        raise RuntimeError(f"No rasterizer available for {fmt} thumbnails")
+    if pymupdf is not None:
+        return _rasterize_pymupdf(pdf_bytes, page, width, fmt)
+    png = _rasterize_pdftoppm(pdf_bytes, page, width)
+    return _to_webp(Image.open(io.BytesIO(png))) if fmt == "webp" else png
+
+
+def _to_webp(image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, "WEBP", quality=WEBP_QUALITY)
+    return buffer.getvalue()
+
+
+def _rasterize_pymupdf(pdf_bytes: bytes, page: int, width: int, fmt: str) -> bytes:
+    with pymupdf.open(stream=pdf_bytes, filetype="pdf") as doc:
+        if not 1 <= page <= doc.page_count:
+            raise ValueError(f"PDF has no page {page}")
+        pdf_page = doc[page - 1]
+        zoom = width / pdf_page.rect.width
+        pixmap = pdf_page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+    if fmt == "webp":
+        # Hand Pillow the raw samples rather than encoding a PNG in between
+        return _to_webp(Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples))
+    return pixmap.tobytes("png")
+
+
+def _rasterize_pdftoppm(pdf_bytes: bytes, page: int, width: int) -> bytes:
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "in.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(pdf_bytes)
+        out_root = os.path.join(tmp, "out")
+        result = subprocess.run(
+            [PDFTOPPM, "-png", "-singlefile", "-f", str(page), "-l", str(page),
+             "-scale-to-x", str(width), "-scale-to-y", "-1", pdf_path, out_root],
+            capture_output=True, timeout=30,
+        )
+        try:
+            with open(out_root + ".png", "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            # A page past the end is an error exit with nothing written
+            detail = result.stderr.decode("utf-8", "replace").strip()
+            raise ValueError(f"PDF has no page {page}" + (f" ({detail})" if detail else ""))
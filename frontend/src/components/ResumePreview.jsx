@@ -1,5 +1,5 @@
 import { useState, useEffect, useRef, useCallback } from 'react';
-import { apiPostBlob } from '../utils/api';
+import { apiPostPreview } from '../utils/api';
 import * as pdfjsLib from 'pdfjs-dist/build/pdf.mjs';
 import './ResumePreview.css';
 
@@ -15,8 +15,15 @@ export default function ResumePreview({ xml, margins }) {
   const debounceRef = useRef(null);
   const containerRef = useRef(null);
   const pdfDocRef = useRef(null);
+  // Server sequence number of the preview on screen; older responses are dropped
+  const shownSeqRef = useRef(0);
+  // Requests sent so far, so only the newest one clears the loading state
+  const requestCountRef = useRef(0);
+  const abortRef = useRef(new AbortController());
 
-  const renderPdf = useCallback(async (pdfData) => {
+  useEffect(() => () => abortRef.current.abort(), []);
+
+  const renderPdf = useCallback(async (pdfData, seq) => {
     try {
       const pdf = await pdfjsLib.getDocument({ data: pdfData }).promise;
       pdfDocRef.current = pdf;
@@ -34,6 +41,9 @@ export default function ResumePreview({ xml, margins }) {
         pages.push(canvas.toDataURL());
       }
 
+      // A newer preview may have finished rendering while this one was drawn
+      if (seq < shownSeqRef.current) return;
+      shownSeqRef.current = seq;
       setCanvases(pages);
     } catch (err) {
       console.error('PDF render error:', err);
@@ -47,21 +57,25 @@ export default function ResumePreview({ xml, margins }) {
     if (debounceRef.current) clearTimeout(debounceRef.current);
 
     debounceRef.current = setTimeout(async () => {
+      const request = ++requestCountRef.current;
       setLoading(true);
       setError(null);
       try {
-        const blob = await apiPostBlob('/preview-resume', {
+        const { seq, blob } = await apiPostPreview('/preview-resume', {
           xml,
           save_name: 'preview',
           margins,
-        });
+        }, abortRef.current.signal);
+        // Superseded on the server, or older than what is already shown
+        if (!blob || seq < shownSeqRef.current) return;
         const arrayBuffer = await blob.arrayBuffer();
-        await renderPdf(arrayBuffer);
+        await renderPdf(arrayBuffer, seq);
       } catch (err) {
+        if (err.name === 'AbortError') return;
         console.error('Preview error:', err);
-        setError('Failed to generate preview');
+        if (request === requestCountRef.current) setError('Failed to generate preview');
       } finally {
-        setLoading(false);
+        if (request === requestCountRef.current) setLoading(false);
       }
     }, 300);
 
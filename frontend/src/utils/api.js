@@ -52,6 +52,27 @@ export async function apiPostBlob(path, body) {
   return res.blob();
 }
 
+/**
+ * POST to /preview-resume. Returns { seq, blob }; blob is null when the server
+ * dropped the request because a newer preview from this user replaced it.
+ */
+export async function apiPostPreview(path, body, signal) {
+  const headers = await authHeaders();
+  const res = await fetch(`${API_BASE}${path}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', ...headers },
+    body: JSON.stringify(body),
+    signal,
+  });
+  if (res.status === 401) {
+    console.error('API 401 on', path, '- token may be invalid');
+  }
+  const seq = Number(res.headers.get('X-Preview-Seq')) || 0;
+  if (res.status === 409) return { seq, blob: null };
+  if (!res.ok) throw new Error(`Preview failed: ${res.status}`);
+  return { seq, blob: await res.blob() };
+}
+
 export async function apiDelete(path) {
   const headers = await authHeaders();
   const res = await fetch(`${API_BASE}${path}`, {